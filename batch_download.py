@@ -0,0 +1,347 @@
+"""
+批量下载模式（无交互）。
+
+从 CSV / JSONL 文件读取 "歌名-歌手" 形式的查询，按 搜索 → 匹配 → 获取链接 → 下载 的流程
+有上限地并发处理，并把每一项的状态、各阶段耗时和文件路径逐行写入 JSONL 结果文件。
+进程退出码只由失败阈值决定，适合夜间定时任务调用。
+
+用法示例:
+    python batch_download.py queries.csv --workers 4 --results results.jsonl --max-failure-ratio 0.1
+    python batch_download.py queries.jsonl --provider vkeys --max-failures 20 --progress bar
+
+输入格式:
+    CSV  : 带表头时读取 query 列，或 title/artist 两列；无表头时取第一列。
+    JSONL: 每行一个对象，{"query": "唯一-邓紫棋"} 或 {"title": "唯一", "artist": "邓紫棋"}；
+           也可以直接是一个 JSON 字符串。
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Any
+
+import content_store
+import download_scheduler
+import library_index
+import progress
+
+# --- 配置 ---
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_FAILURE_RATIO = 0.1
+PROVIDERS = ("gequhai", "vkeys")
+
+# 状态取值：只有 ok 算成功，其余都计入失败阈值
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not_found"
+STATUS_NO_MATCH = "no_match"
+STATUS_NO_URL = "no_url"
+STATUS_DOWNLOAD_FAILED = "download_failed"
+STATUS_ERROR = "error"
+
+
+# --- 输入解析 ---
+
+def split_query(query: str):
+    """
+    把 '歌名-歌手' / '歌名 歌手' 拆成 (歌名, 歌手)，无法拆分时歌手为 None。
+    与 music_scraper_0.5.py 的交互解析规则保持一致：只在分隔符恰好出现一次时拆分。
+    """
+    query = query.strip()
+    for split_char in ('-', ' '):
+        if query.count(split_char) == 1:
+            title, artist = (part.strip() for part in query.split(split_char, 1))
+            if title and artist:
+                return title, artist
+    return query, None
+
+
+def make_item(index: int, record: Any) -> Dict[str, Any] | None:
+    """把一条输入记录统一为 {'index', 'query', 'title', 'artist'}，空记录返回 None。"""
+    if isinstance(record, str):
+        record = {"query": record}
+    if not isinstance(record, dict):
+        return None
+
+    query = (record.get("query") or "").strip()
+    title = (record.get("title") or "").strip()
+    artist = (record.get("artist") or "").strip()
+
+    if not query and title:
+        query = f"{title}-{artist}" if artist else title
+    if not query:
+        return None
+    if not title:
+        title, artist = split_query(query)
+
+    return {"index": index, "query": query, "title": title, "artist": artist or None}
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    """读取 CSV 或 JSONL 查询文件（按扩展名判断，.jsonl/.json 以外一律按 CSV 处理）。"""
+    items = []
+    suffix = Path(path).suffix.lower()
+
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if suffix in ('.jsonl', '.json'):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = [row for row in csv.reader(f) if row and any(cell.strip() for cell in row)]
+            header = [cell.strip().lower() for cell in rows[0]] if rows else []
+            if 'query' in header or 'title' in header:
+                records = (dict(zip(header, row)) for row in rows[1:])
+            else:
+                records = (row[0] for row in rows)
+
+        for record in records:
+            item = make_item(len(items), record)
+            if item:
+                items.append(item)
+
+    return items
+
+
+# --- 匹配 ---
+
+def _clean(s) -> str:
+    """去掉括号内容和空白并转小写，用于歌名/歌手比较。"""
+    if not isinstance(s, str):
+        return ""
+    s = re.sub(r'\(.*?\)|（.*?）|\[.*?\]|【.*?】', '', s)
+    return re.sub(r'\s+', '', s).lower()
+
+
+def match_song(title: str, artist: str | None, songs: List[Dict[str, Any]],
+               title_key: str, artist_key: str) -> Dict[str, Any] | None:
+    """
+    在搜索结果中挑选最匹配的一首。
+
+    指定了歌手时，歌手必须互相包含（兼容 "G.E.M.邓紫棋" 与 "邓紫棋"），否则视为不匹配；
+    歌名完全相同优先，其次是包含关系。未指定歌手时退化为按歌名挑选，再不行取第一条。
+    """
+    expected_title = _clean(title)
+    expected_artist = _clean(artist) if artist else ""
+
+    best, best_score = None, 0
+    for song in songs:
+        actual_title = _clean(song.get(title_key))
+        actual_artist = _clean(song.get(artist_key))
+
+        if expected_artist and not (expected_artist in actual_artist or actual_artist and actual_artist in expected_artist):
+            continue
+
+        if expected_title == actual_title:
+            score = 3
+        elif expected_title and (expected_title in actual_title or actual_title and actual_title in expected_title):
+            score = 2
+        else:
+            score = 1 if not expected_artist else 0
+
+        if score > best_score:
+            best, best_score = song, score
+
+    if best is None and not expected_artist and songs:
+        return songs[0]
+    return best
+
+
+# --- 各个来源的处理流程 ---
+
+def process_gequhai(item: Dict[str, Any], timings: Dict[str, float]) -> Dict[str, Any]:
+    """歌曲海 (download_music.py) 流程：搜索 → 匹配 → 详情页/API 取链接和歌词 → 下载。"""
+    import download_music
+
+    t0 = time.perf_counter()
+    songs = download_music.search_songs(item["query"].replace('-', ' '))
+    timings["search"] = time.perf_counter() - t0
+    if not songs:
+        return {"status": STATUS_NOT_FOUND}
+
+    song = match_song(item["title"], item["artist"], songs, 'title', 'artist')
+    if not song:
+        return {"status": STATUS_NO_MATCH, "candidates": len(songs)}
+    matched = {"id": song['id'], "title": song['title'], "artist": song['artist']}
+
+    # 先查询内容仓库，已下载过的曲目直接硬链接，详情页和 API 都不用请求
+    stem = f"{download_music.sanitize_filename(song['title'])} - {download_music.sanitize_filename(song['artist'])}"
+    cached_path = content_store.get_store().materialize("gequhai", song['id'], "default", download_music.DOWNLOAD_DIR,
+                                                        stem)
+    if cached_path:
+        return {"status": STATUS_OK, "matched": matched, "path": str(cached_path), "cached": True}
+
+    t0 = time.perf_counter()
+    music_data, lrc_content, txt_content = download_music.get_music_url(song['id'])
+    timings["resolve"] = time.perf_counter() - t0
+    url = music_data.get('url') if music_data else None
+
+    t0 = time.perf_counter()
+    path = download_music.download_music_file(url, song['title'], song['artist'], lrc_content, txt_content,
+                                              track_id=song['id'])
+    timings["download"] = time.perf_counter() - t0
+
+    if not path and not url:
+        return {"status": STATUS_NO_URL, "matched": matched}
+    if not path:
+        return {"status": STATUS_DOWNLOAD_FAILED, "matched": matched}
+    return {"status": STATUS_OK, "matched": matched, "path": str(path)}
+
+
+def process_vkeys(item: Dict[str, Any], timings: Dict[str, float]) -> Dict[str, Any]:
+    """vkeys 腾讯音乐 (tencent_music_seacrch.py) 流程：搜索 → 匹配 → geturl → 下载 → 歌词。"""
+    import tencent_music_seacrch as tencent
+
+    t0 = time.perf_counter()
+    songs = tencent.search_music(item["query"])
+    timings["search"] = time.perf_counter() - t0
+    if not songs:
+        return {"status": STATUS_NOT_FOUND}
+
+    song = match_song(item["title"], item["artist"], songs, 'song', 'singer')
+    if not song:
+        return {"status": STATUS_NO_MATCH, "candidates": len(songs)}
+    matched = {"id": song['id'], "title": song['song'], "artist": song['singer']}
+
+    outcome = tencent.download_vkeys_song(song, timings)
+    if outcome["status"] == tencent.STATUS_NO_URL:
+        return {"status": STATUS_NO_URL, "matched": matched}
+    if outcome["status"] == tencent.STATUS_DOWNLOAD_FAILED:
+        return {"status": STATUS_DOWNLOAD_FAILED, "matched": matched}
+    if outcome["cached"]:
+        return {"status": STATUS_OK, "matched": matched, "path": outcome["path"], "cached": True}
+    return {"status": STATUS_OK, "matched": matched, "path": outcome["path"], "sha256": outcome["sha256"]}
+
+
+PROCESSORS = {
+    "gequhai": process_gequhai,
+    "vkeys": process_vkeys,
+}
+
+
+# --- 批量执行 ---
+
+_batch_ids = itertools.count(1)
+
+
+def run_item(item: Dict[str, Any], provider: str, job_id: str = "batch",
+             priority: int = download_scheduler.PRIORITY_BATCH) -> Dict[str, Any]:
+    """
+    处理单个查询，任何异常都会被收敛为 error 状态，不会中断整个批次。
+    其中的下载按 job_id 以 priority（默认批量优先级）在全局下载调度器中排队。
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    try:
+        with download_scheduler.job_context(job_id, priority):
+            outcome = PROCESSORS[provider](item, timings)
+    except Exception as e:
+        outcome = {"status": STATUS_ERROR, "error": f"{type(e).__name__}: {e}"}
+    timings["total"] = time.perf_counter() - t0
+
+    result = {"index": item["index"], "query": item["query"], "provider": provider}
+    result.update(outcome)
+    result["timings"] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    return result
+
+
+def run_batch(items: List[Dict[str, Any]], provider: str = "gequhai", workers: int = DEFAULT_WORKERS,
+              results_path: str = "results.jsonl") -> Dict[str, Any]:
+    """
+    以最多 workers 个并发处理全部查询，结果按完成顺序逐行写入 results_path。
+
+    Returns:
+        dict: 批次汇总（总数、各状态计数、失败数、耗时、吞吐）。
+    """
+    if provider == "gequhai":
+        import download_music
+        download_music.check_ffmpeg_available()
+        library_index.get_index().reconcile(download_music.DOWNLOAD_DIR)
+    elif provider == "vkeys":
+        import tencent_music_seacrch
+        tencent_music_seacrch.ensure_download_dir()
+
+    counts = {}
+    write_lock = threading.Lock()
+    started = time.perf_counter()
+    job_id = f"batch-{os.getpid()}-{next(_batch_ids)}"
+    tracker = progress.get_tracker()
+
+    with open(results_path, 'w', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(run_item, item, provider, job_id) for item in items]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            with write_lock:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            # json 进度模式下逐项结果只写入结果文件，标准输出只有周期性的进度行
+            if tracker.mode != progress.MODE_JSON:
+                print(f"[批量] {done}/{len(items)} {result['status']:<15} {result['query']}", flush=True)
+    tracker.close()
+
+    elapsed = time.perf_counter() - started
+    failed = sum(n for status, n in counts.items() if status != STATUS_OK)
+    return {
+        "provider": provider,
+        "total": len(items),
+        "ok": counts.get(STATUS_OK, 0),
+        "failed": failed,
+        "failure_ratio": round(failed / len(items), 4) if items else 0.0,
+        "by_status": counts,
+        "elapsed_seconds": round(elapsed, 3),
+        "songs_per_minute": round(len(items) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "results_path": results_path,
+        "scheduler": download_scheduler.get_scheduler().stats(),
+        "transfer": tracker.snapshot(),
+    }
+
+
+def exceeds_threshold(summary: Dict[str, Any], max_failure_ratio: float, max_failures: int | None) -> bool:
+    """判断失败数是否超过阈值（任意一个阈值被突破即视为失败）。"""
+    if max_failures is not None and summary["failed"] > max_failures:
+        return True
+    return summary["failure_ratio"] > max_failure_ratio
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量下载模式：读取 CSV/JSONL 查询列表并发下载，无需交互。")
+    parser.add_argument("input", help="查询文件路径 (.csv 或 .jsonl)")
+    parser.add_argument("--provider", choices=PROVIDERS, default="gequhai", help="下载来源 (默认 gequhai)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"最大并发数 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--results", default="results.jsonl", help="结果文件路径 (JSONL，默认 results.jsonl)")
+    parser.add_argument("--max-failure-ratio", type=float, default=DEFAULT_MAX_FAILURE_RATIO,
+                        help=f"允许的最大失败比例，超过则以非零状态退出 (默认 {DEFAULT_MAX_FAILURE_RATIO})")
+    parser.add_argument("--max-failures", type=int, default=None, help="允许的最大失败条数 (可选)")
+    parser.add_argument("--progress", choices=progress.MODES, default=progress.MODE_JSON,
+                        help="进度输出: json 每隔几秒输出一行 JSON (默认)，bar 单行汇总，off 不输出")
+    args = parser.parse_args(argv)
+    progress.set_mode(args.progress)
+
+    try:
+        items = load_queries(args.input)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法读取查询文件 '{args.input}': {e}")
+        return 2
+
+    if not items:
+        print(f"⚠️ 查询文件 '{args.input}' 中没有有效的查询。")
+        return 0
+
+    print(f"[批量] 共 {len(items)} 条查询，来源: {args.provider}，并发: {args.workers}")
+    summary = run_batch(items, args.provider, args.workers, args.results)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if exceeds_threshold(summary, args.max_failure_ratio, args.max_failures):
+        print(f"❌ 失败 {summary['failed']}/{summary['total']} 条，超过阈值。")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
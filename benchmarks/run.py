@@ -0,0 +1,317 @@
+"""
+端到端基准测试：在本地替身服务器 (benchmarks/standins.py) 上运行真实的搜索、解析、下载和转换代码。
+
+测量项:
+    search      各来源搜索延迟的 p50 / p90 / p99（myfreemp3 / vkeys / 歌曲海，每次用不同关键词避开缓存）
+    resolve     bugpk 音质阶梯解析延迟的 p50 / p90 / p99（quality_ladder，每次用不同歌曲 ID）
+    batch       batch_download.run_batch 的吞吐（首/分钟）
+    download    music_scraper_0.5 的 download_music 下载速度 (MB/s)
+    convert     download_music.convert_aac_to_mp3 的转换速度（文件/分钟，需要 ffmpeg）
+    importtime  各入口模块的导入耗时（python -X importtime，取中位数），与 STARTUP_TARGET_MS 对比，
+                并列出最慢的顶层依赖；自动化中每首歌都会新起一个进程，这部分耗时每次都要付
+
+缺少依赖（bs4 / ffmpeg 等）的项目会标记为 skipped 而不是报错。
+所有缓存和下载文件都写在临时目录中，测试结束后删除，不影响真实的 downloads/。
+
+用法（在仓库根目录）:
+    python -m benchmarks.run --output baseline.json
+    python -m benchmarks.run --latency-ms 80 --failure-rate 0.05 --baseline baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.standins import StandinConfig, StandinServer
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# --- 配置 ---
+SEARCH_ROUNDS = 20
+BATCH_SONGS = 20
+BATCH_WORKERS = 4
+DOWNLOAD_FILES = 8
+CONVERT_FILES = 4
+ARTISTS = ("周杰伦", "邓紫棋", "林俊杰", "陈奕迅", "薛之谦")
+IMPORTTIME_ROUNDS = 5
+# 入口模块 → 导入耗时目标 (毫秒)
+STARTUP_TARGET_MS = {
+    "music_cli": 30,
+    "download_music": 200,
+    "tencent_music_seacrch": 200,
+    "batch_download": 150,
+    "quality_ladder": 150,
+}
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"n": len(ordered), "p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 2)}
+
+
+@contextlib.contextmanager
+def quiet():
+    """各模块的 print 输出很多，测量时丢弃。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_search(urls, rounds):
+    import tencent_music_seacrch as tencent
+    from cache_warmer import load_scraper_module
+
+    scraper = load_scraper_module().MyFreeMp3Scraper()
+    scraper.base_url = urls["myfreemp3"]
+    tencent.BASE_URL = urls["vkeys"]
+    runners = {
+        "myfreemp3": lambda kw: scraper.search_music_raw(kw, target_count=30),
+        "vkeys": tencent.search_music,
+    }
+    try:
+        import download_music
+        download_music.BASE_URL = urls["gequhai"]
+        runners["gequhai"] = download_music.search_songs
+    except ImportError as e:
+        runners["gequhai"] = e
+
+    report = {}
+    for name, runner in runners.items():
+        if isinstance(runner, ImportError):
+            report[name] = {"skipped": f"缺少依赖: {runner.name}"}
+            continue
+        samples = []
+        for i in range(rounds):
+            keyword = f"{name}搜索{i} {ARTISTS[i % len(ARTISTS)]}"
+            started = time.perf_counter()
+            with quiet():
+                runner(keyword)
+            samples.append(time.perf_counter() - started)
+        report[name] = percentiles(samples)
+    return report
+
+
+def bench_resolve(urls, rounds):
+    import quality_ladder
+
+    ladder = quality_ladder.QualityLadder(api_url=urls["bugpk"])
+    samples = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        ladder.resolve(str(800000 + i))
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def bench_batch(urls, songs, workers, provider):
+    import batch_download
+
+    if provider == "gequhai":
+        try:
+            import download_music
+        except ImportError as e:
+            return {"skipped": f"缺少依赖: {e.name}"}
+        download_music.BASE_URL = urls["gequhai"]
+    else:
+        import tencent_music_seacrch as tencent
+        tencent.BASE_URL = urls["vkeys"]
+
+    items = [{"index": i, "query": f"批量{i}-{ARTISTS[i % len(ARTISTS)]}", "title": f"批量{i}",
+              "artist": ARTISTS[i % len(ARTISTS)]} for i in range(songs)]
+    with quiet():
+        summary = batch_download.run_batch(items, provider, workers, "bench_results.jsonl")
+    return {"provider": provider, "songs": songs, "workers": workers, "ok": summary["ok"],
+            "failed": summary["failed"], "elapsed_s": summary["elapsed_seconds"],
+            "songs_per_minute": summary["songs_per_minute"]}
+
+
+def bench_download(urls, files, audio_size):
+    from cache_warmer import load_scraper_module
+
+    scraper = load_scraper_module().MyFreeMp3Scraper()
+    ok = 0
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for i in range(files):
+        with quiet():
+            if scraper.download_music(f"{urls['cdn']}/{900000 + i}.flac", f"bench_{i}.flac", save_dir="bench_dl"):
+                ok += 1
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    total_mb = ok * audio_size / 1024 / 1024
+    return {"files": files, "ok": ok, "mb_per_s": round(total_mb / elapsed, 2) if elapsed else 0.0,
+            "cpu_ms_per_mb": round(cpu * 1000 / total_mb, 2) if total_mb else None}
+
+
+def bench_convert(files):
+    if not shutil.which("ffmpeg"):
+        return {"skipped": "ffmpeg 不可用"}
+    try:
+        import download_music
+    except ImportError as e:
+        return {"skipped": f"缺少依赖: {e.name}"}
+    download_music.check_ffmpeg_available()
+
+    sources = []
+    for i in range(files):
+        path = Path("bench_convert") / f"convert_{i}.aac"
+        path.parent.mkdir(exist_ok=True)
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency={440 + i}:duration=30",
+                        "-c:a", "aac", "-f", "adts", str(path)], check=True)
+        sources.append(path)
+
+    started = time.perf_counter()
+    with quiet():
+        converted = sum(1 for path in sources if download_music.convert_aac_to_mp3(path))
+    elapsed = time.perf_counter() - started
+    return {"files": files, "ok": converted,
+            "files_per_minute": round(converted / elapsed * 60, 2) if elapsed else 0.0}
+
+
+def _parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出。
+
+    Returns:
+        dict: {顶层模块: (累计微秒, {直接依赖: 累计微秒})}
+    """
+    top = {}
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # 表头
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth == 0:
+            top[name.strip()] = (int(cumulative), children)
+            children = {}
+        elif depth == 1:
+            children[name.strip()] = int(cumulative)
+    return top
+
+
+def bench_importtime(rounds):
+    """在独立的解释器中测量各入口模块的导入耗时；不需要替身服务器。"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])))
+    report = {}
+    for module, target in STARTUP_TARGET_MS.items():
+        totals = []
+        deps = {}
+        for _ in range(rounds):
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                  capture_output=True, text=True, env=env)
+            if proc.returncode != 0:
+                missing = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "导入失败"
+                report[module] = {"skipped": missing}
+                break
+            total, deps = _parse_importtime(proc.stderr).get(module, (0, {}))
+            totals.append(total / 1000)
+        else:
+            median = round(statistics.median(totals), 1)
+            slowest = sorted(deps.items(), key=lambda item: -item[1])[:5]
+            report[module] = {"import_ms": median, "target_ms": target, "within_target": median <= target,
+                              "slowest": {name: round(us / 1000, 1) for name, us in slowest}}
+    return report
+
+
+def compare(report, baseline):
+    """打印与基线的对比（只比较数值型指标）。"""
+    print("\n与基线对比:")
+    for section, metrics in report["results"].items():
+        for name, value in _flatten(metrics):
+            base = dict(_flatten(baseline.get("results", {}).get(section, {}))).get(name)
+            if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+                print(f"  {section}.{name:<28} {base:>10} → {value:>10} ({(value - base) / base * 100:+.1f}%)")
+
+
+def _flatten(obj, prefix=""):
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在本地替身服务器上运行端到端基准测试。")
+    parser.add_argument("--only", nargs="*",
+                        choices=("search", "resolve", "batch", "download", "convert", "importtime"),
+                        help="只运行指定项目（默认全部）")
+    parser.add_argument("--latency-ms", type=float, default=20, help="接口固定延迟 (毫秒)")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="接口随机抖动 (毫秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="接口请求返回 500 的比例")
+    parser.add_argument("--throttle-every", type=int, default=0, help="每 N 个接口请求触发一次限流")
+    parser.add_argument("--cdn-kbps", type=int, default=0, help="CDN 限速 (KB/s)，0 为不限速")
+    parser.add_argument("--audio-mb", type=float, default=4, help="每个音频文件的大小 (MB)")
+    parser.add_argument("--songs", type=int, default=BATCH_SONGS, help="批量测试的歌曲数")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="批量测试的并发数")
+    parser.add_argument("--provider", choices=("vkeys", "gequhai"), default="vkeys", help="批量测试的来源")
+    parser.add_argument("--output", help="把报告写入 JSON 文件（可作为之后的基线）")
+    parser.add_argument("--baseline", help="与之前保存的报告对比")
+    args = parser.parse_args(argv)
+
+    config = StandinConfig(args.latency_ms / 1000, args.jitter_ms / 1000, args.failure_rate, args.throttle_every,
+                           args.cdn_kbps * 1024, int(args.audio_mb * 1024 * 1024))
+    selected = args.only or ["search", "resolve", "batch", "download", "convert", "importtime"]
+    output = Path(args.output).resolve() if args.output else None
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+
+    # 各模块的缓存与下载目录都是相对路径：切换到临时目录，保证每次都是冷缓存、不污染仓库
+    sys.path.insert(0, str(REPO_ROOT))
+    workdir = tempfile.mkdtemp(prefix="music_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    import progress
+    progress.set_mode(progress.MODE_OFF)
+
+    results = {}
+    try:
+        with StandinServer(config) as server:
+            urls = server.base_urls()
+            for name in selected:
+                print(f"[bench] {name} ...", flush=True)
+                if name == "search":
+                    results[name] = bench_search(urls, SEARCH_ROUNDS)
+                elif name == "resolve":
+                    results[name] = bench_resolve(urls, SEARCH_ROUNDS)
+                elif name == "batch":
+                    results[name] = bench_batch(urls, args.songs, args.workers, args.provider)
+                elif name == "download":
+                    results[name] = bench_download(urls, DOWNLOAD_FILES, config.audio_size)
+                elif name == "convert":
+                    results[name] = bench_convert(CONVERT_FILES)
+                elif name == "importtime":
+                    results[name] = bench_importtime(IMPORTTIME_ROUNDS)
+            server_stats = dict(server.stats)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(config), "server": server_stats,
+              "results": results}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if baseline:
+        compare(report, baseline)
+    if output:
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
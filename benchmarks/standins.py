@@ -0,0 +1,306 @@
+"""
+本地替身服务器：在一个端口上模拟项目用到的全部第三方接口，供基准测试离线运行。
+
+路由（前缀即各模块的 BASE_URL，见 StandinServer.base_urls()）:
+    POST /myfreemp3/                 myfreemp3 搜索（表单 input / page / type，每页 10 条）
+    GET  /myfreemp3/tdhot.php        热门关键词
+    GET  /gequhai/s/<关键词>          歌曲海搜索结果页 (HTML)
+    GET  /gequhai/play/<id>          歌曲详情页 (window.play_id 与歌词)
+    POST /gequhai/api/music          播放链接接口
+    GET  /vkeys?word=                vkeys 搜索
+    GET  /vkeys/geturl?id=           vkeys 播放链接
+    GET  /vkeys/lyric?id=            vkeys 歌词
+    GET  /bugpk?ids=&level=          bugpk (byfuns) 直链解析
+    GET  /cdn/<id>.<mp3|flac>        静态音频（ID3 / STREAMINFO 头 + 随机数据，每首内容不同）
+
+故障注入（StandinConfig）:
+    latency / jitter   每个接口请求的固定延迟与随机抖动（CDN 只在首字节前延迟一次）
+    failure_rate       按比例返回 HTTP 500
+    throttle_every     每 N 个接口请求触发一次限流：歌曲海返回"请 0 秒后再试。"，其余返回 HTTP 429
+    cdn_rate           CDN 限速（字节/秒，0 为不限速）
+
+单独运行:
+    python -m benchmarks.standins --port 8765 --latency-ms 50
+"""
+import argparse
+import html
+import itertools
+import json
+import os
+import random
+import struct
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 配置 ---
+RESULTS_PER_KEYWORD = 30
+PAGE_SIZE = 10
+HOT_KEYWORDS = ("晴天", "稻香", "光年之外", "泡沫", "倒数", "孤勇者", "起风了", "后来", "红豆", "演员")
+LRC_LINES = 40
+WRITE_BLOCK = 64 * 1024
+
+
+@dataclass
+class StandinConfig:
+    latency: float = 0.0
+    jitter: float = 0.0
+    failure_rate: float = 0.0
+    throttle_every: int = 0
+    cdn_rate: int = 0
+    audio_size: int = 4 * 1024 * 1024
+    seed: int = 0
+
+
+def _song_id(keyword, index):
+    """同一关键词的结果 ID 固定，不同关键词互不相同。"""
+    return 100000 + (int.from_bytes(keyword.encode("utf-8"), "little") * 31 + index) % 900000
+
+
+def _songs(keyword, count=RESULTS_PER_KEYWORD):
+    title, _, artist = keyword.partition(" ")
+    return [{"id": _song_id(keyword, i), "title": title if i == 0 else f"{title} ({i})",
+             "artist": artist or "替身歌手"} for i in range(count)]
+
+
+def _lrc(song_id):
+    return "\n".join(f"[{i // 60:02d}:{i % 60:02d}.00]第 {i} 行 {song_id}" for i in range(LRC_LINES))
+
+
+def _audio_header(song_id, ext):
+    """最小的合法文件头，使完整性校验与标签写入走真实流程；其后的随机数据按歌曲 ID 区分。"""
+    tag = struct.pack(">Q", song_id) * 2
+    if ext == "flac":
+        streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00" * 6 + b"\x0a\xc4\x42\xf0" + b"\x00" * 4 + tag
+        return b"fLaC" + bytes([0x80]) + len(streaminfo).to_bytes(3, "big") + streaminfo
+    return b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x64" + tag
+
+
+class StandinServer:
+    """在后台线程中运行的替身服务器，可作为上下文管理器使用。"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StandinConfig()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._requests = itertools.count(1)
+        self._payload = os.urandom(self.config.audio_size)
+        self.stats = {"api": 0, "cdn": 0, "failed": 0, "throttled": 0, "cdn_bytes": 0}
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def root(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def base_urls(self):
+        """各模块应指向的地址。"""
+        return {
+            "myfreemp3": f"{self.root}/myfreemp3/",
+            "gequhai": f"{self.root}/gequhai",
+            "vkeys": f"{self.root}/vkeys",
+            "bugpk": f"{self.root}/bugpk",
+            "cdn": f"{self.root}/cdn",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="standins", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _delay(self):
+        with self._rng_lock:
+            extra = self._rng.uniform(0, self.config.jitter) if self.config.jitter else 0.0
+        if self.config.latency or extra:
+            time.sleep(self.config.latency + extra)
+
+    def _inject(self):
+        """返回 'fail' / 'throttle' / None。"""
+        n = next(self._requests)
+        if self.config.throttle_every and n % self.config.throttle_every == 0:
+            self._count("throttled")
+            return "throttle"
+        with self._rng_lock:
+            failed = self.config.failure_rate and self._rng.random() < self.config.failure_rate
+        if failed:
+            self._count("failed")
+            return "fail"
+        return None
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头和响应体分开写出，不关 Nagle 会在每个请求上叠加约 40ms 的延迟确认等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            # --- 响应辅助 ---
+
+            def _send(self, status, body, content_type="application/json; charset=utf-8", headers=()):
+                data = body if isinstance(body, bytes) else body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _json(self, obj, status=200):
+                self._send(status, json.dumps(obj, ensure_ascii=False))
+
+            def _form(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return dict(urllib.parse.parse_qsl(self.rfile.read(length).decode("utf-8")))
+
+            # --- 路由 ---
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def _route(self, method):
+                parsed = urllib.parse.urlsplit(self.path)
+                path = urllib.parse.unquote(parsed.path)
+                query = dict(urllib.parse.parse_qsl(parsed.query))
+                # 请求体必须先读完，否则注入的错误响应会打乱保持连接上的下一个请求
+                form = self._form() if method == "POST" else {}
+
+                if path.startswith("/cdn/"):
+                    return self._cdn(path)
+
+                standin._count("api")
+                standin._delay()
+                injected = standin._inject()
+                if injected == "fail":
+                    return self._send(500, "internal error", "text/plain")
+                if injected == "throttle" and not path.startswith("/gequhai/api/"):
+                    return self._send(429, "too many requests", "text/plain", [("Retry-After", "0")])
+
+                if path == "/myfreemp3/" and method == "POST":
+                    return self._myfreemp3_search(form)
+                if path == "/myfreemp3/tdhot.php":
+                    return self._json([[kw] for kw in HOT_KEYWORDS])
+                if path.startswith("/gequhai/s/"):
+                    return self._gequhai_search(path[len("/gequhai/s/"):])
+                if path.startswith("/gequhai/play/"):
+                    return self._gequhai_play(path[len("/gequhai/play/"):])
+                if path == "/gequhai/api/music" and method == "POST":
+                    if injected == "throttle":
+                        return self._json({"code": 400, "msg": "请求过于频繁，请 0 秒后再试。"})
+                    play_id = form.get("id", "p0")
+                    return self._json({"code": 200, "data": {"url": f"{standin.root}/cdn/{play_id[1:]}.mp3"}})
+                if path == "/vkeys":
+                    return self._vkeys_search(query.get("word", ""))
+                if path == "/vkeys/geturl":
+                    size_mb = standin.config.audio_size / 1024 / 1024
+                    return self._json({"code": 200, "data": {"id": int(query.get("id", 0)), "size": f"{size_mb:.2f}MB",
+                                                             "url": f"{standin.root}/cdn/{query.get('id')}.flac"}})
+                if path == "/vkeys/lyric":
+                    return self._json({"code": 200, "data": {"lrc": _lrc(query.get("id")), "trans": "", "yrc": ""}})
+                if path == "/bugpk":
+                    level = query.get("level", "standard")
+                    ext = "flac" if level in ("lossless", "hires", "jymaster", "sky", "jyeffect") else "mp3"
+                    return self._json({"status": 200, "level": level, "size": standin.config.audio_size,
+                                       "url": f"{standin.root}/cdn/{query.get('ids')}.{ext}"})
+                self._send(404, "not found", "text/plain")
+
+            def _myfreemp3_search(self, form):
+                page = int(form.get("page", 1))
+                songs = _songs(form.get("input", ""))[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+                self._json({"code": 200, "data": {"list": [
+                    {"title": s["title"], "author": s["artist"], "songid": s["id"]} for s in songs]}})
+
+            def _gequhai_search(self, keyword):
+                rows = "".join(
+                    f'<tr><td><a href="/play/{s["id"]}">{html.escape(s["title"])}</a></td>'
+                    f'<td>{html.escape(s["artist"])}</td></tr>' for s in _songs(keyword))
+                self._send(200, f"<html><body><table><tbody>{rows}</tbody></table></body></html>",
+                           "text/html; charset=utf-8")
+
+            def _gequhai_play(self, track_id):
+                lrc = _lrc(track_id).replace("\n", "<br>")
+                self._send(200, f"<html><head><script>window.play_id = 'p{track_id}';</script></head>"
+                                f"<body><div id=\"lrc\">{lrc}</div></body></html>", "text/html; charset=utf-8")
+
+            def _vkeys_search(self, word):
+                self._json({"code": 200, "data": [
+                    {"id": s["id"], "song": s["title"], "singer": s["artist"], "album": "替身专辑", "cover": ""}
+                    for s in _songs(word)]})
+
+            def _cdn(self, path):
+                name, _, ext = path[len("/cdn/"):].partition(".")
+                try:
+                    song_id = int(name)
+                except ValueError:
+                    return self._send(404, "not found", "text/plain")
+                standin._count("cdn")
+                standin._delay()
+                header = _audio_header(song_id, ext)
+                payload = memoryview(standin._payload)[len(header):]
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/flac" if ext == "flac" else "audio/mpeg")
+                self.send_header("Content-Length", str(len(header) + len(payload)))
+                self.end_headers()
+                self.wfile.write(header)
+                rate = standin.config.cdn_rate
+                for offset in range(0, len(payload), WRITE_BLOCK):
+                    block = payload[offset:offset + WRITE_BLOCK]
+                    self.wfile.write(block)
+                    if rate:
+                        time.sleep(len(block) / rate)
+                standin._count("cdn_bytes", len(header) + len(payload))
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="启动本地替身服务器。")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--cdn-kbps", type=int, default=0, help="CDN 限速 (KB/s)，0 为不限速")
+    parser.add_argument("--audio-mb", type=float, default=4)
+    args = parser.parse_args(argv)
+
+    config = StandinConfig(args.latency_ms / 1000, args.jitter_ms / 1000, args.failure_rate, args.throttle_every,
+                           args.cdn_kbps * 1024, int(args.audio_mb * 1024 * 1024))
+    server = StandinServer(config, port=args.port)
+    print(json.dumps(server.base_urls(), ensure_ascii=False, indent=2))
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,185 @@
+"""
+按热门关键词后台预热搜索与直链缓存。
+
+定期从 tdhot.php 拉取当前热搜词（这正是用户接下来最可能输入的查询），对每个关键词：
+    1. 执行搜索并写入搜索缓存 (search_cache)；
+    2. 做严格匹配 (find_strict_match) 选出最佳结果；
+    3. 为最佳结果按音质阶梯 (quality_ladder) 预先解析直链，等级可用性与直链一起写入缓存。
+之后用户在 music_scraper_0.5.py 中搜索这些关键词时，搜索和取链都直接命中本地缓存。
+
+所有网络请求都从同一个令牌桶中扣除额度（默认每 2 秒 1 次，允许 5 次突发），
+额度耗尽时等待而不是加快请求频率，避免因为预热触发站点的反爬限制。
+
+用法:
+    python cache_warmer.py                    # 每 10 分钟预热一次，持续运行
+    python cache_warmer.py --once --limit 10  # 只预热一轮，取前 10 个热搜词
+"""
+import argparse
+import importlib.util
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+import quality_ladder
+import search_cache
+
+# --- 配置 ---
+WARM_INTERVAL = 10 * 60
+WARM_LIMIT = 20  # 每轮预热的热搜词数量
+SEARCH_DEPTH = 100  # 与 music_scraper_0.5 交互搜索的条数一致才能命中缓存（每页 10 条，即 10 次请求）
+RATE_PER_SECOND = 0.5
+RATE_BURST = 5
+SCRAPER_PATH = Path(__file__).resolve().parent / "music_scraper_0.5.py"
+
+
+class TokenBucket:
+    """令牌桶限速器：每秒补充 rate 个令牌，最多积累 capacity 个。"""
+
+    def __init__(self, rate=RATE_PER_SECOND, capacity=RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """
+        扣除 cost 个令牌，不足时阻塞等待。
+
+        Raises:
+            ValueError: cost 超过桶容量，永远凑不够令牌（原地等待只会挂起）。
+        """
+        if cost > self.capacity:
+            raise ValueError(f"一次申请 {cost} 个令牌超过了令牌桶容量 {self.capacity}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                wait = (cost - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedSession:
+    """每个请求先从令牌桶扣除一个令牌的会话包装，QualityLadder 并发查询各等级时同样受限速。"""
+
+    def __init__(self, session, bucket):
+        self.session = session
+        self.bucket = bucket
+
+    def get(self, *args, **kwargs):
+        self.bucket.acquire()
+        return self.session.get(*args, **kwargs)
+
+    def head(self, *args, **kwargs):
+        self.bucket.acquire()
+        return self.session.head(*args, **kwargs)
+
+
+def load_scraper_module():
+    """music_scraper_0.5.py 的文件名带点号，无法直接 import，这里按路径加载。"""
+    spec = importlib.util.spec_from_file_location("music_scraper_0_5", SCRAPER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fetch_hot_keywords(scraper):
+    """
+    从 tdhot.php 获取热门搜索关键词（请求格式与 music_scraper_0.1~0.3 的 get_hot_keywords 相同）。
+
+    Returns:
+        list: 关键词列表，失败时返回空列表。
+    """
+    search_id = str(int(time.time() * 1000)) + str(int(time.time() * 100 % 100)).zfill(2)
+    hotkey_data = {
+        "hotkey": {
+            "module": "tencent_musicsoso_hotkey.HotkeyService",
+            "method": "GetHotkeyForQQMusicMobile",
+            "param": {"remoteplace": "txt.miniapp.wxada7aab80ba27074", "searchid": search_id}
+        }
+    }
+    params = {"td": "1", "data": urllib.parse.quote(json.dumps(hotkey_data))}
+    try:
+        response = scraper.session.get(scraper.base_url + "tdhot.php", params=params, timeout=10)
+        response.raise_for_status()
+        return [item[0] for item in json.loads(response.text) if item]
+    except Exception as e:
+        print(f"获取热门关键词失败: {e}")
+        return []
+
+
+def warm_once(scraper, module, bucket, limit=WARM_LIMIT, ladder=quality_ladder.DEFAULT_LADDER) -> dict:
+    """
+    执行一轮预热。
+
+    Returns:
+        dict: 本轮统计（关键词数、新搜索数、新解析直链数、已在缓存中的数量）。
+    """
+    cache = search_cache.get_cache()
+    resolver = quality_ladder.QualityLadder(session=RateLimitedSession(scraper.session, bucket),
+                                            api_url=scraper.byfuns_api_url, ladder=ladder)
+    stats = {"keywords": 0, "searched": 0, "resolved": 0, "cached": 0, "no_match": 0}
+
+    bucket.acquire()
+    keywords = fetch_hot_keywords(scraper)[:limit]
+    stats["keywords"] = len(keywords)
+
+    for keyword in keywords:
+        provider = "myfreemp3:netease"
+        results = cache.get_search(provider, keyword, SEARCH_DEPTH)
+        if results is None:
+            # 每页一个令牌（一次搜索 SEARCH_DEPTH // 10 页），一次扣除会超过突发容量
+            for _ in range(SEARCH_DEPTH // 10):
+                bucket.acquire()
+            results = scraper.search_music_raw(keyword, target_count=SEARCH_DEPTH)
+            stats["searched"] += 1
+
+        # 热搜词可能是歌名也可能是歌手名：先按歌名匹配，再按歌手匹配
+        best = module.find_strict_match(keyword, None, results) or module.find_strict_match(None, keyword, results)
+        if not best or str(best.get("songid", "N/A")) == "N/A":
+            stats["no_match"] += 1
+            continue
+
+        # 与交互式下载走同一个 QualityLadder：已缓存的等级不发请求，新解析的等级连同可用性一起记录
+        resolved = resolver.resolve(best["songid"])
+        if resolved and resolved["from_cache"]:
+            stats["cached"] += 1
+        elif resolved:
+            stats["resolved"] += 1
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按热门关键词预热搜索与直链缓存。")
+    parser.add_argument("--once", action="store_true", help="只执行一轮")
+    parser.add_argument("--interval", type=int, default=WARM_INTERVAL, help="两轮之间的间隔（秒）")
+    parser.add_argument("--limit", type=int, default=WARM_LIMIT, help="每轮预热的热搜词数量")
+    parser.add_argument("--ladder", default=",".join(quality_ladder.DEFAULT_LADDER),
+                        help=f"预解析的音质阶梯，可选: {','.join(quality_ladder.LEVELS)}")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SECOND, help="每秒允许的请求数")
+    args = parser.parse_args(argv)
+
+    module = load_scraper_module()
+    scraper = module.MyFreeMp3Scraper()
+    bucket = TokenBucket(args.rate, RATE_BURST)
+    ladder = [level.strip() for level in args.ladder.split(",") if level.strip() in quality_ladder.LEVELS]
+
+    while True:
+        started = time.perf_counter()
+        stats = warm_once(scraper, module, bucket, args.limit, ladder)
+        print(f"[{time.strftime('%H:%M:%S')}] 预热完成 ({time.perf_counter() - started:.1f} 秒): {stats}, "
+              f"缓存: {search_cache.get_cache().stats()}")
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+内容寻址的下载仓库（跨工具去重）。
+
+不同脚本会把同一首歌以不同的文件名保存到 downloads/ 中（歌曲海: "歌名 - 歌手.mp3"，
+music_scraper_0.5: "歌名 - 歌手_songid.mp3"，music_scraper_0.2: "..._128kbps.mp3"，
+vkeys: "..._id.flac"），导致重复下载。本模块把文件按 SHA-256 存放在
+downloads/.store/objects/ 下，再用硬链接挂到便于阅读的文件名上，并维护一份
+(provider, songid, quality) → hash 的清单。
+
+下载前先调用 materialize() 查询清单，命中则直接硬链接出文件、跳过网络请求；
+下载成功后调用 ingest() 把文件收入仓库。相同内容的文件在磁盘上只保留一份。
+两者都会同时更新音乐库索引 (library_index)。
+
+命令行:
+    python content_store.py dedupe [downloads]   # 把已有的重复文件折叠为硬链接
+    python content_store.py stats                # 查看仓库统计
+    python content_store.py verify               # 重新计算对象哈希，找出损坏的文件
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import library_index
+import metrics
+
+# --- 配置 ---
+DOWNLOAD_DIR = Path("downloads")
+STORE_DIR = DOWNLOAD_DIR / ".store"
+AUDIO_EXTENSIONS = {".mp3", ".flac", ".aac", ".m4a", ".ogg", ".wav"}
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path) -> str:
+    """计算文件的 SHA-256（按 1MB 分块读取）。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path):
+    """优先创建硬链接；文件系统不支持（或跨设备）时退化为复制。"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ContentStore:
+    """
+    内容寻址仓库。对象文件保存在 objects/<hash 前两位>/<hash>.<扩展名>，
+    清单保存在 SQLite 中，可在多线程间共享。
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.root / "manifest.sqlite3", check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                ext TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                provider TEXT NOT NULL,
+                songid TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                hash TEXT NOT NULL REFERENCES objects(hash),
+                PRIMARY KEY (provider, songid, quality)
+            );
+        """)
+        self._conn.commit()
+
+    def object_path(self, digest: str, ext: str) -> Path:
+        """返回对象文件在仓库中的路径。"""
+        return self.objects_dir / digest[:2] / f"{digest}{ext}"
+
+    def lookup(self, provider, songid, quality):
+        """
+        查询清单。
+
+        Returns:
+            tuple or None: 命中且对象文件仍存在时返回 (hash, ext)，否则返回 None。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT o.hash, o.ext FROM entries e JOIN objects o ON o.hash = e.hash "
+                "WHERE e.provider = ? AND e.songid = ? AND e.quality = ?",
+                (provider, str(songid), str(quality))).fetchone()
+        if row and self.object_path(*row).exists():
+            return row
+        return None
+
+    def materialize(self, provider, songid, quality, dest_dir, stem):
+        """
+        下载前调用：若清单中已有该曲目，则把对象硬链接为 dest_dir/stem.<扩展名>。
+
+        扩展名取自仓库中保存的对象，因此调用方只需给出不带扩展名的文件名
+        （"G.E.M.邓紫棋" 这类名字不能用 Path.with_suffix 处理）。
+
+        Returns:
+            Path or None: 命中时返回可用的文件路径，否则返回 None（调用方应继续下载）。
+        """
+        hit = self.lookup(provider, songid, quality)
+        metrics.cache_lookup("content_store", bool(hit))
+        if not hit:
+            return None
+
+        digest, ext = hit
+        dest = Path(dest_dir) / f"{stem}{ext}"
+        if dest.exists():
+            return dest
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(self.object_path(digest, ext), dest)
+        library_index.get_index().record_file(dest, provider, songid, quality, digest)
+        return dest
+
+    def ingest(self, path, provider=None, songid=None, quality=None, digest=None) -> str:
+        """
+        下载完成后调用：把文件收入仓库并（可选地）登记 (provider, songid, quality)。
+
+        内容已存在于仓库时，path 会被替换为指向已有对象的硬链接，重复的字节随之释放。
+
+        Args:
+            digest (str): 已在下载过程中算好的 SHA-256，可省去一次重新读取。
+
+        Returns:
+            str: 文件内容的 SHA-256。
+        """
+        path = Path(path)
+        digest = digest or hash_file(path)
+        ext = path.suffix.lower()
+        obj = self.object_path(digest, ext)
+
+        with self._lock:
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            if not obj.exists():
+                _link_or_copy(path, obj)
+            elif not os.path.samefile(path, obj):
+                tmp = path.with_name(path.name + ".dedupe")
+                _link_or_copy(obj, tmp)
+                os.replace(tmp, path)
+
+            self._conn.execute(
+                "INSERT OR IGNORE INTO objects (hash, size, ext, created_at) VALUES (?, ?, ?, ?)",
+                (digest, obj.stat().st_size, ext, time.time()))
+            if provider and songid is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (provider, songid, quality, hash) VALUES (?, ?, ?, ?)",
+                    (provider, str(songid), str(quality), digest))
+            self._conn.commit()
+
+        library_index.get_index().record_file(path, provider, songid, quality, digest)
+        return digest
+
+    def dedupe_tree(self, root=DOWNLOAD_DIR) -> int:
+        """
+        扫描目录中已有的音频文件并全部收入仓库，重复内容折叠为硬链接。
+
+        Returns:
+            int: 被折叠（原本重复）的文件数量。
+        """
+        collapsed = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                if path.suffix.lower() not in AUDIO_EXTENSIONS:
+                    continue
+                digest = hash_file(path)
+                obj = self.object_path(digest, path.suffix.lower())
+                if obj.exists() and not os.path.samefile(path, obj):
+                    collapsed += 1
+                self.ingest(path, digest=digest)
+        return collapsed
+
+    def verify(self) -> list:
+        """
+        重新计算仓库中每个对象的 SHA-256，与下载时记录的哈希比对。
+
+        Returns:
+            list: 缺失或内容不符的对象路径。
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT hash, ext FROM objects").fetchall()
+        bad = []
+        for digest, ext in rows:
+            obj = self.object_path(digest, ext)
+            if not obj.exists() or hash_file(obj) != digest:
+                bad.append(obj)
+        return bad
+
+    def stats(self) -> dict:
+        """返回仓库中的对象数、登记数和对象总字节数。"""
+        with self._lock:
+            objects, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"objects": objects, "entries": entries, "bytes": total_bytes}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> ContentStore:
+    """返回进程内共享的默认仓库（downloads/.store）。"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ContentStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    store = get_store()
+
+    if command == "dedupe":
+        target = Path(sys.argv[2]) if len(sys.argv) > 2 else DOWNLOAD_DIR
+        print(f"正在扫描 '{target}' 并折叠重复文件...")
+        print(f"完成，共折叠 {store.dedupe_tree(target)} 个重复文件。")
+        print(store.stats())
+    elif command == "stats":
+        print(store.stats())
+    elif command == "verify":
+        bad = store.verify()
+        for path in bad:
+            print(f"❌ 缺失或内容不符: {path}")
+        print(f"校验完成，共 {len(bad)} 个问题对象。")
+        sys.exit(1 if bad else 0)
+    else:
+        print("用法: python content_store.py [dedupe [目录] | stats | verify]")
+        sys.exit(1)
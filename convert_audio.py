@@ -1,6 +1,8 @@
 import os
 import subprocess
 
+import library_index
+
 def convert_aac_to_mp3_in_folder(input_folder_name="downloads"):
     """
     将指定文件夹内所有 .aac 文件转换为 .mp3 格式。
@@ -30,26 +32,34 @@ def convert_aac_to_mp3_in_folder(input_folder_name="downloads"):
         print("请确保在当前脚本目录下有名为 'downloads' 的子文件夹，并且里面有 AAC 文件。")
         return
 
-    aac_files = []
-    for filename in os.listdir(full_input_dir):
-        if filename.lower().endswith(".aac"):
-            aac_files.append(filename)
+    # 3. 增量同步音乐库索引（只重新扫描有变化的目录），再从索引中查询待转换的 AAC 文件
+    index = library_index.get_index()
+    index.reconcile(full_input_dir)
+    aac_paths = index.pending_conversions("aac", full_input_dir)
 
-    if not aac_files:
+    if not aac_paths:
         print(f"\n在 '{full_input_dir}' 目录中没有找到 .aac 文件。")
         return
 
-    print(f"\n找到 {len(aac_files)} 个 AAC 文件，开始转换...")
+    print(f"\n找到 {len(aac_paths)} 个待转换的 AAC 文件，开始转换...")
 
-    for aac_filename in aac_files:
-        input_filepath = os.path.join(full_input_dir, aac_filename)
+    for input_path in aac_paths:
+        input_filepath = str(input_path)
+        aac_filename = input_path.name
         # 获取不带扩展名的文件名
         name_without_ext = os.path.splitext(aac_filename)[0]
         output_filepath = os.path.join(full_input_dir, f"{name_without_ext}.mp3")
 
-        # FFmpeg 转换命令
+        # 索引中较早登记的待转换记录，可能在本工具以外已经转换过
+        if os.path.exists(output_filepath):
+            print(f"\n已存在 '{os.path.basename(output_filepath)}'，跳过 '{aac_filename}'。")
+            index.mark_conversion(input_filepath, library_index.CONVERSION_DONE, output_filepath)
+            continue
+
+        # FFmpeg 转换命令（-n：目标文件已存在时不覆盖，也不会停下来等待交互确认）
         command = [
             "ffmpeg",
+            "-n",
             "-i", input_filepath,
             "-c:a", "libmp3lame",
             "-qscale:a", "2",
@@ -62,6 +72,7 @@ def convert_aac_to_mp3_in_folder(input_folder_name="downloads"):
             # 关键修改：添加 encoding='utf-8' 参数
             result = subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
             print(f"√ 成功转换 '{aac_filename}'。")
+            index.mark_conversion(input_filepath, library_index.CONVERSION_DONE, output_filepath)
             # 如果需要查看 FFmpeg 的详细输出，可以取消以下行的注释
             # print("FFmpeg 标准输出 (stdout):\n", result.stdout)
             # print("FFmpeg 错误输出 (stderr):\n", result.stderr)
@@ -69,6 +80,7 @@ def convert_aac_to_mp3_in_folder(input_folder_name="downloads"):
             print(f"× 转换 '{aac_filename}' 失败！")
             print(f"命令执行失败，返回码：{e.returncode}")
             print(f"FFmpeg 错误信息 (stderr):\n{e.stderr}")
+            index.mark_conversion(input_filepath, library_index.CONVERSION_FAILED)
         except FileNotFoundError:
             print("× 错误：'ffmpeg' 命令未找到。请确保 FFmpeg 已安装并添加到系统 PATH 中。")
             break
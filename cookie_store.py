@@ -0,0 +1,248 @@
+"""
+按站点持久化的 Cookie 存储（SQLite）。
+
+歌曲海的 PHPSESSID、myfreemp3 的 Cookie 字符串、网易云的 MUSIC_U 原先都写死在脚本里，过期后只能手动粘贴新值；
+db_0.4.py 则每次启动都先访问一次首页“预热”。这里把 Cookie 按主机名保存到磁盘:
+    - 脚本里原有的 Cookie 只作为种子：某个主机还没有保存过 Cookie 时才写入；
+    - 平时直接使用保存的 Cookie，不发预热请求；响应里的 Set-Cookie 合并回存储，下次启动继续使用；
+    - 只有响应被 response_classifier 判定为 anti_bot（期望 JSON 却拿到 HTML、被重定向到验证码页等）时
+      才重新访问首页刷新 Cookie，
+      并且同一主机在 REFRESH_MIN_INTERVAL 内最多刷新一次（跨进程，按存储中的刷新时间判断），
+      避免反爬持续生效时每个请求都触发一次刷新。
+
+典型用法见 request_with_refresh()：
+    response, verdict = cookie_store.request_with_refresh(
+        BASE_URL, lambda cookies: session.get(url, cookies=cookies, timeout=10),
+        warm_up=lambda: requests.get(BASE_URL + "/", timeout=10), expect=response_classifier.EXPECT_JSON)
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import metrics
+import response_classifier
+
+# --- 配置 ---
+STORE_PATH = Path("downloads") / ".meta" / "cookies.sqlite3"
+REFRESH_MIN_INTERVAL = 60
+
+
+def host_of(url) -> str:
+    """URL 的主机名（不含端口），也接受直接传入主机名。"""
+    return (urlsplit(url).hostname or "") if "//" in url else url.split(":")[0]
+
+
+def parse_cookie_header(header: str) -> dict:
+    """把浏览器复制来的 "a=1; b=2" 形式的 Cookie 字符串拆成字典。"""
+    cookies = {}
+    for part in (header or "").split(";"):
+        name, sep, value = part.strip().partition("=")
+        if sep and name:
+            cookies[name] = value
+    return cookies
+
+
+class CookieStore:
+    """按主机名保存 Cookie 的存储，可在多线程间共享；内存中缓存已读取的主机。"""
+
+    def __init__(self, db_path=STORE_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cookies (
+                host TEXT PRIMARY KEY,
+                cookies TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                refreshed_at REAL NOT NULL DEFAULT 0
+            );
+        """)
+        self._conn.commit()
+        self._hosts = {}
+        self._refresh_lock = threading.Lock()
+
+    def _load(self, host):
+        cookies = self._hosts.get(host)
+        if cookies is None:
+            row = self._conn.execute("SELECT cookies FROM cookies WHERE host = ?", (host,)).fetchone()
+            cookies = json.loads(row[0]) if row else {}
+            self._hosts[host] = cookies
+        return cookies
+
+    def _write(self, host, cookies, refreshed=False):
+        self._hosts[host] = cookies
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO cookies (host, cookies, updated_at, refreshed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(host) DO UPDATE SET cookies = excluded.cookies, updated_at = excluded.updated_at, "
+            "refreshed_at = CASE WHEN ? THEN excluded.refreshed_at ELSE refreshed_at END",
+            (host, json.dumps(cookies, ensure_ascii=False), now, now if refreshed else 0, refreshed))
+        self._conn.commit()
+
+    def get(self, url_or_host) -> dict:
+        """某个主机当前的 Cookie（副本，可直接作为 requests 的 cookies 参数）。"""
+        host = host_of(url_or_host)
+        with self._lock:
+            return dict(self._load(host))
+
+    def seed(self, url_or_host, cookies):
+        """主机还没有保存过 Cookie 时写入种子值（脚本中原有的硬编码 Cookie）；已有时不做任何事。"""
+        host = host_of(url_or_host)
+        if isinstance(cookies, str):
+            cookies = parse_cookie_header(cookies)
+        with self._lock:
+            if not self._load(host) and cookies:
+                self._write(host, dict(cookies))
+
+    def update(self, url_or_host, cookies):
+        """把响应里新设置的 Cookie 合并进存储，值没有变化时不写盘。"""
+        new = {name: value for name, value in dict(cookies or {}).items() if value is not None}
+        if not new:
+            return
+        host = host_of(url_or_host)
+        with self._lock:
+            current = self._load(host)
+            if any(current.get(name) != value for name, value in new.items()):
+                self._write(host, {**current, **new})
+
+    def refresh(self, url_or_host, warm_up) -> bool:
+        """
+        访问首页等页面重新获取 Cookie。
+
+        Args:
+            warm_up: 无参数的可调用对象，发出预热请求并返回响应；应使用不带旧 Cookie 的新会话。
+
+        Returns:
+            bool: 拿到了新 Cookie 时为 True；最近已刷新过或预热失败时为 False。
+        """
+        host = host_of(url_or_host)
+        with self._refresh_lock:
+            with self._lock:
+                row = self._conn.execute("SELECT refreshed_at FROM cookies WHERE host = ?", (host,)).fetchone()
+            if row and time.time() - row[0] < REFRESH_MIN_INTERVAL:
+                metrics.inc("music_cookie_refresh_total", host=host, outcome="skipped")
+                return False
+            print(f"[Cookie] {host} 的响应疑似反爬拦截，重新访问首页刷新 Cookie...")
+            try:
+                fresh = dict(warm_up().cookies)
+            except Exception as e:
+                print(f"[Cookie] 刷新 {host} 的 Cookie 失败: {e}")
+                fresh = {}
+            with self._lock:
+                # 无论成功与否都记录刷新时间，失败时同样在间隔内不再重试
+                self._write(host, {**self._load(host), **fresh}, refreshed=True)
+        metrics.inc("music_cookie_refresh_total", host=host, outcome="ok" if fresh else "failed")
+        return bool(fresh)
+
+    def hosts(self) -> list:
+        """[(主机名, Cookie 个数, 更新时间, 上次刷新时间), ...]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT host, cookies, updated_at, refreshed_at FROM cookies ORDER BY host").fetchall()
+        return [(host, len(json.loads(cookies)), updated_at, refreshed_at)
+                for host, cookies, updated_at, refreshed_at in rows]
+
+    def clear(self, url_or_host=None):
+        """删除某个主机（不指定时为全部主机）保存的 Cookie。"""
+        with self._lock:
+            if url_or_host is None:
+                self._conn.execute("DELETE FROM cookies")
+                self._hosts.clear()
+            else:
+                host = host_of(url_or_host)
+                self._conn.execute("DELETE FROM cookies WHERE host = ?", (host,))
+                self._hosts.pop(host, None)
+            self._conn.commit()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> CookieStore:
+    """进程内共享的默认 Cookie 存储。"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CookieStore()
+        return _default_store
+
+
+def request_with_refresh(url, send, warm_up, expect=response_classifier.EXPECT_JSON):
+    """
+    使用保存的 Cookie 发出请求并给响应分类；判定为反爬时刷新 Cookie 并重发一次。
+    请求前后都经过熔断器：主机熔断时直接抛出 CircuitOpenError，限流时先等待。
+
+    Args:
+        url (str): 用于确定主机的 URL。
+        send: 接收 cookies 字典、发出请求并返回响应的可调用对象。
+        warm_up: 刷新 Cookie 时使用的预热请求，见 CookieStore.refresh()。
+        expect (str): 该接口正常时返回的内容，见 response_classifier.classify()。
+
+    Returns:
+        tuple: (requests.Response, response_classifier.Verdict)，均为最后一次请求的。
+    """
+    store = get_store()
+    breaker = response_classifier.get_breaker()
+    breaker.check(url)
+    response = send(store.get(url))
+    verdict = response_classifier.classify_response(response, expect)
+    if verdict.label == response_classifier.ANTI_BOT and store.refresh(url, warm_up):
+        response = send(store.get(url))
+        verdict = response_classifier.classify_response(response, expect)
+    breaker.record(url, verdict)
+    store.update(url, response.cookies)
+    return response, verdict
+
+
+def gequhai_request(session, method, url, seed_cookies, warm_up_headers, expect=response_classifier.EXPECT_HTML,
+                    **kwargs):
+    """
+    歌曲海系脚本（download_music.py、music_bao.py、歌曲宝.py、music_整合转换格式.py）共用的请求入口：
+    先写入脚本中的种子 Cookie（已保存过时不覆盖），再经 request_with_refresh() 发出请求；
+    需要刷新时以新会话、warm_up_headers 访问站点首页。几个脚本共用同一份存储，任一脚本刷新过的 Cookie 其他脚本直接使用。
+
+    Args:
+        session (requests.Session): 发请求使用的会话。
+        method (str): 'GET' / 'POST' 等。
+        url (str): 请求地址，Cookie 按它的主机保存，预热时访问它所在站点的首页。
+        seed_cookies (dict): 种子 Cookie。
+        warm_up_headers (dict): 预热请求的请求头。
+        expect (str): 该接口正常时返回的内容，见 response_classifier.classify()。
+        **kwargs: 传给 session.request() 的其他参数（headers、data、timeout 等）。
+
+    Returns:
+        tuple: (response, verdict)，见 request_with_refresh()。
+    """
+    import requests
+
+    parts = urlsplit(url)
+    home = f"{parts.scheme}://{parts.netloc}/"
+    get_store().seed(home, seed_cookies)
+    return request_with_refresh(home, lambda jar: session.request(method, url, cookies=jar, **kwargs),
+                                lambda: requests.get(home, headers=warm_up_headers, timeout=10), expect)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    store = get_store()
+
+    if command == "list":
+        for host, count, updated_at, refreshed_at in store.hosts():
+            refreshed = time.strftime("%Y-%m-%d %H:%M", time.localtime(refreshed_at)) if refreshed_at else "从未"
+            print(f"{host}: {count} 个 Cookie，更新于 {time.strftime('%Y-%m-%d %H:%M', time.localtime(updated_at))}，"
+                  f"上次刷新 {refreshed}")
+    elif command == "set" and len(sys.argv) == 4:
+        # 手动粘贴浏览器中的 Cookie 字符串，覆盖同名 Cookie
+        store.update(sys.argv[2], parse_cookie_header(sys.argv[3]))
+        print(f"已更新 {host_of(sys.argv[2])} 的 Cookie。")
+    elif command == "clear":
+        store.clear(sys.argv[2] if len(sys.argv) > 2 else None)
+        print("已清除。下次请求时重新写入脚本中的种子 Cookie。")
+    else:
+        print('用法: python cookie_store.py [list | set <主机或URL> "a=1; b=2" | clear [主机或URL]]')
+        sys.exit(1)
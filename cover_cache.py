@@ -0,0 +1,286 @@
+"""
+专辑封面缓存。
+
+封面按 "规范化后的来源 URL" 和 "内容 SHA-256" 双重索引：
+    - 同一张图的不同 URL 写法（http/https、尺寸参数 ?param=300y300、参数顺序不同）映射到同一个 URL 键；
+    - 同一专辑各曲目的封面即使来自不同的 URL，只要内容相同，磁盘上也只保存一份。
+原图保存在 downloads/.covers/<hash 前两位>/<hash>.<扩展名>，固定尺寸的缩略图
+（THUMBNAIL_SIZES）在第一次需要时由进程池统一生成，之后的请求直接读本地文件。
+
+缩略图依赖可选的 Pillow (pip install Pillow)；未安装时 thumbnail() 退回原图。
+
+命令行:
+    python cover_cache.py fetch <url> [尺寸]    # 获取封面（及指定尺寸的缩略图），输出本地路径
+    python cover_cache.py index [downloads]     # 收录 downloads/ 中已有的 AlbumArt*.jpg / Folder.jpg
+    python cover_cache.py thumbs [--workers N]  # 为所有封面生成缺失的缩略图
+    python cover_cache.py stats
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# --- 配置 ---
+DOWNLOAD_DIR = Path("downloads")
+COVER_DIR = DOWNLOAD_DIR / ".covers"
+INDEX_PATH = DOWNLOAD_DIR / ".meta" / "covers.sqlite3"
+THUMBNAIL_SIZES = (64, 300, 800)
+THUMBNAIL_QUALITY = 88
+THUMBNAIL_WORKERS = None  # None 表示使用 CPU 核数
+FETCH_TIMEOUT = 15
+# 各图床用于请求缩放版本的查询参数，规范化 URL 时去掉，始终缓存原图
+RESIZE_PARAMS = {"param", "imageview", "thumbnail", "type", "max_age"}
+# Windows Media Player 等工具在音乐目录里留下的封面文件
+LOCAL_COVER_PATTERN = re.compile(r'^(AlbumArt.*|Folder)\.(jpe?g|png)$', re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化封面 URL：统一为 https、小写主机名、去掉缩放参数与片段、查询参数排序。
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    query = sorted((k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in RESIZE_PARAMS)
+    scheme = "https" if parts.scheme in ("http", "https", "") else parts.scheme
+    return urllib.parse.urlunsplit((scheme, parts.netloc.lower(), parts.path, urllib.parse.urlencode(query), ""))
+
+
+def _sniff_ext(data: bytes) -> str:
+    if data.startswith(b'\x89PNG'):
+        return ".png"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return ".webp"
+    return ".jpg"
+
+
+def _make_thumbnail(src: str, dst: str, size: int) -> bool:
+    """进程池任务：生成不超过 size×size 的 JPEG 缩略图（保持比例）。"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with Image.open(src) as image:
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+        tmp = f"{dst}.tmp"
+        image.save(tmp, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(tmp, dst)
+    return True
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class CoverCache:
+    """封面缓存，可在多线程间共享；缩略图在进程池中生成。"""
+
+    def __init__(self, root=COVER_DIR, db_path=INDEX_PATH):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                hash TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL REFERENCES images(hash),
+                fetched_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def image_path(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{ext}"
+
+    def thumbnail_path(self, digest: str, size: int) -> Path:
+        return self.root / digest[:2] / f"{digest}_{size}.jpg"
+
+    def _lookup_url(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT i.hash, i.ext FROM urls u JOIN images i ON i.hash = u.hash WHERE u.url = ?",
+                (key,)).fetchone()
+        if row and self.image_path(*row).exists():
+            return row
+        return None
+
+    def add_bytes(self, data: bytes, url=None) -> str:
+        """
+        把图片收入缓存（内容相同的图片只保存一份），可选地登记来源 URL。
+
+        Returns:
+            str: 图片内容的 SHA-256。
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        ext = _sniff_ext(data)
+        path = self.image_path(digest, ext)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            self._conn.execute("INSERT OR IGNORE INTO images (hash, ext, size, created_at) VALUES (?, ?, ?, ?)",
+                               (digest, ext, len(data), time.time()))
+            if url:
+                self._conn.execute("INSERT OR REPLACE INTO urls (url, hash, fetched_at) VALUES (?, ?, ?)",
+                                   (normalize_url(url), digest, time.time()))
+            self._conn.commit()
+        return digest
+
+    def fetch(self, url):
+        """
+        获取封面原图的本地路径。已缓存时直接返回；同一 URL 并发请求时只下载一次。
+
+        Returns:
+            Path or None: 本地文件路径，下载失败返回 None。
+        """
+        if not url:
+            return None
+        key = normalize_url(url)
+        hit = self._lookup_url(key)
+        if hit:
+            return self.image_path(*hit)
+
+        with self._lock:
+            lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                hit = self._lookup_url(key)
+                if hit:
+                    return self.image_path(*hit)
+
+                import requests
+                try:
+                    response = requests.get(url, timeout=FETCH_TIMEOUT)
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    print(f"⚠️ 封面下载失败 ({url}): {e}")
+                    return None
+                if not response.content:
+                    return None
+                digest = self.add_bytes(response.content, url)
+                return self.image_path(digest, _sniff_ext(response.content))
+            finally:
+                with self._lock:
+                    self._fetch_locks.pop(key, None)
+
+    def fetch_bytes(self, url):
+        """同 fetch()，返回图片字节。"""
+        path = self.fetch(url)
+        return path.read_bytes() if path else None
+
+    def thumbnail(self, url, size: int):
+        """
+        获取指定尺寸的缩略图路径（size 应为 THUMBNAIL_SIZES 之一）。不存在时当场生成一次。
+
+        Returns:
+            Path or None: 缩略图路径；未安装 Pillow 时返回原图路径。
+        """
+        original = self.fetch(url)
+        if original is None:
+            return None
+        digest = original.name.split('.')[0]
+        thumb = self.thumbnail_path(digest, size)
+        if thumb.exists():
+            return thumb
+        if _make_thumbnail(str(original), str(thumb), size):
+            return thumb
+        return original
+
+    def generate_thumbnails(self, sizes=THUMBNAIL_SIZES, workers=THUMBNAIL_WORKERS) -> int:
+        """
+        为所有缓存的封面生成缺失的缩略图，使用进程池并行缩放（缩放是 CPU 密集的操作）。
+
+        Returns:
+            int: 新生成的缩略图数量。
+        """
+        if not pillow_available():
+            print("⚠️ 未安装 Pillow，无法生成缩略图 (pip install Pillow)。")
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT hash, ext FROM images").fetchall()
+        tasks = [(str(self.image_path(digest, ext)), str(self.thumbnail_path(digest, size)), size)
+                 for digest, ext in rows for size in sizes
+                 if not self.thumbnail_path(digest, size).exists()]
+        if not tasks:
+            return 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_make_thumbnail, *zip(*tasks), chunksize=16)
+            return sum(1 for ok in results if ok)
+
+    def index_tree(self, root=DOWNLOAD_DIR) -> int:
+        """
+        收录目录中已有的封面文件（AlbumArt_*.jpg、Folder.jpg 等），相同内容只保存一份。
+
+        Returns:
+            int: 收录的文件数量。
+        """
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if LOCAL_COVER_PATTERN.match(filename):
+                    self.add_bytes(Path(dirpath, filename).read_bytes())
+                    count += 1
+        return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            images, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+            urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return {"images": images, "urls": urls, "bytes": total}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> CoverCache:
+    """返回进程内共享的默认封面缓存（downloads/.covers）。"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CoverCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = get_cache()
+
+    if command == "fetch" and len(sys.argv) > 2:
+        if len(sys.argv) > 3:
+            print(cache.thumbnail(sys.argv[2], int(sys.argv[3])))
+        else:
+            print(cache.fetch(sys.argv[2]))
+    elif command == "index":
+        target = sys.argv[2] if len(sys.argv) > 2 else DOWNLOAD_DIR
+        print(f"共收录 {cache.index_tree(target)} 个封面文件。")
+        print(cache.stats())
+    elif command == "thumbs":
+        workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else THUMBNAIL_WORKERS
+        print(f"新生成 {cache.generate_thumbnails(workers=workers)} 个缩略图。")
+    elif command == "stats":
+        print(cache.stats())
+    else:
+        print("用法: python cover_cache.py [fetch <url> [尺寸] | index [目录] | thumbs [--workers N] | stats]")
+        sys.exit(1)
@@ -4,8 +4,10 @@ import urllib.parse
 import os
 import time
 from datetime import datetime
-import pymysql
-from tqdm import tqdm
+
+import cookie_store
+import metrics
+import response_classifier
 
 # --- 数据库配置信息 ---
 # 这些信息需要与 docker-compose.yml 中设置的保持一致
@@ -21,6 +23,10 @@ DB_CONFIG = {
 }
 
 
+# myfreemp3 的 Cookie 种子：首次运行时写入 Cookie 存储 (cookie_store.py)，之后使用存储中的值并按需刷新
+MYFREEMP3_SEED_COOKIE = "UM_distinctid=1990d8e64ba4c9-0ead8f9b44a795-26011051-100200-1990d8e64bb14d; CNZZDATA1281319036=827025939-1756869060-https%253A%252F%252Fcn.bing.com%252F%7C175687656"
+
+
 class MusicDatabaseManager:
     """
     负责管理音乐数据的数据库操作。
@@ -35,6 +41,8 @@ class MusicDatabaseManager:
 
     def _get_connection(self):
         """获取或创建数据库连接"""
+        import pymysql  # 只有真正连接数据库时才加载驱动
+
         if self.conn is None or not self.conn.open:
             print(
                 f"尝试连接数据库: {self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']} (表名: {self.table_name}) with user {self.db_config['user']}...")
@@ -60,11 +68,14 @@ class MusicDatabaseManager:
                 self.conn = None
         return self.conn
 
+    @metrics.timed("db_insert", "mysql")
     def insert_music_tracks(self, music_list):
         """
         批量插入音乐数据到数据库。
         使用 REPLACE INTO 语句实现插入或更新，并防止重复插入。
         """
+        import pymysql
+
         if not music_list:
             return 0
 
@@ -135,34 +146,30 @@ class MyFreeMp3Scraper:
         self.base_url = "https://www.myfreemp3.com.cn/"
         self.session = requests.Session()
         self._set_common_headers()
+        # 不再每次启动都访问首页预热：使用 Cookie 存储中保存的 Cookie（首次运行时以下面的字符串为种子），
+        # 只有响应被判定为反爬时才访问首页刷新（见 _request）
+        cookie_store.get_store().seed(self.base_url, MYFREEMP3_SEED_COOKIE)
 
-        # 模拟访问首页，以获取可能存在的会话 Cookie。
-        # 即使手动设置了Cookie Header，Session仍会管理其他Set-Cookie
-        print(f"初始化Session，模拟首次访问 {self.base_url} 以获取最新Cookies...")
-        try:
-            initial_response = self.session.get(self.base_url, timeout=10)
-            initial_response.raise_for_status()
-            print(f"首页访问成功，获取到 {len(self.session.cookies)} 个Cookie。")
-            # 打印一下Session中当前存在的Cookie，用于调试
-            # print("当前Session Cookies:", dict(self.session.cookies))
-        except requests.exceptions.RequestException as e:
-            print(f"警告: 模拟访问首页失败，可能影响后续请求的Cookie携带: {e}")
+    def _warm_up(self):
+        """刷新 Cookie 时访问首页（新会话，不带旧 Cookie）。"""
+        return requests.get(self.base_url, headers={"User-Agent": self.session.headers["User-Agent"]}, timeout=10)
+
+    def _request(self, method, url, expect=response_classifier.EXPECT_JSON, **kwargs):
+        """发出请求并给响应分类，返回 (response, verdict)；判定为反爬时刷新 Cookie 并重发一次。"""
+        return cookie_store.request_with_refresh(
+            self.base_url, lambda jar: self.session.request(method, url, cookies=jar, **kwargs), self._warm_up,
+            expect)
 
     def _set_common_headers(self):
         """
         设置会话的通用请求头。
-        完全复制浏览器成功请求时的所有关键Header，包括最新的Cookie。
+        完全复制浏览器成功请求时的所有关键Header；Cookie 由 Cookie 存储在每次请求时带上。
         """
-        # !!! 这是最关键的修改，使用您提供的最新且完整的Cookie字符串作为Header
-        # 注意：这个Cookie可能会过期，如果再次出现问题，您需要从浏览器中获取最新的
-        latest_full_cookie_string = "UM_distinctid=1990d8e64ba4c9-0ead8f9b44a795-26011051-100200-1990d8e64bb14d; CNZZDATA1281319036=827025939-1756869060-https%253A%252F%252Fcn.bing.com%252F%7C175687656"
-
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
             "Accept": "*/*",
             "Accept-Encoding": "gzip, deflate, br, zstd",
             "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "Cookie": latest_full_cookie_string,  # 直接设置完整的Cookie Header
             "DNT": "1",
             "Priority": "u=1, i",  # 确保这个头被包含
             "Sec-Ch-Ua": '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
@@ -206,7 +213,9 @@ class MyFreeMp3Scraper:
 
         print("正在获取热门关键词...")
         try:
-            response = self.session.get(hotkey_url, params=params, timeout=10)
+            # 该接口返回 JSON 时也可能标为 text/html，按 HTML 分类（只识别验证码重定向 / 验证页）
+            response, _ = self._request("GET", hotkey_url, expect=response_classifier.EXPECT_HTML, params=params,
+                                        timeout=10)
             response.raise_for_status()
 
             # 放松 Content-Type 检查，直接尝试解析 JSON
@@ -253,17 +262,12 @@ class MyFreeMp3Scraper:
 
         print(f"正在搜索 '{keyword}' (第 {page} 页)...")
         try:
-            response = self.session.post(search_url, data=payload, headers=request_headers, timeout=10)
-            response.raise_for_status()
+            response, verdict = self._request("POST", search_url, data=payload, headers=request_headers, timeout=10)
 
-            # For search results, we strictly expect JSON. If HTML is returned, it means anti-bot.
-            content_type = response.headers.get('Content-Type', '').lower()
-            if 'json' not in content_type and 'javascript' not in content_type:
-                print(
-                    f"WARNING: 第 {page} 页搜索 '{keyword}' 失败。服务器返回内容不是JSON (Content-Type: {content_type})。")
-                print(f"HTTP Status Code: {response.status_code}")
-                # print(f"Response Headers: {response.headers}") # 调试时可以取消注释
-                print(f"Response Body (first 500 chars): {response.text[:500]}...")
+            # 搜索接口必须返回 JSON；分类器只看状态码、响应头和正文开头，反爬页 / 限流 / 接口失效都在这里拦下
+            if verdict.label != response_classifier.OK:
+                wait = f"，建议等待 {verdict.wait:.0f} 秒" if verdict.label == response_classifier.THROTTLED else ""
+                print(f"WARNING: 第 {page} 页搜索 '{keyword}' 失败: {verdict.label} ({verdict.reason}{wait})。")
                 return []
 
             result_json = response.json()
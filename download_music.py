@@ -7,11 +7,22 @@ import sys
 import os
 import subprocess
 from pathlib import Path
-from bs4 import BeautifulSoup
+
+import content_store
+import cookie_store
+import download_scheduler
+import file_sink
+import integrity
+import library_index
+import lyrics_cache
+import metrics
+import progress
+import response_classifier
+import tagging
 
 # --- 全局配置 ---
-# 注意：这些 Cookies 和 Headers 可能有有效期，如果代码运行失败，
-# 务必从浏览器中获取最新的 Cookies 和 Headers 并更新这里的字典。
+# 这些 Cookies 只是种子：首次运行时写入 Cookie 存储 (cookie_store.py)，之后使用存储中的值，
+# 响应被判定为反爬时自动访问首页刷新，不再需要手动更新这里的字典。
 # 警告：请在 GitHub Secrets 中存储敏感信息，这里仅为示例。
 cookies = {
     'Hm_tf_no8z3ihhnja': '1759891990',
@@ -24,7 +35,6 @@ cookies = {
     'Hm_lpvt_no8z3ihhnja': '1759982679',
 }
 
-# (其余 Headers 保持不变，代码略)
 get_html_headers = {
     'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
     'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8',
@@ -62,13 +72,15 @@ post_api_headers = {
 
 
 # --- 常量和配置 ---
+BASE_URL = "https://www.gequhai.com"
 INITIAL_REQUEST_DELAY = 1.0 
 MAX_RETRIES = 3  
 RETRY_DELAY_MULTIPLIER = 2  
 DOWNLOAD_DIR = Path("downloads")  
 FFMPEG_AVAILABLE = False  
-RETRY_TIME_PATTERN = re.compile(r'请 (\d+) 秒后再试。')
 BR_TAG_PATTERN = re.compile(r'<br\s*/?>', re.IGNORECASE)
+# 复用 TCP/TLS 连接（keep-alive）；在常驻进程 (music_daemon.py) 中所有任务共享同一个会话
+session = requests.Session()
 
 
 def print_status(message, end='\n'):
@@ -76,10 +88,423 @@ def print_status(message, end='\n'):
     print(message, end=end)
     sys.stdout.flush() 
 
-# (sanitize_filename, check_ffmpeg_available, convert_aac_to_mp3, download_lyric_file, 
-# download_music_file, get_song_details_from_html, get_music_url, search_songs 函数保持不变，代码略)
-# 请确保将您的原完整函数复制到最终的 `download_music.py` 文件中！
-# 避免文件过长，这里只展示修改后的 `__main__`。
+
+# --- FFmpeg 检查与转换功能 ---
+
+def check_ffmpeg_available():
+    """检查系统是否安装了 FFmpeg 并返回其可用性。"""
+    global FFMPEG_AVAILABLE
+    try:
+        subprocess.run(["ffmpeg", "-version"], check=True, capture_output=True, text=True, encoding='utf-8')
+        FFMPEG_AVAILABLE = True
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        FFMPEG_AVAILABLE = False
+        return False
+
+
+@metrics.timed("convert", "ffmpeg")
+def convert_aac_to_mp3(input_filepath):
+    """
+    将指定的 AAC 文件转换为 MP3 格式，并在成功后删除原文件。
+
+    Args:
+        input_filepath (Path): 待转换的 AAC 文件的完整路径。
+
+    Returns:
+        Path or None: 转换成功返回 MP3 文件路径，否则返回 None。
+    """
+    if not FFMPEG_AVAILABLE:
+        print_status("  [转换] 警告: FFmpeg 不可用，跳过 AAC 到 MP3 转换。")
+        return None
+
+    if input_filepath.suffix.lower() != '.aac':
+        return None
+
+    output_filepath = input_filepath.with_suffix(".mp3")
+    if output_filepath.exists():
+        print_status(f"  [转换] 已存在 {output_filepath.name}，跳过转换。")
+        library_index.get_index().mark_conversion(input_filepath, library_index.CONVERSION_DONE, output_filepath)
+        return output_filepath
+    print_status(f"  [转换] 检测到 AAC 文件，开始转换为 MP3: {input_filepath.name}...")
+
+    # -n：目标文件已存在时不覆盖，也不会停下来等待交互确认
+    command = [
+        "ffmpeg",
+        "-n",
+        "-i", str(input_filepath),
+        "-c:a", "libmp3lame",
+        "-qscale:a", "2",
+        str(output_filepath)
+    ]
+
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', timeout=60)
+        print_status(f"  [转换] √ 成功转换为: {output_filepath.name}")
+        removed = False
+        try:
+            os.remove(input_filepath)
+            removed = True
+            print_status(f"  [转换] √ 成功删除原 AAC 文件: {input_filepath.name}")
+        except OSError as e:
+            print_status(f"  [转换] 警告: 无法删除原 AAC 文件: {e}")
+        library_index.get_index().mark_conversion(input_filepath, library_index.CONVERSION_DONE, output_filepath,
+                                                  remove_source=removed)
+        return output_filepath
+    except subprocess.CalledProcessError as e:
+        print_status(f"  [转换] × 转换失败！文件: {input_filepath.name}")
+        print_status(f"  [转换] FFmpeg 错误信息 (stderr):\n{e.stderr[:500]}...")
+    except subprocess.TimeoutExpired:
+        print_status(f"  [转换] × 转换超时失败！文件: {input_filepath.name}")
+    except Exception as e:
+        print_status(f"  [转换] × 转换时发生未知错误: {e}")
+    library_index.get_index().mark_conversion(input_filepath, library_index.CONVERSION_FAILED)
+    return None
+
+
+# --- 下载功能辅助函数 ---
+
+def sanitize_filename(name):
+    """
+    清理文件名中不安全的字符，避免文件系统错误。
+    """
+    return re.sub(r'[\\/:*?"<>|]', '_', name)
+
+
+def download_lyric_file(content, title, artist, extension):
+    """
+    将歌词内容保存为 'downloads/歌曲名 - 艺术家.扩展名'（.lrc 或 .txt）。
+    """
+    if not content:
+        return False
+
+    DOWNLOAD_DIR.mkdir(exist_ok=True)
+    file_path = DOWNLOAD_DIR / f"{sanitize_filename(title)} - {sanitize_filename(artist)}.{extension}"
+
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        print_status(f"  [歌词] 已保存: {file_path.name}")
+        return True
+    except OSError as e:
+        print_status(f"  [歌词] 错误: 保存 {file_path.name} 失败: {e}")
+        return False
+
+
+@metrics.timed("download", "gequhai")
+def download_music_file(url, title, artist, lrc_content=None, txt_content=None, track_id=None):
+    """
+    根据 URL 下载音乐文件，并以 'downloads/歌曲名 - 艺术家.扩展名' 格式保存。
+    同时保存 .lrc / .txt 歌词；成功下载后如果是 .aac 则自动转换为 .mp3。
+    提供 track_id 时会先查询内容仓库 (content_store)，已下载过的曲目直接硬链接出来，不再请求网络；
+    歌词同时写入歌词缓存 (lyrics_cache)，本次页面未取到歌词时从缓存补齐。
+
+    Returns:
+        Path or False: 成功（或文件已存在）时返回最终的文件路径，失败返回 False。
+    """
+    if track_id:
+        cache = lyrics_cache.get_cache()
+        cache.put("gequhai", track_id, {"lrc": lrc_content, "txt": txt_content})
+        cached_lyrics = cache.get("gequhai", track_id) or {}
+        lrc_content = lrc_content or cached_lyrics.get("lrc")
+        txt_content = txt_content or cached_lyrics.get("txt")
+
+    # 歌词不依赖音频链接，先保存
+    download_lyric_file(lrc_content, title, artist, 'lrc')
+    download_lyric_file(txt_content, title, artist, 'txt')
+
+    name_stem = f"{sanitize_filename(title)} - {sanitize_filename(artist)}"
+    if track_id:
+        cached_path = content_store.get_store().materialize("gequhai", track_id, "default", DOWNLOAD_DIR, name_stem)
+        if cached_path:
+            print_status(f"  [下载] 内容仓库中已有该歌曲，直接链接: {cached_path.name}")
+            return cached_path
+
+    if not url:
+        return False
+
+    # 提取 URL 路径中的扩展名，支持带查询参数的 URL
+    extension_match = re.search(r'\.(\w{2,4})(?:[?#].*)?$', urllib.parse.urlparse(url).path)
+    extension = extension_match.group(1).lower() if extension_match else 'mp3'
+
+    filename = f"{name_stem}.{extension}"
+    DOWNLOAD_DIR.mkdir(exist_ok=True)
+    file_path = DOWNLOAD_DIR / filename
+    part_path = DOWNLOAD_DIR / f"{filename}.part"
+
+    # 跳过判断先查音乐库索引（任意音频扩展名的同名文件都算已下载，已删除的文件会被移出索引）；
+    # 索引不认识的文件（例如手动拷进下载目录的）再用一次 stat 兜底，并补登记到索引
+    index = library_index.get_index()
+    existing_path = index.find_by_stem(DOWNLOAD_DIR, name_stem)
+    if existing_path is None and file_path.exists():
+        index.record_file(file_path, provider="gequhai")
+        existing_path = file_path
+    if existing_path:
+        print_status(f"  [下载] 文件已存在，跳过下载: {existing_path.name}")
+        if existing_path.suffix.lower() == '.aac' and FFMPEG_AVAILABLE:
+            return convert_aac_to_mp3(existing_path) or existing_path
+        return existing_path
+
+    try:
+        # 移除 Referer 和不相关的 Cookies，使用简洁 Headers 避免防盗链
+        download_headers = {
+            'User-Agent': get_html_headers['user-agent'],
+            'Accept': '*/*',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+        }
+
+        print_status(f"  [下载] 正在请求下载链接...", end='')
+
+        # 传输槽由全局下载调度器分配（全局 / 每主机并发上限，交互式优先于批量）。
+        # 限流等待放在申请传输槽之前：等待期间不占用槽位，被限流后先归还槽位，等待结束再重新申请
+        breaker = response_classifier.get_breaker()
+        for attempt in range(2):
+            breaker.check(url)  # 主机被限流时先等待，熔断时抛出 CircuitOpenError
+            with download_scheduler.get_scheduler().slot(url) as transfer:
+                # 只凭状态码和响应头判断链接是否可用，失效 / 被拦截时不读取正文，直接关闭连接
+                response = session.get(url, headers=download_headers, stream=True, timeout=30)
+                verdict = response_classifier.classify_response(response, response_classifier.EXPECT_AUDIO,
+                                                                sniff=False)
+                breaker.record(url, verdict)
+                if verdict.label == response_classifier.THROTTLED and not attempt and \
+                        verdict.wait <= response_classifier.MAX_THROTTLE_WAIT:
+                    response.close()
+                    print_status(f" 被限流 ({verdict.reason})，{verdict.wait:.0f} 秒后重试...", end='')
+                    continue
+
+                if verdict.label != response_classifier.OK:
+                    response.close()
+                    print_status(f"  [下载] 错误: 下载链接不可用 ({verdict.label}: {verdict.reason})。", end='\n')
+                    return False
+
+                file_size = response.headers.get('Content-Length')
+                file_size_mb = f"约 {int(file_size) / (1024 * 1024):.2f} MB" if file_size else "未知大小"
+                print_status(f"  [下载] 开始下载 ({file_size_mb})...", end='')
+
+                # 边写边校验（哈希 / Content-Length / 音频魔数），先写入 .part，校验通过后再改名
+                verifier = integrity.StreamVerifier(integrity.expected_length_from_headers(response.headers))
+                with open(part_path, 'wb') as f, \
+                        progress.get_tracker().start_file(file_path.name, verifier.expected_length) as handle:
+                    file_sink.write_response(response, f, verifier=verifier, transfer=transfer,
+                                             progress=handle.add)
+                    digest = verifier.finish()
+            break
+        os.replace(part_path, file_path)
+
+        print_status(f" --> 成功保存为: {file_path.name}", end='\n')
+
+        if FFMPEG_AVAILABLE:
+            converted_path = convert_aac_to_mp3(file_path)
+            if converted_path:
+                file_path, digest = converted_path, None
+
+        # 把歌名、歌手和歌词写入标签（.aac 无法写标签，会被跳过）
+        if tagging.tag_track(file_path, title, artist, lyrics=lrc_content):
+            digest = None
+
+        if track_id:
+            content_store.get_store().ingest(file_path, "gequhai", track_id, "default", digest=digest)
+        else:
+            library_index.get_index().record_file(file_path, provider="gequhai", digest=digest)
+
+        return file_path
+
+    except integrity.IntegrityError as err:
+        print_status(f"  [下载] 错误: 下载内容校验失败: {err}", end='\n')
+    except requests.exceptions.RequestException as err:
+        print_status(f"  [下载] 错误: 下载时发生网络错误: {err}", end='\n')
+    except Exception as e:
+        print_status(f"  [下载] 错误: 下载文件时发生未知错误: {e}", end='\n')
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+
+    return False
+
+
+# --- 歌曲信息获取函数 ---
+
+def search_songs(keyword):
+    """
+    根据关键词搜索歌曲，并提取歌曲ID、标题和艺术家。
+    """
+    encoded_keyword = urllib.parse.quote(keyword)
+    search_url = f'{BASE_URL}/s/{encoded_keyword}'
+
+    song_list = []
+    print_status(f"--- 步骤 1: 搜索关键词 '{keyword}' (URL: {search_url}) ---")
+
+    try:
+        response, verdict = cookie_store.gequhai_request(session, 'GET', search_url, cookies, get_html_headers,
+                                                         headers=get_html_headers, timeout=10)
+        if verdict.label == response_classifier.THROTTLED and verdict.wait <= response_classifier.MAX_THROTTLE_WAIT:
+            # 限流时重试一次，等待由熔断器在发出请求前完成
+            print_status(f"  请求过于频繁 ({verdict.reason})，等待 {verdict.wait:.0f} 秒后重试...")
+            response, verdict = cookie_store.gequhai_request(session, 'GET', search_url, cookies, get_html_headers,
+                                                             headers=get_html_headers, timeout=10)
+        if verdict.label != response_classifier.OK:
+            print_status(f"  错误: 搜索页响应异常 ({verdict.label}: {verdict.reason})。")
+            return []
+
+        from bs4 import BeautifulSoup  # 只有解析搜索结果页时才需要，避免拖慢启动
+
+        soup = BeautifulSoup(response.text, 'html.parser')
+
+        tbody = soup.find('tbody')
+        if not tbody:
+            print_status("  未在搜索结果中找到歌曲列表。")
+            return []
+
+        for row in tbody.find_all('tr'):
+            link_tag = row.find('a', href=re.compile(r'/play/\d+'))
+            if not link_tag:
+                continue
+
+            song_id = link_tag['href'].split('/')[-1]
+            song_title = link_tag.get_text(strip=True)
+            artist_td = link_tag.find_parent('td').find_next_sibling('td')
+            artist = artist_td.get_text(strip=True) if artist_td else '未知艺术家'
+
+            song_list.append({
+                'id': song_id,
+                'title': song_title,
+                'artist': artist
+            })
+
+        print_status(f"  成功搜索到 {len(song_list)} 首歌曲。")
+    except requests.exceptions.RequestException as err:
+        print_status(f"  错误: 搜索歌曲时发生网络或HTTP错误: {err}")
+    except Exception as e:
+        print_status(f"  错误: 解析搜索结果时发生未知错误: {e}")
+
+    return song_list
+
+
+def get_song_details_from_html(track_id):
+    """
+    从歌曲详情页的 HTML 中提取 play_id 以及歌词。
+
+    Returns:
+        tuple: (play_id, lrc_content, txt_content)，获取失败的项为 None。
+    """
+    play_page_url = f'{BASE_URL}/play/{track_id}'
+
+    try:
+        response_get, verdict = cookie_store.gequhai_request(session, 'GET', play_page_url, cookies, get_html_headers,
+                                                             headers=get_html_headers, timeout=10)
+    except requests.exceptions.RequestException:
+        return None, None, None
+    if verdict.label != response_classifier.OK:
+        return None, None, None
+
+    html_content = response_get.text
+    match = re.search(r"window\.play_id\s*=\s*'([^']*)';", html_content)
+    play_id = match.group(1) if match else None
+
+    lrc_content = None
+    txt_content = None
+    try:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html_content, 'html.parser')
+        # 歌词容器的 id/class 中都带有 "lrc"，行与行之间用 <br> 分隔
+        lrc_tag = soup.find(id=re.compile('lrc', re.IGNORECASE)) or \
+            soup.find(class_=re.compile('lrc', re.IGNORECASE))
+        if lrc_tag:
+            lrc_html = BR_TAG_PATTERN.sub('\n', lrc_tag.decode_contents())
+            lrc_content = BeautifulSoup(lrc_html, 'html.parser').get_text().strip() or None
+        if lrc_content:
+            txt_content = re.sub(r'\[\d{1,2}:\d{2}(?:[.:]\d{1,3})?\]', '', lrc_content).strip()
+    except Exception:
+        pass
+
+    return play_id, lrc_content, txt_content
+
+
+@metrics.timed("resolve", "gequhai")
+def get_music_url(track_id):
+    """
+    通过歌曲的 track_id 获取音乐的播放链接和歌词。
+    加入了重试和动态延时机制。
+
+    Returns:
+        tuple: (music_data, lrc_content, txt_content)，music_data 获取失败时为 None。
+    """
+    lrc_content = None
+    txt_content = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt > 0:
+            metrics.retry("resolve", "gequhai")
+            print_status(f"\n  > 尝试重试... (第 {attempt} 次)", end='')
+            time.sleep(INITIAL_REQUEST_DELAY * RETRY_DELAY_MULTIPLIER)
+
+        # 步骤 2.1: 从 HTML 中提取 play_id 和歌词
+        extracted_play_id, page_lrc, page_txt = get_song_details_from_html(track_id)
+        lrc_content = lrc_content or page_lrc
+        txt_content = txt_content or page_txt
+        if not extracted_play_id:
+            if attempt == MAX_RETRIES:
+                print_status(f"\n  未能 {track_id} 找到 play_id，已达最大重试次数。")
+            continue
+
+        # 步骤 2.2: 使用提取到的 play_id 调用 API
+        api_url = f'{BASE_URL}/api/music'
+        api_data = {
+            'id': extracted_play_id,
+            'type': '0',
+        }
+
+        try:
+            response_post, verdict = cookie_store.gequhai_request(session, 'POST', api_url, cookies, get_html_headers,
+                                                                  expect=response_classifier.EXPECT_JSON,
+                                                                  headers=post_api_headers, data=api_data, timeout=15)
+
+            # 按分类结果处理：限流时按服务器给出的时间等待后重试（等待由熔断器在下一次请求前完成），
+            # 反爬在 gequhai_request 中已刷新过 Cookie，其余情况不再浪费重试
+            if verdict.label == response_classifier.THROTTLED:
+                if verdict.wait > response_classifier.MAX_THROTTLE_WAIT:
+                    print_status(f"\n  错误: 请求过于频繁，服务器要求等待 {verdict.wait:.0f} 秒 (ID: {track_id})。")
+                    return None, lrc_content, txt_content
+                print_status(f"\n  请求过于频繁 ({verdict.reason})，等待 {verdict.wait:.0f} 秒后重试...", end='')
+                continue
+            if verdict.label != response_classifier.OK:
+                print_status(f"\n  错误: API 响应异常 (ID: {track_id}): {verdict.label} ({verdict.reason})。")
+                return None, lrc_content, txt_content
+
+            json_data = response_post.json()
+            if json_data.get('code') == 200:
+                return json_data['data'], lrc_content, txt_content
+
+            error_msg = json_data.get('msg', '未知错误')
+            print_status(f"\n  API 返回错误 (ID: {track_id}): {error_msg}")
+            # 限流提示被转义成 \uXXXX 时分类器在正文开头认不出来，解析后再检查一次
+            hint = response_classifier.WAIT_HINT_PATTERN.search(error_msg)
+            if hint:
+                response_classifier.get_breaker().record(BASE_URL, response_classifier.Verdict(
+                    response_classifier.THROTTLED, float(hint.group(1)), hint.group(0)))
+                continue
+            return None, lrc_content, txt_content
+
+        except requests.exceptions.JSONDecodeError:
+            print_status(f"\n  错误: API 响应无法解析为 JSON (ID: {track_id})。")
+            return None, lrc_content, txt_content
+        except requests.exceptions.RequestException as err:
+            print_status(f"\n  错误: 调用 API 时发生网络错误 (ID: {track_id}): {err}")
+            if "Connection reset by peer" in str(err) or "Max retries exceeded" in str(err) or "Read timed out" in str(
+                    err):
+                print_status(f"  检测到连接相关错误，尝试重试...", end='')
+                time.sleep(INITIAL_REQUEST_DELAY)
+            else:
+                return None, lrc_content, txt_content
+        except Exception as e:
+            print_status(f"\n  错误: 处理API响应时发生未知错误 (ID: {track_id}): {e}")
+            return None, lrc_content, txt_content
+
+    print_status(f"\n  未能获取 {track_id} 的播放链接，已达最大重试次数。")
+    return None, lrc_content, txt_content
+
 
 # --- 主程序执行部分 (已修改为命令行模式) ---
 if __name__ == "__main__":
@@ -97,6 +522,12 @@ if __name__ == "__main__":
         print_status("未输入搜索关键词，程序退出。")
         sys.exit(1) 
 
+    # 守护进程在运行时交给它执行（连接、缓存、ffmpeg 检查和音乐库索引都已预热）；MUSIC_DAEMON=0 时仍在本进程内运行
+    import music_daemon
+    remote_status = music_daemon.try_remote("download", search_query, "gequhai")
+    if remote_status is not None:
+        sys.exit(remote_status)
+
     print_status(f"--- 欢迎使用 GitHub Actions 音乐下载工作流 ---")
     print_status(f"【目标关键词】: '{search_query}'")
     
@@ -105,6 +536,8 @@ if __name__ == "__main__":
         print_status("【格式转换】FFmpeg 检查成功，AAC 文件将自动转换为 MP3。")
     else:
         print_status("【格式转换】FFmpeg 警告: 转换功能可能不可用。")
+    # 增量同步音乐库索引（只扫描有变化的目录），后续的"已存在"判断都走索引查询
+    library_index.get_index().reconcile(DOWNLOAD_DIR)
     print_status("-" * 20)
 
     # 1. 搜索歌曲
@@ -129,7 +562,8 @@ if __name__ == "__main__":
                                            song_to_process['title'],
                                            song_to_process['artist'],
                                            lrc_content,
-                                           txt_content)
+                                           txt_content,
+                                           track_id=song_to_process['id'])
                                            
     print_status("-" * 20)
     if download_success:
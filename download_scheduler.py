@@ -0,0 +1,203 @@
+"""
+进程内统一的下载调度器。
+
+所有下载器（download_music.download_music_file、tencent_music_seacrch.actual_download、
+music_scraper_0.2 / 0.5 的 download_music 以及 vkeys_async）在开始传输前都要向调度器申请一个"传输槽"，
+传输结束后归还。调度器负责：
+    - 全局并发上限 (GLOBAL_LIMIT)，并为交互式下载预留 INTERACTIVE_RESERVE 个槽位，
+      批量任务再多也不会占满全部槽位；
+    - 每个主机的并发上限 (PER_HOST_LIMIT，可按主机单独设置 HOST_LIMITS)，避免单个 CDN 被打满；
+    - 优先级：交互式 (PRIORITY_INTERACTIVE) 永远排在批量 (PRIORITY_BATCH) 之前；
+    - 批量任务之间公平分配：每次从"当前活动传输最少"的任务中取最早排队的请求；
+    - 队列深度与活动传输统计 (stats())。
+
+优先级和所属任务通过上下文传递，下载函数本身不需要增加参数:
+
+    with download_scheduler.job_context("batch-1", download_scheduler.PRIORITY_BATCH):
+        download_music.download_music_file(...)   # 内部的 slot() 会按批量任务排队
+
+    with download_scheduler.get_scheduler().slot(url) as transfer:
+        for chunk in response.iter_content(...):
+            transfer.add_bytes(len(chunk))
+"""
+import contextvars
+import itertools
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+# --- 配置 ---
+GLOBAL_LIMIT = 6
+INTERACTIVE_RESERVE = 1
+PER_HOST_LIMIT = 2
+HOST_LIMITS = {}  # 例如 {"sycdn.kuwo.cn": 4}
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+_current_job = contextvars.ContextVar("download_job", default=(None, PRIORITY_INTERACTIVE))
+
+
+@contextmanager
+def job_context(job_id, priority=PRIORITY_BATCH):
+    """在当前线程 / 协程中把之后申请的传输槽标记为属于 job_id、优先级为 priority。"""
+    token = _current_job.set((job_id, priority))
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+
+def host_of(url) -> str:
+    return urllib.parse.urlsplit(url).hostname or ""
+
+
+class Transfer:
+    """一个已获准开始（或正在排队）的传输。"""
+
+    __slots__ = ("url", "host", "job", "priority", "seq", "queued_at", "started_at", "bytes", "_granted")
+
+    def __init__(self, url, job, priority, seq):
+        self.url = url
+        self.host = host_of(url)
+        self.job = job
+        self.priority = priority
+        self.seq = seq
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.bytes = 0
+        self._granted = threading.Event()
+
+    def add_bytes(self, n: int):
+        """下载循环中报告已接收的字节数，用于统计。"""
+        self.bytes += n
+
+
+class DownloadScheduler:
+    """线程安全的传输槽调度器。"""
+
+    def __init__(self, global_limit=GLOBAL_LIMIT, per_host_limit=PER_HOST_LIMIT, host_limits=None,
+                 interactive_reserve=INTERACTIVE_RESERVE):
+        self.global_limit = global_limit
+        self.per_host_limit = per_host_limit
+        self.host_limits = dict(HOST_LIMITS if host_limits is None else host_limits)
+        self.interactive_reserve = min(interactive_reserve, global_limit - 1)
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._active = []
+        self._host_active = {}
+        self._job_active = {}
+        self._job_last_served = {}
+        self._completed = 0
+        self._completed_bytes = 0
+        self._total_wait = 0.0
+
+    def _host_limit(self, host):
+        return self.host_limits.get(host, self.per_host_limit)
+
+    def _pick(self):
+        """选出下一个可以开始的排队请求；调用方需持有锁。"""
+        if len(self._active) >= self.global_limit:
+            return None
+        batch_allowed = len(self._active) < self.global_limit - self.interactive_reserve
+        host_ok = [t for t in self._waiting if self._host_active.get(t.host, 0) < self._host_limit(t.host)]
+
+        interactive = [t for t in host_ok if t.priority == PRIORITY_INTERACTIVE]
+        if interactive:
+            return min(interactive, key=lambda t: t.seq)
+        if not batch_allowed:
+            return None
+
+        # 批量任务之间公平分配：活动传输最少的任务优先，其次是最久没被服务的任务，最后按排队顺序
+        return min(host_ok, key=lambda t: (t.priority, self._job_active.get(t.job, 0),
+                                           self._job_last_served.get(t.job, 0), t.seq), default=None)
+
+    def _dispatch(self):
+        while True:
+            transfer = self._pick()
+            if transfer is None:
+                return
+            self._waiting.remove(transfer)
+            self._active.append(transfer)
+            self._host_active[transfer.host] = self._host_active.get(transfer.host, 0) + 1
+            self._job_active[transfer.job] = self._job_active.get(transfer.job, 0) + 1
+            self._job_last_served[transfer.job] = next(self._seq)
+            transfer.started_at = time.monotonic()
+            self._total_wait += transfer.started_at - transfer.queued_at
+            transfer._granted.set()
+
+    def acquire(self, url, priority=None, job=None) -> Transfer:
+        """
+        申请传输槽，阻塞直到获准。未指定 priority / job 时取自 job_context()。
+
+        Returns:
+            Transfer: 传输结束后必须交给 release()。
+        """
+        ctx_job, ctx_priority = _current_job.get()
+        priority = ctx_priority if priority is None else priority
+        job = ctx_job if job is None else job
+        with self._lock:
+            transfer = Transfer(url, job, priority, next(self._seq))
+            self._waiting.append(transfer)
+            self._dispatch()
+        transfer._granted.wait()
+        return transfer
+
+    def release(self, transfer: Transfer):
+        """归还传输槽，并唤醒下一个可以开始的请求。"""
+        with self._lock:
+            self._active.remove(transfer)
+            self._host_active[transfer.host] -= 1
+            if not self._host_active[transfer.host]:
+                del self._host_active[transfer.host]
+            self._job_active[transfer.job] -= 1
+            if not self._job_active[transfer.job]:
+                del self._job_active[transfer.job]
+            self._completed += 1
+            self._completed_bytes += transfer.bytes
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, url, priority=None, job=None):
+        """acquire() / release() 的上下文管理器形式。"""
+        transfer = self.acquire(url, priority, job)
+        try:
+            yield transfer
+        finally:
+            self.release(transfer)
+
+    def stats(self) -> dict:
+        """返回队列深度、活动传输和累计统计。"""
+        now = time.monotonic()
+        with self._lock:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for t in self._waiting:
+                queued[PRIORITY_NAMES.get(t.priority, str(t.priority))] += 1
+            return {
+                "active": len(self._active),
+                "queued": queued,
+                "per_host": dict(self._host_active),
+                "per_job": {str(job): n for job, n in self._job_active.items()},
+                "transfers": [{"host": t.host, "job": t.job, "priority": PRIORITY_NAMES.get(t.priority),
+                               "bytes": t.bytes, "seconds": round(now - t.started_at, 1)} for t in self._active],
+                "completed": self._completed,
+                "completed_bytes": self._completed_bytes,
+                "avg_wait_seconds": round(self._total_wait / (self._completed + len(self._active)), 3)
+                if self._completed + len(self._active) else 0.0,
+            }
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> DownloadScheduler:
+    """返回进程内共享的默认调度器。"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = DownloadScheduler()
+        return _default_scheduler
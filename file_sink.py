@@ -0,0 +1,256 @@
+"""
+高吞吐的下载写入器，供所有下载器共用（不经过 requests 的异步下载器直接使用 ChunkWriter）。
+
+原先各下载器用 iter_content(chunk_size=8192)（tencent_music_seacrch 里是 1024）逐块写文件，
+每块都更新一次 tqdm：一首 30MB 的 FLAC 就是几千到几万次 Python 循环、系统调用和终端刷新。
+write_response() 改为：
+    - 按 Content-Length 用 posix_fallocate 预分配文件空间，减少碎片和元数据更新；
+    - 读入一块复用的 bytearray（readinto），不为每块数据分配新的 bytes 对象；
+    - 块大小随实测吞吐自适应（MIN_CHUNK_SIZE ~ MAX_CHUNK_SIZE，目标每块约 CHUNK_TARGET_SECONDS 秒的数据）；
+    - 进度回调按时间节流（每 PROGRESS_INTERVAL 秒最多一次），而不是每块一次。
+
+用法:
+    with open(part_path, 'wb') as f:
+        file_sink.write_response(response, f, verifier=verifier, transfer=transfer, progress=bar.update)
+
+微基准（本地 HTTP 服务器，对比旧的 iter_content 循环，输出 MB/s 和每 MB 的 CPU 时间）:
+    python file_sink.py bench [--size-mb 64] [--rounds 3]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+import metrics
+
+# --- 配置 ---
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+CHUNK_TARGET_SECONDS = 0.02
+PROGRESS_INTERVAL = 0.25
+
+
+def preallocate(f, length):
+    """按预期长度预分配文件空间；平台或文件系统不支持时静默跳过。"""
+    if not length or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, length)
+        return True
+    except OSError:
+        return False
+
+
+def _next_chunk_size(throughput):
+    """按吞吐（字节/秒）选块大小：取不超过 throughput * CHUNK_TARGET_SECONDS 的 2 的幂，并限制在上下限之间。"""
+    target = int(throughput * CHUNK_TARGET_SECONDS)
+    size = MIN_CHUNK_SIZE
+    while size * 2 <= min(target, MAX_CHUNK_SIZE):
+        size *= 2
+    return size
+
+
+def _readinto(raw, view):
+    """raw.readinto()，并像 iter_content 一样把 urllib3 的异常转换为 requests 的异常。"""
+    try:
+        return raw.readinto(view)
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+
+
+class ChunkWriter:
+    """
+    逐块写入已打开的二进制文件：校验、传输计数、按时间节流的进度回调、预分配与截断。
+    write_response() 和不经过 requests 的下载器（vkeys_async 的 aiohttp 流）共用。
+
+    用法:
+        sink = ChunkWriter(f, verifier=verifier, transfer=transfer, progress=handle.add)
+        try:
+            for chunk in chunks:
+                sink.write(chunk)
+        finally:
+            sink.close()
+        sink.finish(host)
+    """
+
+    def __init__(self, f, verifier=None, transfer=None, progress=None, expected_length=None):
+        if expected_length is None and verifier is not None:
+            expected_length = verifier.expected_length
+        self.f = f
+        self.verifier = verifier
+        self.transfer = transfer
+        self.progress = progress
+        self.expected_length = expected_length
+        self.preallocated = preallocate(f, expected_length)
+        self.chunk_size = MIN_CHUNK_SIZE  # 按实测吞吐建议的下一块大小
+        self.written = 0
+        self._reported = 0
+        self._window_bytes = 0
+        self._window_started = self._last_report = time.monotonic()
+
+    def write(self, chunk):
+        n = len(chunk)
+        if self.verifier is not None:
+            self.verifier.update(chunk)
+        self.f.write(chunk)
+        self.written += n
+        self._window_bytes += n
+        if self.transfer is not None:
+            self.transfer.add_bytes(n)
+
+        now = time.monotonic()
+        if now - self._window_started >= CHUNK_TARGET_SECONDS * 4:
+            self.chunk_size = _next_chunk_size(self._window_bytes / (now - self._window_started))
+            self._window_bytes, self._window_started = 0, now
+        if self.progress is not None and now - self._last_report >= PROGRESS_INTERVAL:
+            self.progress(self.written - self._reported)
+            self._reported, self._last_report = self.written, now
+
+    def close(self):
+        """无论成功与否都要调用：预分配的空间比实际数据长时（连接中断）截掉多余部分，避免留下补零的文件。"""
+        if self.preallocated and self.written != self.expected_length:
+            self.f.truncate(self.written)
+
+    def finish(self, host=None) -> int:
+        """写完后补报剩余进度并计入流量指标，返回写入的字节数。"""
+        if self.progress is not None and self.written > self._reported:
+            self.progress(self.written - self._reported)
+            self._reported = self.written
+        metrics.add_bytes(host, self.written)
+        return self.written
+
+
+def write_response(response, f, verifier=None, transfer=None, progress=None, expected_length=None):
+    """
+    把 requests 的流式响应 (stream=True) 写入已打开的二进制文件 f。
+
+    Args:
+        verifier (integrity.StreamVerifier): 每块数据都会喂给它（传入的是缓冲区的 memoryview）。
+        transfer (download_scheduler.Transfer): 每块数据都会计入它的字节数。
+        progress (callable): progress(新增字节数)，按时间节流调用，可以直接传 tqdm 的 update。
+        expected_length (int): 预期长度，用于预分配；默认取自 verifier.expected_length。
+
+    Returns:
+        int: 写入的字节数。
+
+    Raises:
+        与 iter_content 相同的 requests 异常（连接中断、读取超时、解压失败），以及 verifier 抛出的 IntegrityError。
+    """
+    sink = ChunkWriter(f, verifier=verifier, transfer=transfer, progress=progress, expected_length=expected_length)
+    raw = response.raw
+    raw.decode_content = True  # 与 iter_content 一致：透明解压 gzip / deflate
+    buffer = bytearray(MAX_CHUNK_SIZE)
+    view = memoryview(buffer)
+
+    chunk = None
+    try:
+        while True:
+            n = _readinto(raw, view[:sink.chunk_size])
+            if not n:
+                break
+            chunk = view[:n]
+            sink.write(chunk)
+    finally:
+        del chunk
+        view.release()
+        sink.close()
+    return sink.finish(urllib.parse.urlsplit(response.url or "").hostname)
+
+
+# --- 微基准 ---
+
+class _PayloadHandler(BaseHTTPRequestHandler):
+    payload = b""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/flac")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def _legacy_write(response, f, verifier, progress):
+    """改造前各下载器的写入循环。"""
+    for chunk in response.iter_content(chunk_size=8192):
+        if chunk:
+            verifier.update(chunk)
+            f.write(chunk)
+            progress(len(chunk))
+    return verifier.bytes_seen
+
+
+def _serve(size_mb, port_queue):
+    _PayloadHandler.payload = b"fLaC" + os.urandom(size_mb * 1024 * 1024 - 4)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PayloadHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def bench(size_mb=64, rounds=3, target="bench.part"):
+    """
+    在本地 HTTP 服务器上对比旧循环与 write_response()，打印 MB/s 与每 MB 的 CPU 毫秒数。
+    服务器运行在单独的进程中，CPU 时间只统计下载端。
+    """
+    import integrity
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(size_mb, port_queue), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/track.flac"
+
+    def sink(response, f, verifier, progress):
+        return write_response(response, f, verifier=verifier, progress=progress)
+
+    session = requests.Session()
+    try:
+        for name, writer in (("iter_content(8192)", _legacy_write), ("file_sink", sink)):
+            wall = cpu = 0.0
+            calls = 0
+            for _ in range(rounds):
+                counter = [0]
+                started, cpu_started = time.perf_counter(), time.process_time()
+                with session.get(url, stream=True) as response, open(target, "wb") as f:
+                    verifier = integrity.StreamVerifier(integrity.expected_length_from_headers(response.headers))
+                    writer(response, f, verifier, lambda n: counter.__setitem__(0, counter[0] + 1))
+                    verifier.finish()
+                wall += time.perf_counter() - started
+                cpu += time.process_time() - cpu_started
+                calls += counter[0]
+            total_mb = size_mb * rounds
+            print(f"{name:<20} {total_mb / wall:8.1f} MB/s   CPU {cpu * 1000 / total_mb:6.2f} ms/MB   "
+                  f"进度回调 {calls // rounds} 次/文件")
+    finally:
+        server.terminate()
+        if os.path.exists(target):
+            os.remove(target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="下载写入器微基准。")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="对比旧的 iter_content 循环与 write_response()")
+    p_bench.add_argument("--size-mb", type=int, default=64)
+    p_bench.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        bench(args.size_mb, args.rounds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+HTTP 录制 / 回放层，用于确定性的离线运行。
+
+所有使用 requests 的抓取代码最终都经过 requests.adapters.HTTPAdapter.send，这里在该处打补丁:
+    录制: 照常发出请求，把请求 / 响应对追加到 JSONL 文件；响应体按 SHA-256 去重，同一内容只写一次；
+    回放: 不访问网络，按 (方法, 规范化 URL, 请求体哈希) 从录制文件中取出响应，可选按原始耗时等待。
+之后的性能分析、回归测试和解析器基准都可以完全离线、以 CPU 速度运行。
+
+文件格式（每行一个 JSON 对象）:
+    {"kind": "body", "sha256": ..., "encoding": "utf-8" | "base64", "data": ...}
+    {"kind": "exchange", "method", "url", "request_sha256", "status", "reason", "headers", "body_sha256", "elapsed"}
+响应体记录的是解压后的内容（Content-Encoding 头会被去掉、Content-Length 会改为实际长度）。
+headers 是 [[名, 值], ...]，重复的响应头（多个 Set-Cookie）逐条保留；旧录制文件中的字典格式仍可回放。
+录制模式下每个响应体（包括 stream=True 的音频下载）都会先完整读入内存，再把原响应交给调用方。
+回放的响应和实时响应一样从 Set-Cookie 中提取 Cookie（response.cookies 与会话的 Cookie）。
+
+回放匹配规则: 先精确匹配；同一请求录制了多次时依次返回，用完后重复最后一次。
+精确匹配失败时（例如 URL 中带时间戳），退化为只按方法 + 主机 + 路径匹配。
+vkeys_async.py 使用 aiohttp，不经过这里。
+
+用法:
+    python http_replay.py record captures/run1.jsonl -- music_scraper_0.5.py
+    python http_replay.py replay captures/run1.jsonl --timing -- batch_download.py queries.csv
+
+    with http_replay.recording("captures/run1.jsonl"):
+        ...
+    with http_replay.replaying("captures/run1.jsonl"):
+        ...
+"""
+import argparse
+import base64
+import hashlib
+import http.client
+import io
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3._collections import HTTPHeaderDict
+from urllib3.response import HTTPResponse
+
+# --- 配置 ---
+# 不参与精确匹配的查询参数（时间戳、随机数等）
+VOLATILE_PARAMS = {"_", "t", "ts", "timestamp", "searchid"}
+
+_original_send = HTTPAdapter.send
+_install_lock = threading.Lock()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data or b"").hexdigest()
+
+
+def normalize_url(url: str) -> str:
+    """查询参数排序并去掉易变参数。"""
+    parts = urllib.parse.urlsplit(url)
+    params = sorted((k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+                    if k not in VOLATILE_PARAMS)
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or "/",
+                                    urllib.parse.urlencode(params), ""))
+
+
+def _loose_key(method, url):
+    parts = urllib.parse.urlsplit(url)
+    return method.upper(), parts.netloc.lower(), parts.path or "/"
+
+
+def _request_body(request) -> bytes:
+    body = request.body
+    if body is None:
+        return b""
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+class _RecordedOrigin:
+    """
+    回放响应的 _original_response。requests 只从它的 msg 中读取 Set-Cookie，写入 response.cookies
+    和会话的 Cookie；urllib3 只会调用 close() / isclosed()。
+    """
+
+    def __init__(self, headers):
+        self.msg = http.client.HTTPMessage()
+        for name, value in headers:
+            self.msg[name] = value  # 同名头逐条追加，不会覆盖
+
+    def close(self):
+        pass
+
+    def isclosed(self):
+        return True
+
+
+def _header_pairs(headers):
+    """录制的响应头统一为 [(名, 值), ...]。"""
+    return list(headers.items()) if isinstance(headers, dict) else [tuple(pair) for pair in headers]
+
+
+def _buffered_raw(request, status, reason, headers, body, original_response):
+    """内存中响应体上的 urllib3 响应，流式读取 / readinto 都可用。"""
+    header_dict = HTTPHeaderDict()
+    for name, value in headers:
+        header_dict.add(name, value)
+    return HTTPResponse(body=io.BytesIO(body), headers=header_dict, status=status, reason=reason,
+                        preload_content=False, decode_content=False, request_url=request.url,
+                        original_response=original_response)
+
+
+class Recorder:
+    """把经过的请求 / 响应追加到 JSONL 文件。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._seen = set()
+        if os.path.exists(path):
+            for entry in _read_entries(path):
+                if entry.get("kind") == "body":
+                    self._seen.add(entry["sha256"])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def send(self, adapter, request, **kwargs):
+        started = time.perf_counter()
+        response = _original_send(adapter, request, **kwargs)
+        body = response.content  # 读完整个响应体（已按 Content-Encoding 解压）
+        elapsed = time.perf_counter() - started
+
+        # 从 urllib3 的响应头逐条读取，多个 Set-Cookie 不会像 response.headers 那样被合并成一个
+        headers = [[k, v] for k, v in response.raw.headers.items()
+                   if k.lower() not in ("content-encoding", "transfer-encoding", "content-length")]
+        headers.append(["Content-Length", str(len(body))])
+        body_sha = _sha256(body)
+        exchange = {"kind": "exchange", "method": request.method, "url": request.url,
+                    "request_sha256": _sha256(_request_body(request)), "status": response.status_code,
+                    "reason": response.reason, "headers": headers, "body_sha256": body_sha,
+                    "elapsed": round(elapsed, 4)}
+
+        with self._lock:
+            if body_sha not in self._seen:
+                self._seen.add(body_sha)
+                try:
+                    entry = {"kind": "body", "sha256": body_sha, "encoding": "utf-8", "data": body.decode("utf-8")}
+                except UnicodeDecodeError:
+                    entry = {"kind": "body", "sha256": body_sha, "encoding": "base64",
+                             "data": base64.b64encode(body).decode("ascii")}
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.write(json.dumps(exchange, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+        # 交回原响应（Cookie、重定向历史、elapsed 都不变），只把已读完的响应体换成内存中的流，
+        # 保留原始的 _original_response，会话仍能从中提取 Set-Cookie
+        original = response.raw
+        response.raw = _buffered_raw(request, response.status_code, response.reason, headers, body,
+                                     original._original_response)
+        original.release_conn()
+        return response
+
+    def close(self):
+        self._file.close()
+
+
+class Player:
+    """从录制文件回放响应，不访问网络。"""
+
+    def __init__(self, path, timing=False):
+        self.timing = timing
+        self._bodies = {}
+        self._exact = {}
+        self._loose = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        for entry in _read_entries(path):
+            if entry.get("kind") == "body":
+                data = entry["data"]
+                self._bodies[entry["sha256"]] = (base64.b64decode(data) if entry["encoding"] == "base64"
+                                                 else data.encode("utf-8"))
+            elif entry.get("kind") == "exchange":
+                key = (entry["method"].upper(), normalize_url(entry["url"]), entry["request_sha256"])
+                self._exact.setdefault(key, []).append(entry)
+                self._loose.setdefault(_loose_key(entry["method"], entry["url"]), []).append(entry)
+
+    def _next(self, table, key):
+        entries = table.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            index = self._cursor.get((id(table), key), 0)
+            self._cursor[(id(table), key)] = index + 1
+        return entries[min(index, len(entries) - 1)]
+
+    def send(self, adapter, request, **kwargs):
+        key = (request.method.upper(), normalize_url(request.url), _sha256(_request_body(request)))
+        entry = self._next(self._exact, key) or self._next(self._loose, _loose_key(request.method, request.url))
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"回放文件中没有该请求的录制: {request.method} {request.url}",
+                                                      request=request)
+        if self.timing and entry["elapsed"]:
+            time.sleep(entry["elapsed"])
+        headers = _header_pairs(entry["headers"])
+        raw = _buffered_raw(request, entry["status"], entry["reason"], headers, self._bodies[entry["body_sha256"]],
+                            _RecordedOrigin(headers))
+        return adapter.build_response(request, raw)
+
+
+def _read_entries(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def install(handler):
+    """让所有 HTTPAdapter.send 经过 handler（Recorder 或 Player）。"""
+    with _install_lock:
+        HTTPAdapter.send = lambda adapter, request, **kwargs: handler.send(adapter, request, **kwargs)
+
+
+def uninstall():
+    with _install_lock:
+        HTTPAdapter.send = _original_send
+
+
+@contextmanager
+def recording(path):
+    recorder = Recorder(path)
+    install(recorder)
+    try:
+        yield recorder
+    finally:
+        uninstall()
+        recorder.close()
+
+
+@contextmanager
+def replaying(path, timing=False):
+    player = Player(path, timing)
+    install(player)
+    try:
+        yield player
+    finally:
+        uninstall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在 HTTP 录制 / 回放模式下运行一个脚本。")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("capture", help="录制文件路径 (JSONL)")
+    parser.add_argument("--timing", action="store_true", help="回放时按录制的原始耗时等待")
+    parser.add_argument("script", nargs=argparse.REMAINDER, help="-- 之后是要运行的脚本及其参数")
+    args = parser.parse_args(argv)
+
+    script = args.script[1:] if args.script[:1] == ["--"] else args.script
+    if not script:
+        parser.error("需要给出要运行的脚本，例如: -- music_scraper_0.5.py")
+
+    context = recording(args.capture) if args.mode == "record" else replaying(args.capture, args.timing)
+    sys.argv = script
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script[0])))
+    with context:
+        runpy.run_path(script[0], run_name="__main__")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+下载过程中的流式完整性校验。
+
+在写文件的循环里逐块调用 StreamVerifier.update()，同时完成：
+    1. 运行中的 SHA-256（写完即得到哈希，不需要再读一遍文件）；
+    2. 与 Content-Length 的精确比对（多一个字节、少一个字节都算失败）；
+    3. 对开头 4KB 做音频魔数检查（ID3 / MPEG 帧同步 / fLaC / ADTS / OggS / RIFF WAVE / MP4 ftyp），
+       链接失效时返回的 HTML 错误页在前 4KB 内就会被拒绝，而不是等整个响应下载完。
+
+得到的哈希交给 content_store.ingest(digest=...) 记录，用于去重和之后的重新校验。
+"""
+import hashlib
+
+# --- 配置 ---
+SNIFF_BYTES = 4096
+
+
+class IntegrityError(Exception):
+    """下载内容未通过完整性校验（非音频内容、长度不符等）。"""
+
+
+def sniff_audio_format(head: bytes) -> str | None:
+    """
+    根据文件开头的魔数判断音频格式。
+
+    Returns:
+        str or None: 'mp3' / 'flac' / 'aac' / 'ogg' / 'wav' / 'm4a'，无法识别时返回 None。
+    """
+    if head.startswith(b'ID3'):
+        return 'mp3'
+    if head.startswith(b'fLaC'):
+        return 'flac'
+    if head.startswith(b'OggS'):
+        return 'ogg'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xF0) == 0xF0 and (head[1] & 0x06) == 0:
+        return 'aac'  # ADTS: 12 位同步字 + layer 固定为 00
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0 and (head[1] & 0x06) != 0:
+        return 'mp3'  # 无 ID3 标签、直接以 MPEG 音频帧开头
+    return None
+
+
+def expected_length_from_headers(headers) -> int | None:
+    """
+    从响应头中取出可用于精确比对的长度。
+
+    响应经过 gzip 等压缩时，Content-Length 是压缩后的长度，而 requests 交给我们的是解压后的数据，
+    此时不做长度比对。
+    """
+    encoding = (headers.get('Content-Encoding') or 'identity').lower()
+    length = headers.get('Content-Length')
+    if encoding != 'identity' or not length:
+        return None
+    try:
+        return int(length)
+    except ValueError:
+        return None
+
+
+class StreamVerifier:
+    """
+    在下载循环中逐块喂入数据的校验器。
+
+    用法:
+        verifier = StreamVerifier(expected_length_from_headers(response.headers))
+        for chunk in response.iter_content(chunk_size=...):
+            verifier.update(chunk)   # 非音频内容 / 超长会在这里抛出 IntegrityError
+            f.write(chunk)
+        digest = verifier.finish()   # 长度不符会在这里抛出 IntegrityError
+    """
+
+    def __init__(self, expected_length: int | None = None, require_audio: bool = True):
+        self.expected_length = expected_length
+        self.require_audio = require_audio
+        self.bytes_seen = 0
+        self.detected_format = None
+        self._hash = hashlib.sha256()
+        self._head = bytearray()
+        self._sniffed = not require_audio
+
+    def update(self, chunk):
+        """喂入一块数据：更新哈希和计数，并在凑够开头 4KB 时做一次魔数检查。"""
+        self._hash.update(chunk)
+        self.bytes_seen += len(chunk)
+
+        if not self._sniffed:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_head()
+
+        if self.expected_length is not None and self.bytes_seen > self.expected_length:
+            raise IntegrityError(f"收到的数据超过 Content-Length (预期 {self.expected_length}B)")
+
+    def _check_head(self):
+        self._sniffed = True
+        self.detected_format = sniff_audio_format(bytes(self._head))
+        if self.detected_format is None:
+            preview = bytes(self._head[:64]).decode('utf-8', errors='replace').strip()
+            raise IntegrityError(f"内容不是可识别的音频格式，可能是错误页面: {preview!r}")
+
+    def finish(self) -> str:
+        """
+        数据接收完毕后调用，完成剩余检查。
+
+        Returns:
+            str: 完整内容的 SHA-256。
+        """
+        if not self._sniffed:
+            if not self._head:
+                raise IntegrityError("没有收到任何数据")
+            self._check_head()
+        if self.expected_length is not None and self.bytes_seen != self.expected_length:
+            raise IntegrityError(f"文件大小不匹配 (预期: {self.expected_length}B, 实际: {self.bytes_seen}B)，下载可能中断。")
+        return self._hash.hexdigest()
+
+    @property
+    def digest(self) -> str:
+        """当前已接收数据的 SHA-256。"""
+        return self._hash.hexdigest()
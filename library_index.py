@@ -0,0 +1,384 @@
+"""
+音乐库清单索引（SQLite）。
+
+记录库中每个文件的大小、修改时间、格式、时长、来源 ID 以及格式转换状态，
+供各个工具在 O(1) 的索引查询上判断"是否已下载"和"还有哪些文件待转换"，
+取代对网络存储做 Path.exists() / os.listdir 全量扫描。
+
+与磁盘的同步通过 reconcile() 增量完成：只对修改时间发生变化的目录执行 os.scandir，
+未变化的目录直接沿用索引中记录的子目录列表向下递归。
+
+命令行:
+    python library_index.py reconcile [downloads]   # 增量同步目录
+    python library_index.py pending [aac]           # 列出待转换的文件
+    python library_index.py stats
+"""
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+# --- 配置 ---
+DOWNLOAD_DIR = Path("downloads")
+# 放在独立的隐藏子目录里：SQLite 的 journal 文件增删不会改动 downloads/ 本身的 mtime
+INDEX_PATH = DOWNLOAD_DIR / ".meta" / "library.sqlite3"
+AUDIO_FORMATS = ("mp3", "flac", "aac", "m4a", "ogg", "wav")
+
+# 转换状态
+CONVERSION_PENDING = "pending"
+CONVERSION_DONE = "converted"
+CONVERSION_FAILED = "failed"
+
+# 需要转换的源格式 → 目标格式（与 convert_audio.py / download_music.py 的 AAC → MP3 流程对应）
+CONVERTIBLE_FORMATS = {"aac": "mp3"}
+
+# MPEG-1 Layer III 比特率表 (kbps) 与采样率表，用于估算 MP3 时长
+_MP3_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+# --- 时长探测 ---
+
+def _probe_flac_duration(f) -> float | None:
+    """从 FLAC 的 STREAMINFO 块读取精确时长。"""
+    f.seek(0)
+    if f.read(4) != b'fLaC':
+        return None
+    header = f.read(4)
+    if len(header) < 4 or header[0] & 0x7F != 0:
+        return None
+    info = f.read(18)
+    if len(info) < 18:
+        return None
+    packed = int.from_bytes(info[10:18], 'big')
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    return total_samples / sample_rate if sample_rate else None
+
+
+def _probe_mp3_duration(f, file_size: int) -> float | None:
+    """
+    读取 MP3 第一个音频帧：有 Xing/Info 头时按总帧数计算，否则按 CBR 比特率估算。
+    """
+    f.seek(0)
+    head = f.read(10)
+    offset = 0
+    if head[:3] == b'ID3' and len(head) == 10:
+        offset = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+
+    f.seek(offset)
+    data = f.read(4096)
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+            continue
+        version = (data[i + 1] >> 3) & 0x03
+        bitrate_index = (data[i + 2] >> 4) & 0x0F
+        rate_index = (data[i + 2] >> 2) & 0x03
+        if version == 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        samples_per_frame = 1152 if version == 3 else 576
+
+        xing = data.find(b'Xing', i, i + 64)
+        if xing < 0:
+            xing = data.find(b'Info', i, i + 64)
+        if xing >= 0 and xing + 12 <= len(data):
+            flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+                return frames * samples_per_frame / sample_rate
+
+        bitrate = _MP3_BITRATES[bitrate_index] * 1000
+        if version != 3:
+            bitrate //= 2  # MPEG-2/2.5 的 Layer III 比特率大致为 MPEG-1 的一半
+        return (file_size - offset - i) * 8 / bitrate if bitrate else None
+    return None
+
+
+def probe_duration(path, ext: str, size: int) -> float | None:
+    """按格式读取少量头部字节获取时长（秒），无法识别时返回 None。"""
+    try:
+        with open(path, 'rb') as f:
+            if ext == 'flac':
+                return _probe_flac_duration(f)
+            if ext == 'mp3':
+                return _probe_mp3_duration(f, size)
+    except (OSError, struct.error, IndexError):
+        pass
+    return None
+
+
+# --- 索引 ---
+
+class LibraryIndex:
+    """音乐库的 SQLite 清单，可在多线程间共享。"""
+
+    def __init__(self, db_path=INDEX_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dir TEXT NOT NULL,
+                stem TEXT NOT NULL,
+                format TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                duration REAL,
+                provider TEXT,
+                songid TEXT,
+                quality TEXT,
+                hash TEXT,
+                conversion_state TEXT,
+                indexed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_files_dir_stem ON files (dir, stem);
+            CREATE INDEX IF NOT EXISTS idx_files_conversion ON files (format, conversion_state);
+            CREATE INDEX IF NOT EXISTS idx_files_source ON files (provider, songid);
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                subdirs TEXT NOT NULL DEFAULT ''
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _split(path):
+        """把路径拆成 (绝对路径, 所在目录, 不含扩展名的文件名, 小写扩展名)。"""
+        path = os.path.abspath(path)
+        directory, name = os.path.split(path)
+        stem, ext = os.path.splitext(name)
+        return path, directory, stem, ext[1:].lower()
+
+    def _upsert(self, path, st, **fields):
+        """写入（或更新）一个文件的记录；调用方需持有锁。已有的来源信息在未提供新值时保留。"""
+        path, directory, stem, ext = self._split(path)
+        duration = probe_duration(path, ext, st.st_size)
+        # 显式给出的转换状态直接覆盖；否则只有新文件才会被标记为待转换，已有状态保持不变。
+        # 同目录下已有同名的目标格式文件（以前转换过、保留了源文件）时直接记为已转换
+        explicit_state = fields.get("conversion_state") is not None
+        conversion_state = fields.get("conversion_state")
+        if conversion_state is None and ext in CONVERTIBLE_FORMATS:
+            if os.path.exists(os.path.join(directory, f"{stem}.{CONVERTIBLE_FORMATS[ext]}")):
+                conversion_state, explicit_state = CONVERSION_DONE, True
+            else:
+                conversion_state = CONVERSION_PENDING
+
+        self._conn.execute("""
+            INSERT INTO files (path, dir, stem, format, size, mtime, duration, provider, songid, quality, hash,
+                               conversion_state, indexed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size,
+                mtime = excluded.mtime,
+                duration = excluded.duration,
+                provider = COALESCE(excluded.provider, files.provider),
+                songid = COALESCE(excluded.songid, files.songid),
+                quality = COALESCE(excluded.quality, files.quality),
+                hash = COALESCE(excluded.hash, files.hash),
+                conversion_state = CASE WHEN ? THEN excluded.conversion_state
+                                        ELSE COALESCE(files.conversion_state, excluded.conversion_state) END,
+                indexed_at = excluded.indexed_at
+        """, (path, directory, stem, ext, st.st_size, st.st_mtime, duration, fields.get("provider"),
+              None if fields.get("songid") is None else str(fields["songid"]), fields.get("quality"),
+              fields.get("digest"), conversion_state, time.time(), explicit_state))
+
+    def record_file(self, path, provider=None, songid=None, quality=None, digest=None, conversion_state=None):
+        """下载 / 转换 / 链接出一个文件后调用，登记它的元数据和来源信息。"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._upsert(path, st, provider=provider, songid=songid, quality=quality, digest=digest,
+                         conversion_state=conversion_state)
+            self._conn.commit()
+
+    def remove_file(self, path):
+        """文件被删除（例如 AAC 转换后删除原文件）时调用。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(path),))
+            self._conn.commit()
+
+    def find_by_stem(self, directory, stem, formats=AUDIO_FORMATS):
+        """
+        按 "目录 + 不含扩展名的文件名" 查询，用于下载前的跳过判断。
+        命中的文件会 stat 确认仍然存在；已被删除的文件从索引中删掉，不再算作已下载。
+
+        Args:
+            formats (tuple): 只匹配这些格式，默认只看音频（同名的 .lrc/.txt 不算）。
+
+        Returns:
+            Path or None: 已登记且仍存在的文件路径，没有则返回 None。
+        """
+        placeholders = ','.join('?' * len(formats))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path FROM files WHERE dir = ? AND stem = ? AND format IN ({placeholders})",
+                (os.path.abspath(directory), stem, *formats)).fetchall()
+        for (path,) in rows:
+            if os.path.exists(path):
+                return Path(path)
+            self.remove_file(path)
+        return None
+
+    def find_by_source(self, provider, songid):
+        """按来源 ID 查询已登记的文件路径列表。"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM files WHERE provider = ? AND songid = ?",
+                                      (provider, str(songid))).fetchall()
+        return [Path(row[0]) for row in rows]
+
+    def get_source(self, path):
+        """
+        查询文件登记的来源 ID。
+
+        Returns:
+            tuple or None: (provider, songid)，未登记或没有来源信息时返回 None。
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT provider, songid FROM files WHERE path = ?",
+                                     (os.path.abspath(path),)).fetchone()
+        return tuple(row) if row and row[0] and row[1] else None
+
+    def pending_conversions(self, fmt="aac", directory=None):
+        """返回等待转换的文件路径列表（替代对目录做全量 listdir）。"""
+        sql = "SELECT path FROM files WHERE format = ? AND conversion_state = ?"
+        params = [fmt, CONVERSION_PENDING]
+        if directory is not None:
+            sql += " AND dir = ?"
+            params.append(os.path.abspath(directory))
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY path", params).fetchall()
+        return [Path(row[0]) for row in rows]
+
+    def mark_conversion(self, source_path, state, output_path=None, remove_source=False):
+        """
+        登记一次格式转换的结果：更新源文件状态，登记输出文件；源文件被删除时同时移除其记录。
+        """
+        source_path = os.path.abspath(source_path)
+        with self._lock:
+            row = self._conn.execute("SELECT provider, songid, quality FROM files WHERE path = ?",
+                                     (source_path,)).fetchone()
+            if remove_source:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (source_path,))
+            else:
+                self._conn.execute("UPDATE files SET conversion_state = ? WHERE path = ?", (state, source_path))
+            if output_path and os.path.exists(output_path):
+                provider, songid, quality = row if row else (None, None, None)
+                self._upsert(output_path, os.stat(output_path), provider=provider, songid=songid, quality=quality,
+                             conversion_state=CONVERSION_DONE)
+            self._conn.commit()
+
+    def reconcile(self, root=DOWNLOAD_DIR, full=False) -> dict:
+        """
+        增量同步磁盘与索引。
+
+        目录的 mtime 只会在其中的条目增删时变化，因此 mtime 未变的目录不再 scandir，
+        直接从索引里取出它的子目录继续向下检查。full=True 时强制重新扫描所有目录
+        （用于发现被原地覆盖写入的文件）。
+
+        Returns:
+            dict: 扫描 / 跳过的目录数，新增 / 更新 / 移除的文件数。
+        """
+        stats = {"dirs_scanned": 0, "dirs_skipped": 0, "added": 0, "updated": 0, "removed": 0}
+        pending = [os.path.abspath(root)]
+
+        with self._lock:
+            while pending:
+                directory = pending.pop()
+                try:
+                    dir_mtime = os.stat(directory).st_mtime
+                except OSError:
+                    stats["removed"] += self._forget_dir(directory)
+                    continue
+
+                row = self._conn.execute("SELECT mtime, subdirs FROM dirs WHERE path = ?", (directory,)).fetchone()
+                if row and row[0] == dir_mtime and not full:
+                    stats["dirs_skipped"] += 1
+                    pending.extend(os.path.join(directory, name) for name in row[1].split('\n') if name)
+                    continue
+
+                stats["dirs_scanned"] += 1
+                known = dict(self._conn.execute("SELECT path, mtime FROM files WHERE dir = ?", (directory,)).fetchall())
+                subdirs = []
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                            pending.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                        old_mtime = known.pop(entry.path, None)
+                        if old_mtime is None:
+                            stats["added"] += 1
+                        elif old_mtime != st.st_mtime:
+                            stats["updated"] += 1
+                        else:
+                            continue
+                        self._upsert(entry.path, st)
+
+                for gone in known:
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (gone,))
+                stats["removed"] += len(known)
+
+                self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime, subdirs) VALUES (?, ?, ?)",
+                                   (directory, dir_mtime, '\n'.join(subdirs)))
+            self._conn.commit()
+
+        return stats
+
+    def _forget_dir(self, directory) -> int:
+        """目录已不存在时，移除其下所有记录；调用方需持有锁。"""
+        like = directory.rstrip(os.sep) + os.sep + '%'
+        removed = self._conn.execute("DELETE FROM files WHERE dir = ? OR dir LIKE ?", (directory, like)).rowcount
+        self._conn.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ?", (directory, like))
+        return removed
+
+    def stats(self) -> dict:
+        """按格式统计文件数和总字节数。"""
+        with self._lock:
+            rows = self._conn.execute("SELECT format, COUNT(*), SUM(size) FROM files GROUP BY format").fetchall()
+        return {fmt: {"files": count, "bytes": size} for fmt, count, size in rows}
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_index() -> LibraryIndex:
+    """返回进程内共享的默认索引（downloads/.meta/library.sqlite3）。"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = LibraryIndex()
+        return _default_index
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    index = get_index()
+
+    if command == "reconcile":
+        target = sys.argv[2] if len(sys.argv) > 2 else DOWNLOAD_DIR
+        started = time.perf_counter()
+        result = index.reconcile(target, full="--full" in sys.argv)
+        print(f"同步完成 ({time.perf_counter() - started:.2f} 秒): {result}")
+    elif command == "pending":
+        fmt = sys.argv[2] if len(sys.argv) > 2 else "aac"
+        for path in index.pending_conversions(fmt):
+            print(path)
+    elif command == "stats":
+        print(index.stats())
+    else:
+        print("用法: python library_index.py [reconcile [目录] [--full] | pending [格式] | stats]")
+        sys.exit(1)
@@ -0,0 +1,382 @@
+"""
+LRC / YRC 歌词引擎。
+
+歌词只解析一次，存为按列保存的紧凑结构：
+    times   array('l')  每行的开始时间（毫秒，已排序）
+    offsets array('L')  每行文本在 text 中的起止位置（第 i 行为 text[offsets[i]:offsets[i + 1]]）
+    text    str         所有行文本首尾相接
+而不是 [{'time': ..., 'text': ...}, ...] 这样的字典列表。时间定位和原文/译文对齐都用 bisect 在
+times 上二分查找。
+
+支持：
+    - 解析 LRC（同一行多个时间标签、[offset:] 标签）与 vkeys 的逐字 yrc；
+    - 原文与译文按时间对齐合并为双语歌词；
+    - 整体时间偏移；
+    - 导出 LRC（可选逐字增强格式）/ SRT；
+    - 对整个歌词缓存 (lyrics_cache) 批量合并译文，使用进程池并行。
+
+命令行:
+    python lrc_engine.py merge <原文.lrc> <译文.lrc> [-o 输出] [--offset 毫秒] [--srt]
+    python lrc_engine.py batch [--out-dir 目录] [--workers N]   # 合并歌词缓存中所有带译文的歌曲
+"""
+import argparse
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+# --- 配置 ---
+MERGE_TOLERANCE_MS = 500  # 译文行与原文行的时间差在此范围内才视为同一句
+SRT_LAST_LINE_MS = 5000  # SRT 最后一行（没有下一行可参照）的显示时长
+BATCH_CHUNK_SIZE = 256  # 批量合并时每个进程任务包含的歌曲数
+
+LRC_LINE_PATTERN = re.compile(r'^((?:\[\d{1,3}:\d{1,2}(?:[.:]\d{1,3})?\])+)(.*)$', re.MULTILINE)
+LRC_TIME_PATTERN = re.compile(r'\[(\d{1,3}):(\d{1,2})(?:[.:](\d{1,3}))?\]')
+LRC_TAG_PATTERN = re.compile(r'^\[([a-zA-Z#]+):(.*)\]\s*$', re.MULTILINE)
+YRC_LINE_PATTERN = re.compile(r'^\[(\d+),(\d+)\](.*)$', re.MULTILINE)
+# 两种逐字格式：网易云式 "(开始,时长,0)字" 与 QRC 式 "字(开始,时长)"
+YRC_WORD_PREFIX_PATTERN = re.compile(r'\((\d+),(\d+)(?:,\d+)?\)([^(]*)')
+YRC_WORD_SUFFIX_PATTERN = re.compile(r'([^()]*)\((\d+),(\d+)\)')
+EMPTY_TRANSLATIONS = {'', '//'}
+
+
+def _parse_ms(minutes, seconds, fraction) -> int:
+    """把 LRC 时间标签的三段转换为毫秒（小数部分按位数换算：.5 → 500, .50 → 500, .500 → 500）。"""
+    ms = (int(minutes) * 60 + int(seconds)) * 1000
+    if fraction:
+        ms += int(fraction.ljust(3, '0')[:3])
+    return ms
+
+
+def format_lrc_time(ms: int) -> str:
+    """毫秒 → "mm:ss.xx"。"""
+    ms = max(ms, 0)
+    return f"{ms // 60000:02d}:{ms // 1000 % 60:02d}.{ms % 1000 // 10:02d}"
+
+
+def format_srt_time(ms: int) -> str:
+    """毫秒 → "hh:mm:ss,mmm"。"""
+    ms = max(ms, 0)
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+class Lyric:
+    """
+    按列保存的歌词。构造后视为只读，所有变换（偏移、合并）都返回新对象。
+
+    durations 仅在来源提供行时长（yrc）时存在；words 为逐字信息（同样是一个 Lyric），
+    word_index[i] 是第 i 行第一个字在 words 中的下标。
+    """
+
+    __slots__ = ("times", "offsets", "text", "tags", "durations", "words", "word_index")
+
+    def __init__(self, times=None, offsets=None, text="", tags=None, durations=None, words=None, word_index=None):
+        self.times = times if times is not None else array('l')
+        self.offsets = offsets if offsets is not None else array('L', [0])
+        self.text = text
+        self.tags = tags or {}
+        self.durations = durations
+        self.words = words
+        self.word_index = word_index
+
+    @classmethod
+    def from_lines(cls, entries, tags=None, durations=None):
+        """
+        由 (毫秒, 文本) 序列构造；会按时间做稳定排序。
+        """
+        entries = list(entries)
+        order = sorted(range(len(entries)), key=lambda i: entries[i][0])
+        times = array('l')
+        offsets = array('L', [0])
+        parts = []
+        position = 0
+        for i in order:
+            ms, line = entries[i]
+            times.append(ms)
+            parts.append(line)
+            position += len(line)
+            offsets.append(position)
+        if durations is not None:
+            durations = array('l', (durations[i] for i in order))
+        return cls(times, offsets, ''.join(parts), tags, durations)
+
+    def __len__(self):
+        return len(self.times)
+
+    def line(self, i) -> str:
+        """第 i 行的文本。"""
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        """逐行产出 (毫秒, 文本)。"""
+        text, offsets = self.text, self.offsets
+        for i, ms in enumerate(self.times):
+            yield ms, text[offsets[i]:offsets[i + 1]]
+
+    def line_at(self, ms) -> int:
+        """返回在 ms 时刻正在显示的行号，第一行之前返回 -1。"""
+        return bisect_right(self.times, ms) - 1
+
+    def end_time(self, i) -> int:
+        """第 i 行的结束时间：有行时长时用行时长，否则取下一行开始时间。"""
+        if self.durations is not None:
+            return self.times[i] + self.durations[i]
+        if i + 1 < len(self.times):
+            return self.times[i + 1]
+        return self.times[i] + SRT_LAST_LINE_MS
+
+    def shift(self, delta_ms: int) -> "Lyric":
+        """整体平移 delta_ms 毫秒（正数为延后），结果不会早于 0。"""
+        times = array('l', (max(ms + delta_ms, 0) for ms in self.times))
+        words = self.words.shift(delta_ms) if self.words is not None else None
+        return Lyric(times, self.offsets, self.text, dict(self.tags), self.durations, words, self.word_index)
+
+    def merge(self, translation: "Lyric", tolerance_ms=MERGE_TOLERANCE_MS, separator=None) -> "Lyric":
+        """
+        与译文按时间对齐合并为双语歌词。
+
+        对每一行原文，在译文的 times 上二分查找时间最接近的一行，差值不超过 tolerance_ms 才采用。
+
+        Args:
+            separator (str): 为 None 时输出为"原文行 + 同时间戳的译文行"（大多数播放器显示为上下两行）；
+                             否则把译文以该分隔符接在原文同一行后面，如 " / "。
+        """
+        trans_times = translation.times
+        count = len(trans_times)
+        entries = []
+        durations = array('l') if self.durations is not None else None
+        for i, (ms, line) in enumerate(self):
+            match = None
+            if count:
+                j = bisect_left(trans_times, ms)
+                candidates = [k for k in (j - 1, j) if 0 <= k < count]
+                k = min(candidates, key=lambda c: abs(trans_times[c] - ms))
+                if abs(trans_times[k] - ms) <= tolerance_ms:
+                    match = translation.line(k).strip()
+                    if match in EMPTY_TRANSLATIONS:
+                        match = None
+
+            if match and separator is not None:
+                entries.append((ms, f"{line}{separator}{match}"))
+            else:
+                entries.append((ms, line))
+                if match:
+                    entries.append((ms, match))
+            if durations is not None:
+                durations.extend([self.durations[i]] * (2 if match and separator is None else 1))
+        return Lyric.from_lines(entries, dict(self.tags), durations)
+
+    def to_lrc(self, enhanced=False) -> str:
+        """
+        导出为 LRC 文本。
+
+        Args:
+            enhanced (bool): 有逐字信息时输出增强 LRC（行内 <mm:ss.xx> 字标签）。
+        """
+        out = [f"[{key}:{value}]" for key, value in self.tags.items() if key != 'offset']
+        use_words = enhanced and self.words is not None
+        for i, (ms, line) in enumerate(self):
+            if use_words:
+                start, end = self.word_index[i], self.word_index[i + 1]
+                line = ''.join(f"<{format_lrc_time(self.words.times[w])}>{self.words.line(w)}"
+                               for w in range(start, end)) or line
+            out.append(f"[{format_lrc_time(ms)}]{line}")
+        return '\n'.join(out) + '\n'
+
+    def to_srt(self) -> str:
+        """导出为 SRT 字幕。相同时间戳的行（双语）合并到同一条字幕中。"""
+        blocks = []
+        i = 0
+        n = len(self.times)
+        while i < n:
+            j = i + 1
+            while j < n and self.times[j] == self.times[i]:
+                j += 1
+            lines = [self.line(k) for k in range(i, j) if self.line(k).strip()]
+            if lines:
+                end = self.times[j] if j < n and self.durations is None else self.end_time(j - 1)
+                blocks.append(f"{len(blocks) + 1}\n{format_srt_time(self.times[i])} --> {format_srt_time(end)}\n"
+                              + '\n'.join(lines) + '\n')
+            i = j
+        return '\n'.join(blocks)
+
+
+def parse_lrc(content: str) -> Lyric:
+    """解析 LRC 文本。支持一行多个时间标签与 [offset:毫秒] 标签（按 LRC 约定，正值表示提前）。"""
+    content = content or ''
+    tags = {key.lower(): value.strip() for key, value in LRC_TAG_PATTERN.findall(content)}
+    entries = []
+    for match in LRC_LINE_PATTERN.finditer(content):
+        line = match.group(2).strip()
+        for minutes, seconds, fraction in LRC_TIME_PATTERN.findall(match.group(1)):
+            entries.append((_parse_ms(minutes, seconds, fraction), line))
+
+    lyric = Lyric.from_lines(entries, tags)
+    offset = tags.get('offset', '').strip()
+    if offset.lstrip('+-').isdigit() and int(offset):
+        lyric = lyric.shift(-int(offset))
+        lyric.tags.pop('offset', None)
+    return lyric
+
+
+def parse_yrc(content: str) -> Lyric:
+    """
+    解析逐字歌词（yrc / qrc）。每行形如 "[行开始,行时长]" 加逐字片段，
+    返回行级 Lyric，并在 words / word_index 中附带逐字时间。
+    """
+    content = content or ''
+    lines, durations = [], []
+    word_entries = []
+    word_index = array('L', [0])
+    for match in YRC_LINE_PATTERN.finditer(content):
+        body = match.group(3)
+        if body.startswith('('):
+            words = [(int(s), w) for s, _, w in YRC_WORD_PREFIX_PATTERN.findall(body)]
+        else:
+            words = [(int(s), w) for w, s, _ in YRC_WORD_SUFFIX_PATTERN.findall(body)]
+        line = ''.join(w for _, w in words) if words else body
+        lines.append((int(match.group(1)), line.strip()))
+        durations.append(int(match.group(2)))
+        word_entries.append(words)
+
+    # 逐字数据需要跟随行的排序，因此先按行时间排好再展开
+    order = sorted(range(len(lines)), key=lambda i: lines[i][0])
+    lyric = Lyric.from_lines([lines[i] for i in order], durations=[durations[i] for i in order])
+    flat = []
+    for i in order:
+        flat.extend(word_entries[i])
+        word_index.append(len(flat))
+    # 逐字时间在行内已经有序，直接按列构造，不再重新排序
+    word_offsets = array('L', [0])
+    position = 0
+    for _, word in flat:
+        position += len(word)
+        word_offsets.append(position)
+    lyric.words = Lyric(array('l', (ms for ms, _ in flat)), word_offsets, ''.join(w for _, w in flat))
+    lyric.word_index = word_index
+    lyric.tags = {key.lower(): value.strip() for key, value in LRC_TAG_PATTERN.findall(content)}
+    return lyric
+
+
+def merge_texts(lrc: str, trans: str, offset_ms=0, separator=None, fmt="lrc") -> str:
+    """
+    原文 + 译文 LRC 文本 → 合并后的 LRC / SRT 文本。供单文件合并与批量任务共用。
+    """
+    merged = parse_lrc(lrc)
+    if trans:
+        merged = merged.merge(parse_lrc(trans), separator=separator)
+    if offset_ms:
+        merged = merged.shift(offset_ms)
+    return merged.to_srt() if fmt == "srt" else merged.to_lrc()
+
+
+def _merge_task(args):
+    """进程池任务：合并一批歌曲，返回 [(key, 文本), ...]。"""
+    batch, offset_ms, separator, fmt = args
+    return [(key, merge_texts(lrc, trans, offset_ms, separator, fmt)) for key, lrc, trans in batch]
+
+
+def batch_merge(items, workers=None, offset_ms=0, separator=None, fmt="lrc"):
+    """
+    批量合并译文。
+
+    Args:
+        items (iterable): (key, lrc, trans) 三元组。
+        workers (int): 进程数，默认为 CPU 核数。
+
+    Yields:
+        tuple: (key, 合并后的文本)，顺序与输入一致。
+    """
+    def chunks():
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= BATCH_CHUNK_SIZE:
+                yield batch, offset_ms, separator, fmt
+                batch = []
+        if batch:
+            yield batch, offset_ms, separator, fmt
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(_merge_task, chunks()):
+            yield from results
+
+
+def merge_cache(out_dir=None, workers=None, offset_ms=0, separator=None, fmt="lrc") -> int:
+    """
+    合并歌词缓存中所有带译文的歌曲。
+
+    输出位置：未指定 out_dir 时写在音乐库索引记录的音频文件旁边（同名 .lrc / .srt），
+    找不到音频文件的写入 downloads/lyrics/<provider>_<songid>.<格式>。
+
+    Returns:
+        int: 写出的文件数量。
+    """
+    import library_index
+    import lyrics_cache
+
+    cache = lyrics_cache.get_cache()
+    index = library_index.get_index()
+    fallback_dir = out_dir or os.path.join(str(lyrics_cache.DOWNLOAD_DIR), "lyrics")
+
+    written = 0
+    for (provider, songid), text in batch_merge(cache.iter_with_translation(), workers, offset_ms, separator, fmt):
+        targets = [] if out_dir else [p for p in index.find_by_source(provider, songid)
+                                      if p.suffix[1:].lower() in library_index.AUDIO_FORMATS]
+        if targets:
+            path = os.path.splitext(str(targets[0]))[0] + f".{fmt}"
+        else:
+            os.makedirs(fallback_dir, exist_ok=True)
+            path = os.path.join(fallback_dir, f"{provider}_{songid}.{fmt}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LRC / YRC 歌词工具：双语合并、时间偏移、导出 SRT。")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_merge = sub.add_parser("merge", help="合并单首歌曲的原文与译文")
+    p_merge.add_argument("lrc")
+    p_merge.add_argument("trans", nargs="?")
+    p_merge.add_argument("-o", "--output")
+    p_merge.add_argument("--offset", type=int, default=0, help="整体偏移（毫秒，正数为延后）")
+    p_merge.add_argument("--inline", metavar="SEP", help="译文接在原文同一行，使用此分隔符")
+    p_merge.add_argument("--srt", action="store_true", help="导出为 SRT")
+
+    p_batch = sub.add_parser("batch", help="批量合并歌词缓存中所有带译文的歌曲")
+    p_batch.add_argument("--out-dir")
+    p_batch.add_argument("--workers", type=int)
+    p_batch.add_argument("--offset", type=int, default=0)
+    p_batch.add_argument("--inline", metavar="SEP")
+    p_batch.add_argument("--srt", action="store_true")
+
+    args = parser.parse_args(argv)
+    fmt = "srt" if args.srt else "lrc"
+
+    if args.command == "merge":
+        with open(args.lrc, 'r', encoding='utf-8') as f:
+            lrc = f.read()
+        trans = None
+        if args.trans:
+            with open(args.trans, 'r', encoding='utf-8') as f:
+                trans = f.read()
+        text = merge_texts(lrc, trans, args.offset, args.inline, fmt)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text)
+            print(f"已保存到: {args.output}")
+        else:
+            sys.stdout.write(text)
+    else:
+        count = merge_cache(args.out_dir, args.workers, args.offset, args.inline, fmt)
+        print(f"共写出 {count} 个双语歌词文件。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+歌词缓存（SQLite）。
+
+按 (provider, songid) 保存一首歌的全部歌词版本：lrc（原文）、trans（翻译）、yrc（逐字）以及
+歌曲海页面提供的纯文本 txt。重新下载或重新导出时直接从缓存读取，不再请求歌词接口。
+
+歌词获取与音频下载互相独立：下载开始前调用 fetch_async() 提交歌词任务，音频下载完成后再取结果，
+两次网络往返并行进行。
+
+downloads/ 中歌曲海保存的 "歌名 - 歌手.lrc / .txt" 可通过 index_tree() 收入缓存
+（来源 ID 取自音乐库索引 library_index，查不到时以文件路径作为 ID，provider 记为 "file"）。
+
+命令行:
+    python lyrics_cache.py index [downloads]          # 收录已有的 .lrc / .txt 歌词文件
+    python lyrics_cache.py export <provider> <songid> [lrc|trans|yrc|txt]
+    python lyrics_cache.py stats
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import library_index
+import metrics
+
+# --- 配置 ---
+DOWNLOAD_DIR = Path("downloads")
+CACHE_PATH = DOWNLOAD_DIR / ".meta" / "lyrics.sqlite3"
+VARIANTS = ("lrc", "trans", "yrc", "txt")
+FETCH_WORKERS = 4
+
+
+class LyricsCache:
+    """歌词缓存，可在多线程间共享。"""
+
+    def __init__(self, db_path=CACHE_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lyrics (
+                provider TEXT NOT NULL,
+                songid TEXT NOT NULL,
+                lrc TEXT,
+                trans TEXT,
+                yrc TEXT,
+                txt TEXT,
+                source_path TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (provider, songid)
+            );
+        """)
+        self._conn.commit()
+        self._executor = None
+
+    def get(self, provider, songid):
+        """
+        查询缓存。
+
+        Returns:
+            dict or None: {'lrc': ..., 'trans': ..., 'yrc': ..., 'txt': ...}，未缓存时返回 None。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lrc, trans, yrc, txt FROM lyrics WHERE provider = ? AND songid = ?",
+                (provider, str(songid))).fetchone()
+        metrics.cache_lookup("lyrics", row is not None)
+        if row is None:
+            return None
+        return dict(zip(VARIANTS, row))
+
+    def put(self, provider, songid, lyrics: dict, source_path=None):
+        """
+        写入（或补充）一首歌的歌词。lyrics 中缺失或为空的版本保留缓存里已有的内容。
+        """
+        values = [lyrics.get(v) or None for v in VARIANTS]
+        if not any(values):
+            return
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO lyrics (provider, songid, lrc, trans, yrc, txt, source_path, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (provider, songid) DO UPDATE SET
+                    lrc = COALESCE(excluded.lrc, lrc),
+                    trans = COALESCE(excluded.trans, trans),
+                    yrc = COALESCE(excluded.yrc, yrc),
+                    txt = COALESCE(excluded.txt, txt),
+                    source_path = COALESCE(excluded.source_path, source_path),
+                    fetched_at = excluded.fetched_at
+            """, (provider, str(songid), *values, source_path and os.path.abspath(source_path), time.time()))
+            self._conn.commit()
+
+    def get_or_fetch(self, provider, songid, fetcher):
+        """
+        先查缓存，未命中时调用 fetcher(songid) 获取并写入缓存。
+
+        Args:
+            fetcher (callable): 返回包含 lrc/trans/yrc 等字段的 dict，失败返回 None。
+
+        Returns:
+            dict or None: 歌词数据。
+        """
+        cached = self.get(provider, songid)
+        if cached is not None:
+            return cached
+        fetched = fetcher(songid)
+        if fetched:
+            self.put(provider, songid, fetched)
+            return self.get(provider, songid) or fetched
+        return None
+
+    def iter_with_translation(self):
+        """
+        逐条产出所有同时有原文和译文的歌曲，供批量合并使用。
+
+        Yields:
+            tuple: ((provider, songid), lrc, trans)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT provider, songid, lrc, trans FROM lyrics WHERE lrc IS NOT NULL AND trans IS NOT NULL"
+            ).fetchall()
+        for provider, songid, lrc, trans in rows:
+            yield (provider, songid), lrc, trans
+
+    def fetch_async(self, provider, songid, fetcher):
+        """
+        在后台线程中执行 get_or_fetch()，用于与音频下载并行获取歌词。
+
+        Returns:
+            concurrent.futures.Future: 结果同 get_or_fetch()。
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="lyrics")
+        return self._executor.submit(self.get_or_fetch, provider, songid, fetcher)
+
+    def index_tree(self, root=DOWNLOAD_DIR) -> int:
+        """
+        把目录中已有的 .lrc / .txt 歌词文件收入缓存（同名的一对文件合并为一条记录）。
+
+        Returns:
+            int: 收录的歌曲数量。
+        """
+        pairs = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                stem, ext = os.path.splitext(filename)
+                variant = ext[1:].lower()
+                if variant in ("lrc", "txt"):
+                    pairs.setdefault((dirpath, stem), {})[variant] = os.path.join(dirpath, filename)
+
+        index = library_index.get_index()
+        for (dirpath, stem), files in pairs.items():
+            lyrics = {}
+            for variant, path in files.items():
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    lyrics[variant] = f.read()
+
+            audio = index.find_by_stem(dirpath, stem)
+            source = index.get_source(audio) if audio else None
+            provider, songid = source or ("file", os.path.abspath(os.path.join(dirpath, stem)))
+            self.put(provider, songid, lyrics, source_path=files.get("lrc") or files.get("txt"))
+        return len(pairs)
+
+    def stats(self) -> dict:
+        """返回缓存的歌曲数以及各版本的数量。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COUNT(lrc), COUNT(trans), COUNT(yrc), COUNT(txt) FROM lyrics").fetchone()
+        return dict(zip(("songs",) + VARIANTS, row))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> LyricsCache:
+    """返回进程内共享的默认歌词缓存（downloads/.meta/lyrics.sqlite3）。"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LyricsCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = get_cache()
+
+    if command == "index":
+        target = sys.argv[2] if len(sys.argv) > 2 else DOWNLOAD_DIR
+        print(f"共收录 {cache.index_tree(target)} 首歌曲的歌词。")
+        print(cache.stats())
+    elif command == "export" and len(sys.argv) >= 4:
+        variant = sys.argv[4] if len(sys.argv) > 4 else "lrc"
+        lyrics = cache.get(sys.argv[2], sys.argv[3])
+        if not lyrics or not lyrics.get(variant):
+            print(f"缓存中没有该歌曲的 {variant} 歌词。")
+            sys.exit(1)
+        print(lyrics[variant])
+    elif command == "stats":
+        print(cache.stats())
+    else:
+        print("用法: python lyrics_cache.py [index [目录] | export <provider> <songid> [lrc|trans|yrc|txt] | stats]")
+        sys.exit(1)
@@ -0,0 +1,249 @@
+"""
+分阶段的延迟与吞吐指标。
+
+记录的内容:
+    music_stage_seconds{stage, provider}             各阶段耗时直方图（search / resolve / download / convert / db_insert）
+    music_stage_total{stage, provider, outcome}      各阶段调用次数（outcome: ok / fail / error）
+    music_stage_errors_total{stage, provider, error} 抛出的异常，按异常类名分类
+    music_retries_total{stage, provider}             重试次数
+    music_bytes_total{host}                          下载字节数
+    music_cache_total{cache, result}                 缓存命中 / 未命中（result: hit / miss）
+    music_http_request_seconds{route}                清理数据/serve.py 的请求耗时直方图
+    music_http_requests_total{route, method, status} 清理数据/serve.py 的请求次数
+
+导出方式:
+    render_prometheus()            Prometheus 文本格式
+    snapshot()                     dict，可用 start_json_snapshots() 定期追加到 JSONL 文件
+
+默认关闭。关闭时被 @timed 包装的函数只多一次全局变量判断，计数函数直接返回。
+用环境变量开启:
+    MUSIC_METRICS=1                 开启记录
+    MUSIC_METRICS_JSON=<路径>       开启记录，并每 JSON_INTERVAL 秒追加一行快照
+    MUSIC_METRICS_PROM=<路径>       开启记录，并在进程退出时写出 Prometheus 文本（可供 node_exporter textfile 采集）
+也可以在代码中调用 enable()。
+"""
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# --- 配置 ---
+ENABLE_ENV = "MUSIC_METRICS"
+JSON_ENV = "MUSIC_METRICS_JSON"
+PROM_ENV = "MUSIC_METRICS_PROM"
+JSON_INTERVAL = 30
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}    # (name, labels) → 数值，labels 为 ((键, 值), ...)
+_histograms = {}  # (name, labels) → [各桶计数..., +Inf 计数, 总和]
+
+_HELP = {
+    "music_stage_seconds": "Latency of each pipeline stage",
+    "music_stage_total": "Calls of each pipeline stage by outcome",
+    "music_stage_errors_total": "Exceptions raised by each pipeline stage",
+    "music_retries_total": "Retries of each pipeline stage",
+    "music_bytes_total": "Bytes downloaded per host",
+    "music_cache_total": "Cache lookups by result",
+    "music_cookie_refresh_total": "Cookie refreshes triggered by anti-bot responses, by outcome",
+    "music_response_total": "Responses by host and classifier label",
+    "music_http_request_seconds": "Latency of HTTP requests served by 清理数据/serve.py",
+    "music_http_requests_total": "HTTP requests served by 清理数据/serve.py",
+}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+# --- 记录 ---
+
+def inc(name, n=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name, value, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        hist[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        hist[-1] += value
+
+
+def add_bytes(host, n):
+    inc("music_bytes_total", n, host=host or "unknown")
+
+
+def cache_lookup(cache, hit):
+    inc("music_cache_total", cache=cache, result="hit" if hit else "miss")
+
+
+def retry(stage, provider):
+    inc("music_retries_total", stage=stage, provider=provider)
+
+
+def timed(stage, provider, ok=bool):
+    """
+    装饰器：记录被包装函数的耗时、结果与异常。
+
+    Args:
+        ok (callable): 按返回值判断成功与否（默认 bool：返回 None / False / 空列表算 fail）。
+            本项目的函数大多在内部捕获异常后返回 None / False，因此需要按返回值区分。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                _record(stage, provider, started, "error")
+                inc("music_stage_errors_total", stage=stage, provider=provider, error=type(e).__name__)
+                raise
+            _record(stage, provider, started, "ok" if ok(result) else "fail")
+            return result
+        return wrapper
+    return decorator
+
+
+def _record(stage, provider, started, outcome):
+    observe("music_stage_seconds", time.perf_counter() - started, stage=stage, provider=provider)
+    inc("music_stage_total", stage=stage, provider=provider, outcome=outcome)
+
+
+# --- 导出 ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """按 Prometheus 文本格式 (0.0.4) 导出全部指标。"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(hist)) for key, hist in _histograms.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} counter"]
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), hist in histograms:
+        if name not in seen:
+            seen.add(name)
+            lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), hist[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist[-1]:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(hist, q):
+    """由直方图估算分位数（取所在桶的上界）。"""
+    total = sum(hist[:-1])
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), hist[:-1]):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+    return None
+
+
+def snapshot() -> dict:
+    """
+    当前指标的 JSON 友好快照。
+
+    Returns:
+        dict: {"ts", "counters": [{name, labels, value}], "stages": [{stage, provider, count, avg, p50, p95}]}
+    """
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(_counters.items())]
+        stages = []
+        for (name, labels), hist in sorted(_histograms.items()):
+            count = sum(hist[:-1])
+            stages.append(dict(labels, count=count, avg=round(hist[-1] / count, 4) if count else None,
+                               p50=_quantile(hist, 0.5), p95=_quantile(hist, 0.95)))
+    return {"ts": round(time.time(), 3), "counters": counters, "stages": stages}
+
+
+def write_prometheus(path):
+    """原子地写出 Prometheus 文本文件。"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+def start_json_snapshots(path, interval=JSON_INTERVAL):
+    """启动后台线程，每 interval 秒向 path 追加一行快照；进程退出时再追加最后一行。"""
+    stop = threading.Event()
+
+    def append():
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot(), ensure_ascii=False) + "\n")
+
+    def run():
+        while not stop.wait(interval):
+            append()
+
+    threading.Thread(target=run, name="metrics-json", daemon=True).start()
+    atexit.register(lambda: (stop.set(), append()))
+    return stop
+
+
+def _configure_from_env():
+    if os.environ.get(ENABLE_ENV, "") not in ("", "0") or os.environ.get(JSON_ENV) or os.environ.get(PROM_ENV):
+        enable()
+    if os.environ.get(JSON_ENV):
+        start_json_snapshots(os.environ[JSON_ENV])
+    if os.environ.get(PROM_ENV):
+        atexit.register(write_prometheus, os.environ[PROM_ENV])
+
+
+_configure_from_env()
@@ -0,0 +1,111 @@
+"""
+统一命令行入口：music <子命令> [参数...]
+
+每个子命令对应仓库中已有的一个工具，只有被选中的那一个才会被导入:
+    - 提供 main(argv) 的模块（batch_download、quality_ladder 等）直接调用 main；
+    - 其余脚本（download_music.py、文件名带点号的 music_scraper_0.5.py 等）按脚本方式运行，
+      等同于 python <脚本> [参数...]。
+本文件只导入标准库，`music --help` 和子命令分发本身不会加载 requests / bs4 / pandas 等依赖。
+
+安装:
+    pip install -e .            # 可编辑安装，提供 music 命令（文件名带点号的脚本按路径加载，需要保留源码目录）
+    pip install -e ".[gequhai,async]"
+
+用法:
+    music gequhai "晴天 周杰伦"
+    music vkeys "晴天 周杰伦"
+    music batch queries.csv --workers 8
+    music ladder 1234567 --probe
+    python music_cli.py --help
+
+守护进程 (music_daemon.py) 在运行时，`music gequhai <关键词>` / `music vkeys <关键词>` 不再启动完整的下载脚本，
+而是把任务提交给守护进程并等待结果；设置环境变量 MUSIC_DAEMON=0 可强制按原方式在本进程内运行。
+"""
+import argparse
+import importlib
+import runpy
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+# --- 配置 ---
+# 子命令 → (模块名 或 相对仓库根目录的脚本路径, 说明)
+COMMANDS = {
+    "gequhai": ("download_music.py", "歌曲海：按关键词搜索并下载一首歌（自动化工作流用）"),
+    "myfreemp3": ("music_scraper_0.5.py", "myfreemp3：交互式搜索与下载"),
+    "vkeys": ("tencent_music_seacrch.py", "vkeys（QQ 音乐）：交互式搜索与下载；给出关键词时直接下载最匹配的一首"),
+    "batch": ("batch_download", "批量下载 CSV / JSONL 查询列表"),
+    "warm": ("cache_warmer", "按热门关键词预热搜索与直链缓存"),
+    "ladder": ("quality_ladder", "bugpk 音质阶梯解析"),
+    "lrc": ("lrc_engine", "LRC / YRC 歌词工具"),
+    "tag": ("tagging", "写入音频标签与封面"),
+    "library": ("library_index.py", "音乐库索引：reconcile / pending / stats"),
+    "store": ("content_store.py", "内容寻址存储：dedupe / stats / verify"),
+    "lyrics": ("lyrics_cache.py", "歌词缓存：index / export / stats"),
+    "covers": ("cover_cache.py", "封面缓存：fetch / index / thumbs / stats"),
+    "cookies": ("cookie_store.py", "按站点保存的 Cookie：list / set / clear"),
+    "convert": ("convert_audio.py", "把下载目录中的 AAC 批量转换为 MP3"),
+    "db": ("db_0.4.py", "搜索并写入 MySQL"),
+    "artists": ("music_id_scraper_0.5.py", "爬取网易云歌手列表到 CSV"),
+    "replay": ("http_replay", "在 HTTP 录制 / 回放模式下运行脚本"),
+    "clean-serve": ("清理数据/serve.py", "多进程运行清理数据的 FastAPI 服务"),
+    "sink-bench": ("file_sink", "下载写入器微基准"),
+    "bench": ("benchmarks.run", "端到端基准测试（含启动耗时）"),
+    "daemon": ("music_daemon", "常驻下载守护进程：serve / download / search / status / events / stop"),
+}
+# 守护进程运行时改为提交任务的子命令 → (任务类型, 来源)
+DAEMON_COMMANDS = {"gequhai": ("download", "gequhai"), "vkeys": ("download", "vkeys")}
+
+
+def run_command(name, args):
+    """
+    运行一个子命令。
+
+    Returns:
+        int: 退出码（脚本自行调用 sys.exit 时由 SystemExit 传出）。
+    """
+    target, _ = COMMANDS[name]
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    if name in DAEMON_COMMANDS and len(args) == 1 and not args[0].startswith('-'):
+        import music_daemon
+
+        job_type, provider = DAEMON_COMMANDS[name]
+        status = music_daemon.try_remote(job_type, args[0].strip(), provider)
+        if status is not None:
+            return status
+    sys.argv = [f"music {name}"] + list(args)
+
+    if target.endswith(".py"):
+        path = REPO_ROOT / target
+        if not path.exists():
+            print(f"错误：找不到脚本 {path}（请在源码目录中以 pip install -e . 方式安装）。", file=sys.stderr)
+            return 1
+        sys.path.insert(0, str(path.parent))
+        runpy.run_path(str(path), run_name="__main__")
+        return 0
+
+    module = importlib.import_module(target)
+    return module.main(list(args)) or 0
+
+
+def build_parser():
+    width = max(len(name) for name in COMMANDS)
+    epilog = "子命令:\n" + "\n".join(f"  {name:<{width}}  {description}"
+                                     for name, (_, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(prog="music", description="音乐搜索 / 下载工具集的统一入口。",
+                                     epilog=epilog + "\n\n各子命令的参数见: music <子命令> --help",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=tuple(COMMANDS), metavar="子命令", help="要运行的工具")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="传给该工具的参数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return run_command(args.command, args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,456 @@
+"""
+常驻下载守护进程与本地 HTTP/JSON 任务接口。
+
+自动化中每首歌都新起一个 download_music.py 进程：重新导入依赖、重新探测 ffmpeg、重新同步音乐库索引、
+重新建立连接。守护进程把这些只做一次，之后的任务都在同一进程内完成:
+    - 各来源模块在第一次用到时导入并完成一次性检查（ffmpeg、下载目录、音乐库索引同步），之后一直保持；
+    - download_music / tencent_music_seacrch 的模块级 requests.Session 保持连接复用；
+    - 搜索 / 直链 / 歌词 / 内容仓库等 SQLite 缓存与库索引的单例常驻；
+    - 任务在固定大小的线程池中执行，下载仍经过全局下载调度器（交互任务优先于批量任务）。
+
+接口（只监听本机）:
+    POST /jobs              提交任务，请求体为一个或一组任务:
+                            {"type": "download", "query": "晴天-周杰伦", "provider": "gequhai"}
+                            {"type": "search", "query": "周杰伦", "provider": "vkeys"}
+                            可选 "title" / "artist"（代替 query）、"priority": "interactive" | "batch"
+    GET  /jobs              最近的任务列表
+    GET  /jobs/<id>         单个任务的状态与结果
+    GET  /events            事件流 (NDJSON，分块传输)，参数 since=<序号>、job=<任务 id>；
+                            指定 job 时在该任务结束后关闭，否则一直保持（定期发送 heartbeat）
+    GET  /health            进程状态、已预热的来源、任务计数、下载汇总
+    POST /shutdown          停止守护进程
+
+客户端只用标准库（启动只需几毫秒）。守护进程运行时，music_cli 的 gequhai / vkeys 子命令以及
+download_music.py、tencent_music_seacrch.py 的非交互入口都自动改为提交任务（try_remote）。
+
+用法:
+    python music_daemon.py serve --workers 4
+    python music_daemon.py download "晴天-周杰伦" --provider gequhai
+    python music_daemon.py search 周杰伦 --provider vkeys
+    python music_daemon.py status [任务 id]
+    python music_daemon.py events
+    python music_daemon.py stop
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 配置 ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8790
+URL_ENV = "MUSIC_DAEMON_URL"
+OPT_OUT_ENV = "MUSIC_DAEMON"  # 设为 0 时命令行工具不交给守护进程，始终在本进程内运行
+DEFAULT_WORKERS = 4
+MAX_JOBS = 1000          # 内存中保留的任务数（超出后丢弃最早完成的）
+MAX_EVENTS = 5000
+HEARTBEAT_INTERVAL = 15
+PROBE_TIMEOUT = 0.2      # 客户端探测守护进程是否在运行的超时（秒）
+PROVIDERS = ("gequhai", "vkeys")
+JOB_TYPES = ("download", "search")
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+FINISHED = (STATUS_DONE, STATUS_FAILED)
+
+
+class EventLog:
+    """带序号的事件环形缓冲；读者按序号增量读取，没有新事件时阻塞等待。"""
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self._events = deque(maxlen=max_events)
+        self._seq = itertools.count(1)
+        self._last = 0
+        self._cond = threading.Condition()
+
+    def emit(self, kind, **fields):
+        with self._cond:
+            self._last = next(self._seq)
+            event = {"seq": self._last, "ts": round(time.time(), 3), "type": kind, **fields}
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def since(self, seq, timeout=None):
+        """返回序号大于 seq 的事件；没有时最多等待 timeout 秒。"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last > seq, timeout)
+            return [event for event in self._events if event["seq"] > seq]
+
+
+class Daemon:
+    """守护进程的状态：任务表、线程池、已预热的来源模块。"""
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self.events = EventLog()
+        self.started = time.time()
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._warm_lock = threading.Lock()
+
+    # --- 预热 ---
+
+    def provider_module(self, provider):
+        """导入来源模块并完成一次性检查；每个来源在进程生命周期内只做一次。"""
+        with self._warm_lock:
+            module = self._providers.get(provider)
+            if module is not None:
+                return module
+            started = time.perf_counter()
+            if provider == "gequhai":
+                import download_music
+                import library_index
+                download_music.check_ffmpeg_available()
+                library_index.get_index().reconcile(download_music.DOWNLOAD_DIR)
+                module = download_music
+            else:
+                import tencent_music_seacrch
+                tencent_music_seacrch.ensure_download_dir()
+                module = tencent_music_seacrch
+            self._providers[provider] = module
+        self.events.emit("provider_warm", provider=provider, seconds=round(time.perf_counter() - started, 3))
+        return module
+
+    # --- 任务 ---
+
+    def submit(self, spec):
+        """
+        校验并提交一个任务。
+
+        Raises:
+            ValueError: 任务描述无效。
+        """
+        import batch_download
+
+        if not isinstance(spec, dict):
+            raise ValueError("任务必须是 JSON 对象")
+        job_type = spec.get("type", "download")
+        provider = spec.get("provider", "gequhai")
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型: {job_type}（可选 {', '.join(JOB_TYPES)}）")
+        if provider not in PROVIDERS:
+            raise ValueError(f"未知的来源: {provider}（可选 {', '.join(PROVIDERS)}）")
+        item = batch_download.make_item(0, {key: spec.get(key) for key in ("query", "title", "artist")})
+        if item is None:
+            raise ValueError("缺少 query（或 title / artist）")
+
+        with self._lock:
+            job_id = str(next(self._ids))
+            job = {"id": job_id, "type": job_type, "provider": provider, "query": item["query"],
+                   "priority": spec.get("priority", "interactive"), "status": STATUS_QUEUED,
+                   "submitted": round(time.time(), 3), "started": None, "finished": None, "result": None}
+            self._jobs[job_id] = job
+            self._evict()
+        self.events.emit("job_queued", job=job_id, job_type=job_type, provider=provider, query=item["query"])
+        self.pool.submit(self._run, job, item)
+        return dict(job)
+
+    def _evict(self):
+        while len(self._jobs) > MAX_JOBS:
+            oldest = next((job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+    def _run(self, job, item):
+        import batch_download
+        import download_scheduler
+
+        job["status"] = STATUS_RUNNING
+        job["started"] = round(time.time(), 3)
+        self.events.emit("job_started", job=job["id"])
+        try:
+            module = self.provider_module(job["provider"])
+            if job["type"] == "search":
+                search = module.search_songs if job["provider"] == "gequhai" else module.search_music
+                songs = search(item["query"].replace('-', ' ') if job["provider"] == "gequhai" else item["query"])
+                result = {"status": batch_download.STATUS_OK if songs else batch_download.STATUS_NOT_FOUND,
+                          "songs": songs or []}
+            else:
+                priority = (download_scheduler.PRIORITY_BATCH if job["priority"] == "batch"
+                            else download_scheduler.PRIORITY_INTERACTIVE)
+                result = batch_download.run_item(item, job["provider"], f"daemon-{job['id']}", priority)
+        except Exception as e:
+            result = {"status": batch_download.STATUS_ERROR, "error": f"{type(e).__name__}: {e}"}
+        job["result"] = result
+        job["status"] = STATUS_DONE if result.get("status") == batch_download.STATUS_OK else STATUS_FAILED
+        job["finished"] = round(time.time(), 3)
+        self.events.emit("job_finished", job=job["id"], status=job["status"], result_status=result.get("status"),
+                         path=result.get("path"))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, limit=100):
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [{key: job[key] for key in ("id", "type", "provider", "query", "status", "submitted", "finished")}
+                for job in jobs]
+
+    def health(self):
+        import progress
+
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"pid": os.getpid(), "uptime": round(time.time() - self.started, 1), "workers": self.workers,
+                "providers": sorted(self._providers), "jobs": counts, "transfer": progress.get_tracker().snapshot()}
+
+
+def _handler_class(daemon, server_ref):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, obj, status=200):
+            data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def do_GET(self):
+            parsed = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(parsed.query))
+            if parsed.path == "/health":
+                return self._json(daemon.health())
+            if parsed.path == "/jobs":
+                return self._json(daemon.list(int(query.get("limit", 100))))
+            if parsed.path.startswith("/jobs/"):
+                job = daemon.get(parsed.path[len("/jobs/"):])
+                return self._json(job) if job else self._json({"error": "任务不存在"}, 404)
+            if parsed.path == "/events":
+                return self._events(int(query.get("since", 0)), query.get("job"))
+            self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            parsed = urllib.parse.urlsplit(self.path)
+            try:
+                body = self._body()
+            except ValueError:
+                return self._json({"error": "请求体不是有效的 JSON"}, 400)
+            if parsed.path == "/jobs":
+                try:
+                    if isinstance(body, list):
+                        return self._json([daemon.submit(spec) for spec in body], 202)
+                    return self._json(daemon.submit(body), 202)
+                except ValueError as e:
+                    return self._json({"error": str(e)}, 400)
+            if parsed.path == "/shutdown":
+                self._json({"status": "stopping"})
+                threading.Thread(target=server_ref[0].shutdown, daemon=True).start()
+                return None
+            self._json({"error": "not found"}, 404)
+
+        def _chunk(self, obj):
+            data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _events(self, since, job_id):
+            if job_id and daemon.get(job_id) is None:
+                return self._json({"error": "任务不存在"}, 404)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                while True:
+                    events = daemon.events.since(since, HEARTBEAT_INTERVAL)
+                    for event in events:
+                        since = event["seq"]
+                        if not job_id or event.get("job") == job_id:
+                            self._chunk(event)
+                    if not events:
+                        self._chunk({"type": "heartbeat", "ts": round(time.time(), 3)})
+                    if job_id:
+                        job = daemon.get(job_id)
+                        if job["status"] in FINISHED:
+                            # 事件可能已被挤出缓冲，最后总是补发一次完整的任务状态
+                            self._chunk({"type": "job", "job": job_id, "data": job})
+                            break
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, providers=()):
+    """启动守护进程并阻塞直到收到 /shutdown 或 Ctrl+C。providers 中的来源会在启动时预热。"""
+    import progress
+
+    # 进度由 /health 与事件流提供，不在守护进程的终端上刷新
+    progress.set_mode(progress.MODE_OFF)
+    daemon = Daemon(workers)
+    server_ref = []
+    server = ThreadingHTTPServer((host, port), _handler_class(daemon, server_ref))
+    server.daemon_threads = True
+    server_ref.append(server)
+    for provider in providers:
+        daemon.provider_module(provider)
+    print(f"[守护进程] 监听 http://{host}:{port}，{workers} 个任务线程，pid {os.getpid()}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.pool.shutdown(wait=False, cancel_futures=True)
+    print("[守护进程] 已停止。", flush=True)
+    return daemon
+
+
+# --- 客户端（只用标准库） ---
+
+def daemon_url():
+    return os.environ.get(URL_ENV, f"http://{DEFAULT_HOST}:{DEFAULT_PORT}").rstrip("/")
+
+
+def _request(path, payload=None, url=None, timeout=10):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(f"{url or daemon_url()}{path}", data=data,
+                                     headers={"Content-Type": "application/json"} if data else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}")
+
+
+def is_running(url=None) -> bool:
+    """守护进程是否在运行（连接被拒绝时立即返回 False）。"""
+    try:
+        _request("/health", url=url, timeout=PROBE_TIMEOUT)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def submit(spec, url=None):
+    return _request("/jobs", spec, url)
+
+
+def follow(job_id, url=None, on_event=None):
+    """读取某个任务的事件流直到任务结束，返回任务的最终状态。"""
+    query = urllib.parse.urlencode({"job": job_id})
+    final = None
+    with urllib.request.urlopen(f"{url or daemon_url()}/events?{query}", timeout=HEARTBEAT_INTERVAL * 2) as response:
+        for line in response:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "job":
+                final = event["data"]
+            elif on_event and event["type"] != "heartbeat":
+                on_event(event)
+    return final
+
+
+def _print_event(event):
+    details = {key: value for key, value in event.items() if key not in ("seq", "ts", "type", "job")}
+    print(f"[任务 {event.get('job', '-')}] {event['type']} {json.dumps(details, ensure_ascii=False) if details else ''}",
+          flush=True)
+
+
+def run_remote(job_type, query, provider="gequhai", url=None, quiet=False):
+    """
+    提交一个任务并等待完成（thin client 的核心）。
+
+    Returns:
+        int: 退出码，任务成功为 0。
+    """
+    job = submit({"type": job_type, "query": query, "provider": provider}, url)
+    if "error" in job:
+        print(f"❌ 提交失败: {job['error']}")
+        return 2
+    final = follow(job["id"], url, None if quiet else _print_event)
+    print(json.dumps(final["result"] if final else None, ensure_ascii=False, indent=2))
+    return 0 if final and final["status"] == STATUS_DONE else 1
+
+
+def try_remote(job_type, query, provider="gequhai"):
+    """
+    守护进程在运行时把任务交给它执行（music_cli 以及 download_music.py / tencent_music_seacrch.py
+    的非交互入口共用）。
+
+    Returns:
+        int or None: 任务的退出码；守护进程未运行或设置了 MUSIC_DAEMON=0 时返回 None，由调用方在本进程内执行。
+    """
+    if os.environ.get(OPT_OUT_ENV) == "0" or not is_running():
+        return None
+    return run_remote(job_type, query, provider)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常驻下载守护进程及其客户端。")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="启动守护进程")
+    p_serve.add_argument("--host", default=DEFAULT_HOST)
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p_serve.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="任务线程数")
+    p_serve.add_argument("--warm", nargs="*", choices=PROVIDERS, default=(), help="启动时预热的来源")
+
+    for name in JOB_TYPES:
+        p_job = sub.add_parser(name, help=f"提交{'下载' if name == 'download' else '搜索'}任务并等待结果")
+        p_job.add_argument("query")
+        p_job.add_argument("--provider", choices=PROVIDERS, default="gequhai")
+        p_job.add_argument("--quiet", action="store_true", help="不输出中间事件")
+
+    p_status = sub.add_parser("status", help="查看守护进程或某个任务的状态")
+    p_status.add_argument("job", nargs="?")
+    p_events = sub.add_parser("events", help="持续输出事件流")
+    p_events.add_argument("--since", type=int, default=0)
+    sub.add_parser("stop", help="停止守护进程")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.workers, args.warm)
+        return 0
+    if not is_running():
+        print(f"❌ 守护进程未运行 ({daemon_url()})，请先执行: python music_daemon.py serve")
+        return 2
+    if args.command in JOB_TYPES:
+        return run_remote(args.command, args.query, args.provider, quiet=args.quiet)
+    if args.command == "status":
+        print(json.dumps(_request(f"/jobs/{args.job}" if args.job else "/health"), ensure_ascii=False, indent=2))
+        return 0
+    if args.command == "events":
+        with urllib.request.urlopen(f"{daemon_url()}/events?since={args.since}") as response:
+            for line in response:
+                if line.strip():
+                    print(line.decode("utf-8").rstrip(), flush=True)
+        return 0
+    print(json.dumps(_request("/shutdown", {}), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,17 @@
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 import time
 import random
 import urllib.parse
 import os  # 用于创建调试文件
 
+import cookie_store
+import response_classifier
+
+# 网易云 Cookie 的种子（从浏览器请求中复制，含 MUSIC_U）：首次运行时写入 Cookie 存储，
+# 之后使用存储中的值，遇到验证码重定向等反爬响应时自动访问首页刷新
+NETEASE_SEED_COOKIE = '_ntes_nnid=b1476dd9c69c5e987f74c9306303f746,1753375028182; _ntes_nuid=b1476dd9c69c5e987f74c9306303f746; NMTID=00O_lbVMAkCcy9IR0zIpK3u_EawdiwAAAGYPUu_yw; WEVNSM=1.0.0; WNMCID=jqzrqg.1753375033773.01.0; ntes_utid=tid._.mv%252FaRYPKrH1BF1RQBFLDxUq2JN63MwOI._.0; sDeviceId=YD-JmH6HUeCgDdEB1FUERfChB72cNr3M1Pc; __snaker__id=3jeJPCRVVrIrQQJ2; WM_TID=aBQT4oIFhQBAEFVVRQOCkUr2NcvjnIbD; __remember_me=true; ntes_kaola_ad=1; __csrf=0b7b8f365a7f13190efcf659922582e0; gdxidpyhxdE=O%2Bdq8bQ0lczlB16AyOc2xzwk1S9jal7B1gONmlLKv3uKD%2FY4n%2Bhoww98fWuB7WZPkR2SmaJz3K3kHgtamnXT6%2BMUsIXbUQAq3DmXtzBx%2FdLLfL%5C%5C6auZ6j74YO66pe7HTz6oJ%2Balr9CzYfbnTWHWs4EzA%2FAOcRzLe%2FafUlKgqXRLleGr%3A1756969456096; __csrf=023112af9101280bdd45c022f8bf0063; MUSIC_U=0024094A5082154C0F47E52028EA76E69A6AFD2B4E1E8F522A155E309DDF3BD6E53D0E070A033DF549D93EF4EE343A6702E4C050EFB899855A628B32121C421EDB8C0ACF9CD14AE36DD05716C0FD34F6B99C329AC20985FBC0595A99FB1AC5AE8265A159ADC6AAE0C79975CF8B3FB08E4A947D376F1B9BB779232BA6D8094BB73B770FECDCD338E516A954CA22CDF2B177F522B21B9D84D0E80C68DF9A552AFF20D4DAF7A392B43D13203C86B98683401189DFED83BD2B78EACD57A377DFB9217973B888B6A8C910A0E492EFE7E78B27D4C0B1C499A0E06C230C223E5A7498A8FDB1DE5E7FF4255F4B91F9E3ED348C855E6C42FE3469509AB01A974486216937EF7C46113E3D3CD92657DC07B22CD498969307F5DE61E554CD0AF18738B97D4F2F3F30FA021CC7FE64FD177088D03403837182566EF9BCA6A7082A03BA3C38D4D49FA6E453B0B18ABF40EBFCC01904933EDA5B28D1701606368793E03E46E9AA2991A5FF05BE6C6CB763DCBBA08147BC39A6DD599855D33D7153B5C769E2C45E2376CB71BCB1F97C29B36C3AEE7EC22A21EDE73B17F42563B7708AB044999E7BB3; _iuqxldmzr_=32; WM_NI=Fr0ZUfmXCBb7mE7Ngt7SDhSzSrNm7uas%2FJENJBkQlWoI77XqfgvzOj1f2eaaEefkCZ8hGEnZ%2FUFG14VnyuchVOZoySLyp53RGw6MLxrgzIJtudPAUa%2FG2ZbP3PDeg6OkbVg%3D; WM_NIKE=9ca17ae2e6ffcda170e2e6eea4c85fb69bab9be14a93e78ab6c15a838e8b82c764acbf8787d8679586828ecc2af0fea7c3b92a86ae00bbd86eaf888da3e13daf9bf9afe680f58d8c89d27291ae828eb67fa3ade1abc8468a9ea5b2ef5dad97f9d8db7ba6b9ba9bce62f3bafe86e46b87bbaa8cc252fcb889a6ed52ed8b8aa8b44096b2b796e26496919690fc5990a7c0d6b25a85a9faaecf74b2b9b6aac980b7bca0a2d86bed99febbe15cf1908c86e63e8db5aeb7e637e2a3; JSESSIONID-WYYY=vpMCs2Q3goSX9n%2FODwqMiWTtRqk%2BaxTQFm%2F%5CUr%2FbZk6QF74SFRqH1OSy2gVnSCdMv6U6i3p3gKv%5CeUr%2BYrG8SMZCtr8yscpFw%2F1Aoa9Yi%2F6tiv%2F58zk%2BH9qJ119bE2WJgfv%2BCkAJxF%2F1EUZHbBTHO%2Fpiqiyj3AR6G%5Cs9g45CBpA7%2F3qn%3A1757095338950'
+NETEASE_HOME = 'https://music.163.com/'
+
 
 def get_artist_data():
     """
@@ -13,6 +19,10 @@ def get_artist_data():
     该函数将遍历预定义的歌手分类ID和首字母组合，发送HTTP请求，
     解析返回的HTML内容以提取歌手名称、ID和链接，然后将数据去重后保存。
     """
+    # bs4 / pandas 导入较慢，放到真正开始爬取时再加载
+    from bs4 import BeautifulSoup
+    import pandas as pd
+
     # 歌手分类ID列表
     ls1 = [1001, 1002, 1003, 2001, 2002, 2003, 6001, 6002, 6003, 7001, 7002, 7003, 4001, 4002, 4003]
     # 首字母/数字/其他 对应的ASCII码或特殊值
@@ -21,17 +31,13 @@ def get_artist_data():
 
     # 完整、精确地模拟浏览器请求头。
     # 这些headers是根据您之前提供的浏览器实际请求头信息整理的。
-    # 特别是Cookie和Referer，它们对于绕过反爬机制非常重要。
-    # 请确保Cookie是最新且有效的。
+    # 特别是Referer，它对于绕过反爬机制非常重要；Cookie 由 Cookie 存储 (cookie_store.py) 在每次请求时带上。
     headers = {
         'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
         'Accept-Encoding': 'gzip, deflate, br, zstd',  # 告知服务器客户端支持的压缩方式
         'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
         'Cache-Control': 'max-age=0',  # 请求不使用缓存
-        # 从您提供的原始请求信息中复制的完整Cookie字符串。
-        # 注意：Cookie会过期，如果遇到爬取失败，请重新从浏览器获取最新Cookie。
-        'Cookie': '_ntes_nnid=b1476dd9c69c5e987f74c9306303f746,1753375028182; _ntes_nuid=b1476dd9c69c5e987f74c9306303f746; NMTID=00O_lbVMAkCcy9IR0zIpK3u_EawdiwAAAGYPUu_yw; WEVNSM=1.0.0; WNMCID=jqzrqg.1753375033773.01.0; ntes_utid=tid._.mv%252FaRYPKrH1BF1RQBFLDxUq2JN63MwOI._.0; sDeviceId=YD-JmH6HUeCgDdEB1FUERfChB72cNr3M1Pc; __snaker__id=3jeJPCRVVrIrQQJ2; WM_TID=aBQT4oIFhQBAEFVVRQOCkUr2NcvjnIbD; __remember_me=true; ntes_kaola_ad=1; __csrf=0b7b8f365a7f13190efcf659922582e0; gdxidpyhxdE=O%2Bdq8bQ0lczlB16AyOc2xzwk1S9jal7B1gONmlLKv3uKD%2FY4n%2Bhoww98fWuB7WZPkR2SmaJz3K3kHgtamnXT6%2BMUsIXbUQAq3DmXtzBx%2FdLLfL%5C%5C6auZ6j74YO66pe7HTz6oJ%2Balr9CzYfbnTWHWs4EzA%2FAOcRzLe%2FafUlKgqXRLleGr%3A1756969456096; __csrf=023112af9101280bdd45c022f8bf0063; MUSIC_U=0024094A5082154C0F47E52028EA76E69A6AFD2B4E1E8F522A155E309DDF3BD6E53D0E070A033DF549D93EF4EE343A6702E4C050EFB899855A628B32121C421EDB8C0ACF9CD14AE36DD05716C0FD34F6B99C329AC20985FBC0595A99FB1AC5AE8265A159ADC6AAE0C79975CF8B3FB08E4A947D376F1B9BB779232BA6D8094BB73B770FECDCD338E516A954CA22CDF2B177F522B21B9D84D0E80C68DF9A552AFF20D4DAF7A392B43D13203C86B98683401189DFED83BD2B78EACD57A377DFB9217973B888B6A8C910A0E492EFE7E78B27D4C0B1C499A0E06C230C223E5A7498A8FDB1DE5E7FF4255F4B91F9E3ED348C855E6C42FE3469509AB01A974486216937EF7C46113E3D3CD92657DC07B22CD498969307F5DE61E554CD0AF18738B97D4F2F3F30FA021CC7FE64FD177088D03403837182566EF9BCA6A7082A03BA3C38D4D49FA6E453B0B18ABF40EBFCC01904933EDA5B28D1701606368793E03E46E9AA2991A5FF05BE6C6CB763DCBBA08147BC39A6DD599855D33D7153B5C769E2C45E2376CB71BCB1F97C29B36C3AEE7EC22A21EDE73B17F42563B7708AB044999E7BB3; _iuqxldmzr_=32; WM_NI=Fr0ZUfmXCBb7mE7Ngt7SDhSzSrNm7uas%2FJENJBkQlWoI77XqfgvzOj1f2eaaEefkCZ8hGEnZ%2FUFG14VnyuchVOZoySLyp53RGw6MLxrgzIJtudPAUa%2FG2ZbP3PDeg6OkbVg%3D; WM_NIKE=9ca17ae2e6ffcda170e2e6eea4c85fb69bab9be14a93e78ab6c15a838e8b82c764acbf8787d8679586828ecc2af0fea7c3b92a86ae00bbd86eaf888da3e13daf9bf9afe680f58d8c89d27291ae828eb67fa3ade1abc8468a9ea5b2ef5dad97f9d8db7ba6b9ba9bce62f3bafe86e46b87bbaa8cc252fcb889a6ed52ed8b8aa8b44096b2b796e26496919690fc5990a7c0d6b25a85a9faaecf74b2b9b6aac980b7bca0a2d86bed99febbe15cf1908c86e63e8db5aeb7e637e2a3; JSESSIONID-WYYY=vpMCs2Q3goSX9n%2FODwqMiWTtRqk%2BaxTQFm%2F%5CUr%2FbZk6QF74SFRqH1OSy2gVnSCdMv6U6i3p3gKv%5CeUr%2BYrG8SMZCtr8yscpFw%2F1Aoa9Yi%2F6tiv%2F58zk%2BH9qJ119bE2WJgfv%2BCkAJxF%2F1EUZHbBTHO%2Fpiqiyj3AR6G%5Cs9g45CBpA7%2F3qn%3A1757095338950',
         'DNT': '1',  # Do Not Track
         'Referer': 'https://music.163.com/',  # 从哪个页面链接过来，有助于模仿真实访问
         'Sec-CH-UA': '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
@@ -44,6 +50,8 @@ def get_artist_data():
     }
 
     base_url = 'https://music.163.com/discover/artist/cat?'  # 网易云音乐歌手分类的基础URL
+    cookie_store.get_store().seed(NETEASE_HOME, NETEASE_SEED_COOKIE)
+    session = requests.Session()  # 复用连接；遍历几百个分类页时不必每次重新握手
 
     all_artists_data = []  # 用于存储所有爬取到的歌手信息
 
@@ -74,7 +82,14 @@ def get_artist_data():
 
             try:
                 # 发送GET请求，带上模拟的headers和超时设置
-                response = requests.get(full_url, headers=headers, timeout=15)
+                response, verdict = cookie_store.request_with_refresh(
+                    NETEASE_HOME, lambda jar: session.get(full_url, headers=headers, cookies=jar, timeout=15),
+                    warm_up=lambda: requests.get(NETEASE_HOME, headers={'User-Agent': headers['User-Agent']},
+                                                 timeout=15),
+                    expect=response_classifier.EXPECT_HTML)
+                if verdict.label != response_classifier.OK:
+                    print(f"  └ 跳过: 响应被判定为 {verdict.label} ({verdict.reason})")
+                    continue
                 # 检查HTTP状态码，如果不是200，则抛出异常
                 response.raise_for_status()
 
@@ -140,9 +155,9 @@ def get_artist_data():
             except Exception as e:
                 # 捕获其他未知异常
                 print(f"  ❌ 发生其他错误: {full_url} - {e}")
-
-            # 随机延迟，模拟人类行为，避免请求过于频繁被服务器识别为爬虫或封禁IP
-            time.sleep(random.uniform(0.5, 2.5))  # 每次请求之间暂停0.5到2.5秒
+            finally:
+                # 随机延迟，模拟人类行为，避免请求过于频繁被服务器识别为爬虫或封禁IP（跳过的请求同样要等待）
+                time.sleep(random.uniform(0.5, 2.5))  # 每次请求之间暂停0.5到2.5秒
 
     if all_artists_data:
         # 将爬取到的数据列表转换为pandas DataFrame
@@ -159,7 +174,8 @@ def get_artist_data():
     else:
         print("\n⚠️ 没有爬取到任何歌手信息。")
         print("   请检查以下可能的原因：")
-        print("   1. **`headers` 中的 `Cookie` 是否是最新且有效的**：`Cookie` 会过期，需要定期更新。")
+        print("   1. **Cookie 是否有效**：反爬时会自动刷新；仍失败时可用 `python cookie_store.py set music.163.com \"...\"` "
+              "粘贴浏览器中的最新 Cookie。")
         print(
             "   2. **网易云音乐页面HTML结构是否发生了变化**：用于定位歌手列表 (`ul.m-cvrlst.m-cvrlst-3.f-cb`) 或歌手链接 (`a.nm`) 的 CSS 选择器可能已失效。请打开浏览器开发者工具检查页面结构。")
         print(
@@ -4,7 +4,14 @@ import urllib.parse
 import os
 import time
 from datetime import datetime
-from tqdm import tqdm  # 用于显示下载进度条
+
+import content_store
+import download_scheduler
+import file_sink
+import integrity
+import metrics
+import progress
+import tagging
 
 
 class MyFreeMp3Scraper:
@@ -91,6 +98,7 @@ class MyFreeMp3Scraper:
             print(f"Response Body (first 200 chars): {response.text[:200]}...")
             return None
 
+    @metrics.timed("search", "myfreemp3")
     def search_music(self, keyword, page=1, music_type="netease"):
         """
         根据关键字搜索音乐。
@@ -169,6 +177,7 @@ class MyFreeMp3Scraper:
             print(f"Response Body (first 500 chars): {response.text[:500]}...")
             return []  # 返回空列表，表示当前页无结果
 
+    @metrics.timed("download", "netease")
     def download_music(self, music_info, quality='128', save_dir="downloads"):
         """
         下载音乐文件到本地。增强健壮性。
@@ -212,48 +221,71 @@ class MyFreeMp3Scraper:
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, filename)
 
+        # 先查询内容仓库，已下载过的同一首歌（同音质）直接硬链接，不再请求网络
+        cached_path = content_store.get_store().materialize("netease", songid, quality, save_dir,
+                                                            filename[:-len(".mp3")])
+        if cached_path:
+            print(f"内容仓库中已有 '{title}' ({quality}kbps)，已链接到: {cached_path}")
+            return str(cached_path)
+
         print(f"正在下载 '{filename}' (原链接: {music_url}) 到 '{file_path}'...")
         try:
             # 使用 stream=True 边下边存，防止大文件一次性加载到内存
-            response = self.session.get(music_url, stream=True, timeout=30)
-            response.raise_for_status()
-
-            # --- 健壮性检查 ---
-            content_type = response.headers.get('Content-Type', '').lower()
-            # 检查是否是音频类型，比如 audio/mpeg (MP3), audio/wav 等
-            # 或者文件下载类型 application/octet-stream
-            if not any(t in content_type for t in ['audio/', 'application/octet-stream', 'video/']):
-                print(
-                    f"警告: 下载 '{filename}' 时收到了非音频内容 (Content-Type: {content_type})，可能是错误页面。不保存文件。")
-                print(f"最终下载链接 (可能经过重定向): {response.url}")
-                return None
-
-            total_size_in_bytes = int(response.headers.get("content-length", 0))
-            if total_size_in_bytes < 500 * 1024 and total_size_in_bytes != 0:  # 500KB 以下且非0的，很可能是无效文件，具体数值可调整
-                print(
-                    f"警告: 下载 '{filename}' 文件大小异常小 ({total_size_in_bytes / 1024:.2f} KB)。可能不是完整的音乐文件。")
-                print(f"最终下载链接 (可能经过重定向): {response.url}")
-            elif total_size_in_bytes == 0:
-                print(f"警告: 下载 '{filename}' 文件大小为 0 KB。可能是下载失败。不保存文件。")
-                print(f"最终下载链接 (可能经过重定向): {response.url}")
-                return None
-
-            with open(file_path, 'wb') as f:
-                # 使用 tqdm 显示下载进度
-                # miniters=1 确保即使文件很小也能显示进度条
-                with tqdm(total=total_size_in_bytes, unit='B', unit_scale=True, desc=filename, ascii=True,
-                          miniters=1) as pbar:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            pbar.update(len(chunk))
+            # 传输槽由全局下载调度器分配（全局 / 每主机并发上限，交互式优先于批量）
+            with download_scheduler.get_scheduler().slot(music_url) as transfer:
+                response = self.session.get(music_url, stream=True, timeout=30)
+                response.raise_for_status()
+
+                # --- 健壮性检查 ---
+                content_type = response.headers.get('Content-Type', '').lower()
+                # 检查是否是音频类型，比如 audio/mpeg (MP3), audio/wav 等
+                # 或者文件下载类型 application/octet-stream
+                if not any(t in content_type for t in ['audio/', 'application/octet-stream', 'video/']):
+                    print(
+                        f"警告: 下载 '{filename}' 时收到了非音频内容 (Content-Type: {content_type})，可能是错误页面。不保存文件。")
+                    print(f"最终下载链接 (可能经过重定向): {response.url}")
+                    return None
+
+                total_size_in_bytes = int(response.headers.get("content-length", 0))
+                if total_size_in_bytes < 500 * 1024 and total_size_in_bytes != 0:  # 500KB 以下且非0的，很可能是无效文件，具体数值可调整
+                    print(
+                        f"警告: 下载 '{filename}' 文件大小异常小 ({total_size_in_bytes / 1024:.2f} KB)。可能不是完整的音乐文件。")
+                    print(f"最终下载链接 (可能经过重定向): {response.url}")
+                elif total_size_in_bytes == 0:
+                    print(f"警告: 下载 '{filename}' 文件大小为 0 KB。可能是下载失败。不保存文件。")
+                    print(f"最终下载链接 (可能经过重定向): {response.url}")
+                    return None
+
+                # 写入 .part 文件，写入循环中同时计算 SHA-256、核对 Content-Length 并检查开头 4KB 的音频魔数
+                part_path = file_path + ".part"
+                verifier = integrity.StreamVerifier(integrity.expected_length_from_headers(response.headers))
+                try:
+                    # 进度只更新计数器，由 progress 模块按固定节拍汇总显示，不再每个文件一个进度条
+                    with open(part_path, 'wb') as f, \
+                            progress.get_tracker().start_file(filename, total_size_in_bytes) as handle:
+                        file_sink.write_response(response, f, verifier=verifier, transfer=transfer,
+                                                 progress=handle.add)
+                        digest = verifier.finish()
+                    os.replace(part_path, file_path)
+                finally:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
 
             print(f"'{filename}' 下载完成！")
+            # 写入歌名、歌手、专辑、歌词和专辑封面后再收入内容仓库
+            if tagging.tag_track(file_path, title, author, music_info.get('al_name'),
+                                 music_info.get('lrc') or music_info.get('lyric'), music_info.get('pic')):
+                digest = None
+            content_store.get_store().ingest(file_path, "netease", songid, quality, digest=digest)
             return file_path
         except requests.exceptions.RequestException as e:
             print(f"下载 '{filename}' 失败 (网络或HTTP错误): {e}")
             print(f"尝试下载的原始链接: {music_url}")
             return None
+        except integrity.IntegrityError as e:
+            print(f"下载 '{filename}' 未通过校验，不保存文件: {e}")
+            print(f"最终下载链接 (可能经过重定向): {response.url}")
+            return None
 
 
 # --- 主程序逻辑 ---
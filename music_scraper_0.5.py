@@ -5,7 +5,17 @@ import os
 import time
 import re
 import math
-from tqdm import tqdm
+
+import content_store
+import download_scheduler
+import file_sink
+import integrity
+import metrics
+import progress
+import quality_ladder
+import response_classifier
+import search_cache
+import tagging
 
 
 class MyFreeMp3Scraper:
@@ -41,6 +51,7 @@ class MyFreeMp3Scraper:
             "X-Requested-With": "XMLHttpRequest",
         })
 
+    @metrics.timed("search", "myfreemp3")
     def search_music_raw(self, keyword, target_count=100, music_type="netease"):  # 默认 target_count 提高到 100
         """
         根据关键字向 myfreemp3.com.cn 网站搜索音乐，返回原始API结果列表 (多条)。
@@ -61,6 +72,13 @@ class MyFreeMp3Scraper:
         }
         self.session.headers.update(post_headers)
 
+        # 先查搜索缓存（cache_warmer.py 会按热门关键词提前填充），命中时不发网络请求
+        provider = f"myfreemp3:{music_type}"
+        cached = search_cache.get_cache().get_search(provider, keyword, target_count)
+        if cached is not None:
+            print(f"搜索缓存命中 '{keyword}'，共 {len(cached)} 条结果。")
+            return cached
+
         print(f"正在向 {self.base_url} 搜索 '{keyword}' 获取初步结果列表 (目标 {target_count} 条)...")
 
         for p in range(1, pages_to_fetch + 1):
@@ -99,16 +117,23 @@ class MyFreeMp3Scraper:
             except Exception:
                 break
 
+        # 专辑、封面和歌词也保留下来，下载后写入标签，媒体服务器无需再次刮削
         formatted_list = []
         for music in all_music_results[:target_count]:
             formatted_list.append({
                 "title": music.get("title", "未知歌曲"),
                 "author": music.get("author", "未知歌手"),
-                "songid": music.get("songid", "N/A")
+                "songid": music.get("songid", "N/A"),
+                "album": music.get("al_name"),
+                "pic": music.get("pic"),
+                "lyrics": music.get("lrc") or music.get("lyric")
             })
 
+        if formatted_list:
+            search_cache.get_cache().put_search(provider, keyword, formatted_list, target_count)
         return formatted_list
 
+    @metrics.timed("resolve", "bugpk")
     def get_download_link_from_byfuns(self, song_id, level="standard"):
         """
         通过新的第三方 API (bugpk.com) 获取音乐的直链。
@@ -130,6 +155,11 @@ class MyFreeMp3Scraper:
             print(f"警告: 无效的音质级别 '{level}'。将使用默认的 'standard'。")
             level = "standard"
 
+        cached_url = search_cache.get_cache().get_url("bugpk", song_id, level)
+        if cached_url:
+            print(f"直链缓存命中 (ID: {song_id}, 音质: {level})。")
+            return cached_url
+
         params = {
             "ids": song_id,
             "level": level,
@@ -147,6 +177,7 @@ class MyFreeMp3Scraper:
                 download_url = result_json.get("url")
                 if download_url and download_url.startswith("http"):
                     print("成功获取下载链接。")
+                    search_cache.get_cache().put_url("bugpk", song_id, level, download_url)
                     return download_url
                 else:
                     print(f"第三方API返回的JSON中 'url' 字段无效或缺失。完整响应: {result_json}")
@@ -166,9 +197,17 @@ class MyFreeMp3Scraper:
             print(f"获取第三方API链接时发生未知错误: {e}")
             return None
 
-    def download_music(self, music_url, filename, save_dir="downloads"):
+    @metrics.timed("download", "netease")
+    def download_music(self, music_url, filename, save_dir="downloads", songid=None, quality=None, tags=None):
         """
         下载音乐文件到本地。
+
+        边写边校验（SHA-256、Content-Length 精确比对、开头 4KB 音频魔数），先写入 .part 文件，
+        校验通过后才改名，按 tags（title / artist / album / lyrics / cover）写入标签，
+        再收入内容仓库（给出 songid 时同时登记清单）。
+
+        filename 的扩展名只是默认值：hires / lossless 等级返回的是 FLAC，保存时按嗅探出的实际格式
+        更换扩展名，返回的是实际保存的路径。
         """
         if not music_url:
             print("下载链接为空，无法下载。")
@@ -176,30 +215,82 @@ class MyFreeMp3Scraper:
 
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, filename)
+        part_path = file_path + ".part"
 
         print(f"正在下载 '{filename}' 到 '{file_path}'...")
         try:
-            response = self.session.get(music_url, stream=True, timeout=30)
-            response.raise_for_status()
-
-            total_size_in_bytes = int(response.headers.get("content-length", 0))
+            # 传输槽由全局下载调度器分配（全局 / 每主机并发上限，交互式优先于批量）。
+            # 限流等待放在申请传输槽之前，被限流后先归还槽位，等待结束再重新申请
+            breaker = response_classifier.get_breaker()
+            for attempt in range(2):
+                breaker.check(music_url)  # 主机被限流时先等待，熔断时抛出 CircuitOpenError
+                with download_scheduler.get_scheduler().slot(music_url) as transfer:
+                    # 只凭状态码和响应头判断链接是否可用，失效 / 被拦截时不读取正文
+                    response = self.session.get(music_url, stream=True, timeout=30)
+                    verdict = response_classifier.classify_response(response, response_classifier.EXPECT_AUDIO,
+                                                                    sniff=False)
+                    breaker.record(music_url, verdict)
+                    if verdict.label == response_classifier.THROTTLED and not attempt and \
+                            verdict.wait <= response_classifier.MAX_THROTTLE_WAIT:
+                        response.close()
+                        print(f"被限流 ({verdict.reason})，{verdict.wait:.0f} 秒后重试...")
+                        continue
+
+                    if verdict.label != response_classifier.OK:
+                        response.close()
+                        print(f"下载 '{filename}' 失败: 链接不可用 ({verdict.label}: {verdict.reason})")
+                        return None
+
+                    expected_size = integrity.expected_length_from_headers(response.headers)
+                    verifier = integrity.StreamVerifier(expected_size)
+
+                    # 进度只更新计数器，由 progress 模块统一汇总显示
+                    with open(part_path, 'wb') as f, \
+                            progress.get_tracker().start_file(filename, expected_size) as handle:
+                        file_sink.write_response(response, f, verifier=verifier, transfer=transfer,
+                                                 progress=handle.add)
+                        digest = verifier.finish()
+                break
 
-            with open(file_path, 'wb') as f:
-                with tqdm(total=total_size_in_bytes, unit='B', unit_scale=True, desc=filename, ascii=True,
-                          ncols=100) as pbar:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            pbar.update(len(chunk))
+            stem, ext = os.path.splitext(file_path)
+            if verifier.detected_format and ext.lower() != f".{verifier.detected_format}":
+                file_path = f"{stem}.{verifier.detected_format}"
+                filename = os.path.basename(file_path)
+            os.replace(part_path, file_path)
+            if tags and tagging.tag_track(file_path, tags.get("title"), tags.get("artist"), tags.get("album"),
+                                          tags.get("lyrics"), tags.get("cover"), verifier.detected_format):
+                digest = None
+            content_store.get_store().ingest(file_path, "netease" if songid else None, songid, quality, digest=digest)
 
             print(f"'{filename}' 下载完成！")
             return file_path
         except requests.exceptions.RequestException as e:
             print(f"下载 '{filename}' 失败: {e}")
             return None
+        except integrity.IntegrityError as e:
+            print(f"下载 '{filename}' 未通过校验: {e}")
+            return None
         except Exception as e:
             print(f"下载 '{filename}' 时发生未知错误: {e}")
             return None
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+
+def download_tags(music):
+    """
+    由 search_music_raw() 的一条结果生成 download_music() 的 tags。
+
+    较早缓存的搜索结果没有 album / pic / lyrics 字段，这些标签此时为 None，写入时跳过。
+    """
+    return {
+        "title": music.get("title"),
+        "artist": music.get("author"),
+        "album": music.get("album"),
+        "lyrics": music.get("lyrics"),
+        "cover": music.get("pic"),
+    }
 
 
 # --- 辅助函数：用于清洗和匹配 ---
@@ -424,17 +515,34 @@ if __name__ == "__main__":
 
         # --- 最终下载执行 ---
         if selected_for_download:
-            download_link = scraper.get_download_link_from_byfuns(selected_for_download['songid'], level="lossless")
-            if download_link:
-                safe_title = "".join(
-                    c for c in selected_for_download['title'] if c.isalnum() or c in (' ', '.', '_')).strip()
-                safe_author = "".join(
-                    c for c in selected_for_download['author'] if c.isalnum() or c in (' ', '.', '_')).strip()
-                filename = f"{safe_title} - {safe_author}_{selected_for_download['songid']}.mp3"
-                download_path = scraper.download_music(download_link, filename)
+            songid = selected_for_download['songid']
+            safe_title = "".join(
+                c for c in selected_for_download['title'] if c.isalnum() or c in (' ', '.', '_')).strip()
+            safe_author = "".join(
+                c for c in selected_for_download['author'] if c.isalnum() or c in (' ', '.', '_')).strip()
+            filename_stem = f"{safe_title} - {safe_author}_{songid}"
+
+            # 先查询内容仓库，其他工具已下载过的同一首歌（阶梯中任一音质）直接硬链接，不再获取链接和下载
+            store = content_store.get_store()
+            ladder = quality_ladder.QualityLadder(session=scraper.session, api_url=scraper.byfuns_api_url)
+            cached_path = next((path for path in (store.materialize("netease", songid, level, "downloads",
+                                                                    filename_stem) for level in ladder.ladder)
+                                if path), None)
+            # 并发请求阶梯中的各音质等级，选出最好的可用等级（已记录的可用性会让之后的请求直接命中）
+            resolved = None if cached_path else ladder.resolve(songid)
+            if cached_path:
+                print(f"内容仓库中已有该歌曲，已链接到: {cached_path}")
+            elif resolved:
+                level = resolved["level"]
+                print(f"选用音质: {level}")
+                download_path = scraper.download_music(resolved["url"], f"{filename_stem}.mp3",
+                                                       songid=songid, quality=level,
+                                                       tags=download_tags(selected_for_download))
                 if download_path:
                     print(f"音乐已保存到: {download_path}")
                 else:
+                    # 缓存的直链可能已失效，作废后下一次会重新解析
+                    search_cache.get_cache().invalidate_url("bugpk", songid, level)
                     print("下载音乐文件失败。")
             else:
                 print("未能获取到有效的音乐下载链接，无法下载。")
@@ -7,11 +7,13 @@ import sys
 import os
 import subprocess
 from pathlib import Path
-from bs4 import BeautifulSoup
+
+import cookie_store
+import response_classifier
 
 # --- 全局配置 ---
-# 注意：这些 Cookies 和 Headers 可能有有效期，如果代码运行失败，
-# 务必从浏览器中获取最新的 Cookies 和 Headers 并更新这里的字典。
+# 这些 Cookies 只是种子：首次运行时写入 Cookie 存储 (cookie_store.py)，之后使用存储中的值，
+# 响应被判定为反爬时自动访问首页刷新；Headers 仍可能需要随浏览器版本更新。
 cookies = {
     'Hm_tf_no8z3ihhnja': '1759891990',
     'Hm_lvt_no8z3ihhnja': '1759891990,1759914819,1759943487,1759975751',
@@ -71,6 +73,9 @@ FFMPEG_AVAILABLE = False  # 全局标志，用于存储 FFmpeg 的可用性
 # 正则表达式用于从错误信息中提取等待时间
 RETRY_TIME_PATTERN = re.compile(r'请 (\d+) 秒后再试。')
 
+BASE_URL = "https://www.gequhai.com"
+session = requests.Session()
+
 
 def print_status(message, end='\n'):
     """统一的打印函数，方便管理输出"""
@@ -238,14 +243,19 @@ def search_songs(keyword):
     根据关键词搜索歌曲，并提取歌曲ID、标题和艺术家。
     """
     encoded_keyword = urllib.parse.quote(keyword)
-    search_url = f'https://www.gequhai.com/s/{encoded_keyword}'
+    search_url = f'{BASE_URL}/s/{encoded_keyword}'
 
     song_list = []
     print_status(f"--- 步骤 1: 搜索关键词 '{keyword}' (URL: {search_url}) ---")
 
     try:
-        response = requests.get(search_url, cookies=cookies, headers=get_html_headers, timeout=10)
-        response.raise_for_status()
+        response, verdict = cookie_store.gequhai_request(session, 'GET', search_url, cookies, get_html_headers,
+                                                         headers=get_html_headers, timeout=10)
+        if verdict.label != response_classifier.OK:
+            print_status(f"  错误: 搜索页响应异常 ({verdict.label}: {verdict.reason})。")
+            return []
+
+        from bs4 import BeautifulSoup  # 只有解析搜索结果页时才需要，避免拖慢启动
 
         soup = BeautifulSoup(response.text, 'html.parser')
 
@@ -290,11 +300,13 @@ def _get_play_id_from_html(track_id):
     """
     一个内部辅助函数，从歌曲详情页的 HTML 中提取 play_id。
     """
-    play_page_url = f'https://www.gequhai.com/play/{track_id}'
+    play_page_url = f'{BASE_URL}/play/{track_id}'
 
     try:
-        response_get = requests.get(play_page_url, cookies=cookies, headers=get_html_headers, timeout=10)
-        response_get.raise_for_status()
+        response_get, verdict = cookie_store.gequhai_request(session, 'GET', play_page_url, cookies, get_html_headers,
+                                                             headers=get_html_headers, timeout=10)
+        if verdict.label != response_classifier.OK:
+            return None
 
         html_content = response_get.text
         match = re.search(r"window\.play_id\s*=\s*'([^']*)';", html_content)
@@ -326,16 +338,26 @@ def get_music_url(track_id):
             continue
 
         # 步骤 2.2: 使用提取到的 play_id 调用 API
-        api_url = 'https://www.gequhai.com/api/music'
+        api_url = f'{BASE_URL}/api/music'
         api_data = {
             'id': extracted_play_id,
             'type': '0',
         }
 
         try:
-            response_post = requests.post(api_url, cookies=cookies, headers=post_api_headers, data=api_data,
-                                          timeout=15)
-            response_post.raise_for_status()
+            response_post, verdict = cookie_store.gequhai_request(session, 'POST', api_url, cookies, get_html_headers,
+                                                                  expect=response_classifier.EXPECT_JSON,
+                                                                  headers=post_api_headers, data=api_data, timeout=15)
+            # 限流时重试（等待由熔断器在下一次请求前完成）；反爬在 gequhai_request 中已刷新过 Cookie
+            if verdict.label == response_classifier.THROTTLED:
+                if verdict.wait > response_classifier.MAX_THROTTLE_WAIT:
+                    print_status(f"\n  错误: 请求过于频繁，服务器要求等待 {verdict.wait:.0f} 秒 (ID: {track_id})。")
+                    return None
+                print_status(f"\n  请求过于频繁 ({verdict.reason})，等待 {verdict.wait:.0f} 秒后重试...", end='')
+                continue
+            if verdict.label != response_classifier.OK:
+                print_status(f"\n  错误: API 响应异常 (ID: {track_id}): {verdict.label} ({verdict.reason})。")
+                return None
 
             if response_post.headers.get('content-type', '').startswith('application/json'):
                 json_data = response_post.json()
@@ -362,13 +384,6 @@ def get_music_url(track_id):
         except requests.exceptions.JSONDecodeError:
             print_status(f"\n  错误: API 响应无法解析为 JSON (ID: {track_id})。")
             return None
-        except requests.exceptions.HTTPError as he:
-            if he.response.status_code == 429:
-                print_status(f"\n  错误: 请求过于频繁，服务器响应 429 (ID: {track_id})。")
-                time.sleep(5)  # 简单延时后重试
-            else:
-                print_status(f"\n  错误: 调用 API 时发生HTTP错误 (ID: {track_id}): {he}")
-                return None
         except requests.exceptions.RequestException as err:
             print_status(f"\n  错误: 调用 API 时发生网络错误 (ID: {track_id}): {err}")
             if "Connection reset by peer" in str(err) or "Max retries exceeded" in str(err) or "Read timed out" in str(
@@ -391,7 +406,8 @@ if __name__ == "__main__":
     print_status("--- 欢迎使用歌曲查询与播放链接获取工具 ---")
 
     print_status("\n==== 重要提示 ====")
-    print_status("如果程序运行失败或出现频繁请求错误，请检查 `cookies` 和 `headers` 是否已更新。")
+    print_status("如果程序运行失败或出现频繁请求错误，请检查 `headers` 是否已更新；"
+                 "Cookie 会自动刷新，也可以用 `python cookie_store.py set` 手动更新。")
     print_status("===================\n")
 
     # 预先检查 FFmpeg 可用性
@@ -0,0 +1,202 @@
+"""
+进程内统一的下载进度汇总。
+
+原先每个文件各建一个 tqdm 进度条（music_scraper_0.2 用 miniters=1，其余 ncols=100），并发下载时进度条互相穿插，
+每块数据都要刷新一次终端。现在所有下载器只更新计数器，由一个后台线程按固定节拍 (TICK_INTERVAL) 汇总输出：
+    总字节数 / 预期字节数、进行中 / 完成 / 失败的文件数、最近 RATE_WINDOW 秒的滚动速率 (MB/s)。
+
+两种输出模式（另有 off 完全静默）:
+    bar   单行刷新的汇总状态（写到 stderr），交互式使用的默认值；
+    json  每 JSON_INTERVAL 秒输出一行 JSON，适合批量任务的日志收集。
+模式可以用环境变量 MUSIC_PROGRESS=bar|json|off 或 set_mode() 指定。
+
+用法:
+    with progress.get_tracker().start_file(filename, expected_size) as handle:
+        file_sink.write_response(response, f, verifier=verifier, progress=handle.add)
+"""
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+# --- 配置 ---
+MODE_BAR = "bar"
+MODE_JSON = "json"
+MODE_OFF = "off"
+MODES = (MODE_BAR, MODE_JSON, MODE_OFF)
+MODE_ENV = "MUSIC_PROGRESS"
+TICK_INTERVAL = 0.5
+JSON_INTERVAL = 5.0
+RATE_WINDOW = 5.0
+
+
+class FileProgress:
+    """单个文件的进度句柄。add() 可以直接作为 file_sink.write_response 的 progress 回调。"""
+
+    __slots__ = ("tracker", "name", "total", "bytes", "finished")
+
+    def __init__(self, tracker, name, total):
+        self.tracker = tracker
+        self.name = name
+        self.total = total
+        self.bytes = 0
+        self.finished = False
+
+    def add(self, n):
+        self.bytes += n
+        self.tracker._add_bytes(n)
+
+    def finish(self, ok=True):
+        if not self.finished:
+            self.finished = True
+            self.tracker._finish_file(self, ok)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(ok=exc_type is None)
+        return False
+
+
+class ProgressTracker:
+    """线程安全的进度计数器，附带一个按节拍输出的后台线程（第一个文件开始时启动）。"""
+
+    def __init__(self, mode=None, stream=None, tick=TICK_INTERVAL, json_interval=JSON_INTERVAL):
+        mode = mode or os.environ.get(MODE_ENV, MODE_BAR)
+        self.mode = mode if mode in MODES else MODE_BAR
+        self.stream = stream
+        self.tick = tick
+        self.json_interval = json_interval
+        self._lock = threading.Lock()
+        self._active = set()
+        self._bytes = 0
+        self._done = 0
+        self._failed = 0
+        self._samples = collections.deque()
+        self._started = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._dirty = False
+
+    # --- 计数 ---
+
+    def start_file(self, name, total=None) -> FileProgress:
+        handle = FileProgress(self, name, total)
+        with self._lock:
+            self._active.add(handle)
+            self._dirty = True
+            if self._started is None:
+                self._started = time.monotonic()
+            if self._thread is None and self.mode != MODE_OFF:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+                self._thread.start()
+        return handle
+
+    def _add_bytes(self, n):
+        with self._lock:
+            self._bytes += n
+
+    def _finish_file(self, handle, ok):
+        with self._lock:
+            self._active.discard(handle)
+            if ok:
+                self._done += 1
+            else:
+                self._failed += 1
+            self._dirty = True
+
+    def snapshot(self) -> dict:
+        """当前汇总：字节数、预期字节数（只统计已知大小的进行中文件）、文件计数与滚动速率。"""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, self._bytes))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+            (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+            return {
+                "bytes": self._bytes,
+                "active_bytes": sum(h.bytes for h in self._active),
+                "active_expected": sum(h.total for h in self._active if h.total),
+                "active": len(self._active),
+                "done": self._done,
+                "failed": self._failed,
+                "mb_per_s": round((b1 - b0) / (t1 - t0) / 1024 / 1024, 2) if t1 > t0 else 0.0,
+                "elapsed": round(now - self._started, 1) if self._started else 0.0,
+            }
+
+    # --- 输出 ---
+
+    def _render_bar(self, snap, final=False):
+        stream = self.stream or sys.stderr
+        total = f"/{snap['active_expected'] / 1024 / 1024:.1f}" if snap["active"] and snap["active_expected"] else ""
+        line = (f"[下载] 进行中 {snap['active']} · 完成 {snap['done']} · 失败 {snap['failed']} · "
+                f"{snap['active_bytes'] / 1024 / 1024:.1f}{total} MB（累计 {snap['bytes'] / 1024 / 1024:.1f} MB）"
+                f" · {snap['mb_per_s']:.2f} MB/s")
+        stream.write(f"\r{line}\x1b[K" + ("\n" if final else ""))
+        stream.flush()
+
+    def _render_json(self, snap, final=False):
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(dict(snap, ts=round(time.time(), 3), final=final), ensure_ascii=False) + "\n")
+        stream.flush()
+
+    def _run(self):
+        last_json = time.monotonic()
+        shown_active = False
+        while not self._stop.wait(self.tick):
+            snap = self.snapshot()
+            with self._lock:
+                dirty, self._dirty = self._dirty, False
+            if self.mode == MODE_BAR:
+                if snap["active"]:
+                    self._render_bar(snap)
+                    shown_active = True
+                elif shown_active:
+                    # 全部文件结束：输出最后一次汇总并换行，不再占用终端当前行
+                    self._render_bar(snap, final=True)
+                    shown_active = False
+            elif self.mode == MODE_JSON:
+                now = time.monotonic()
+                if (snap["active"] or dirty) and now - last_json >= self.json_interval:
+                    self._render_json(snap)
+                    last_json = now
+
+    def close(self):
+        """停止后台线程并输出最终汇总（json 模式下带 "final": true）；之后再有文件开始时会重新启动。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._started is None:
+            return
+        if self.mode == MODE_JSON:
+            self._render_json(self.snapshot(), final=True)
+        elif self.mode == MODE_BAR and self.snapshot()["active"]:
+            self._render_bar(self.snapshot(), final=True)
+
+
+_default_tracker = None
+_default_tracker_lock = threading.Lock()
+
+
+def get_tracker() -> ProgressTracker:
+    """返回进程内共享的默认进度汇总。"""
+    global _default_tracker
+    with _default_tracker_lock:
+        if _default_tracker is None:
+            _default_tracker = ProgressTracker()
+        return _default_tracker
+
+
+def set_mode(mode, stream=None) -> ProgressTracker:
+    """切换默认进度汇总的输出模式（会结束旧的汇总并新建一个），应在开始下载前调用。"""
+    global _default_tracker
+    with _default_tracker_lock:
+        if _default_tracker is not None:
+            _default_tracker.close()
+        _default_tracker = ProgressTracker(mode, stream)
+        return _default_tracker
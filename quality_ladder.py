@@ -0,0 +1,212 @@
+"""
+bugpk (byfuns) 接口的音质阶梯解析。
+
+get_download_link_from_byfuns 一次只请求一个音质等级，CLI 固定使用 "lossless"，该等级不可用时直接失败。
+QualityLadder 按阶梯（默认 hires → lossless → exhigh → standard）并发请求多个等级，可选地用 HEAD
+请求探测文件大小，然后在大小 / 码率预算内选出最好的一个。
+
+每首歌各等级的可用性（以及接口实际返回的等级、文件大小）记录在搜索缓存 (search_cache) 的 levels 表中：
+之后再请求同一首歌时，已知不可用的等级直接跳过，直链仍在缓存中的等级不发任何请求。
+cache_warmer.py 也通过 QualityLadder 预解析，等级与直链一起记录，交互式下载可以直接命中。
+
+命令行:
+    python quality_ladder.py <songid> [--max-mb 60] [--max-kbps 1000] [--duration 秒] [--probe]
+"""
+import argparse
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+import search_cache
+
+# --- 配置 ---
+BYFUNS_API_URL = "https://api.bugpk.com/api/163_music"
+# 由高到低的全部等级（jyeffect / sky 为音效版本，默认不参与阶梯）
+LEVELS = ("jymaster", "sky", "jyeffect", "hires", "lossless", "exhigh", "standard")
+DEFAULT_LADDER = ("hires", "lossless", "exhigh", "standard")
+PROVIDER = "bugpk"
+REQUEST_TIMEOUT = 10
+PROBE_TIMEOUT = 10
+MAX_WORKERS = 4
+
+
+class LevelQueryError(Exception):
+    """请求某个等级时发生网络 / HTTP / JSON 错误，接口没有给出明确答复（不应记为不可用）。"""
+
+
+def parse_size(value):
+    """把接口返回的大小（字节数或 "10.5MB" / "900KB" 形式的字符串）转换为字节数，无法解析时返回 None。"""
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else None
+    match = re.match(r'\s*([\d.]+)\s*([KMG]?)B?\s*$', str(value or ''), re.IGNORECASE)
+    if not match:
+        return None
+    factor = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[match.group(2).upper()]
+    return int(float(match.group(1)) * factor)
+
+
+@metrics.timed("resolve_level", "bugpk")
+def query_level(session, songid, level, api_url=BYFUNS_API_URL):
+    """
+    请求单个音质等级。
+
+    Returns:
+        dict or None: {"level", "actual_level", "url", "size"}；接口明确答复该等级没有可用链接时返回 None。
+
+    Raises:
+        LevelQueryError: 超时、连接失败、HTTP 错误或响应不是 JSON 对象，无法判断该等级是否可用。
+    """
+    try:
+        response = session.get(api_url, params={"ids": songid, "level": level, "type": "json"},
+                               timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise LevelQueryError(f"{level}: {e}") from e
+    if not isinstance(result, dict):
+        raise LevelQueryError(f"{level}: 响应不是 JSON 对象")
+    url = result.get("url")
+    if result.get("status") != 200 or not (url and url.startswith("http")):
+        return None
+    return {"level": level, "actual_level": result.get("level") or level, "url": url,
+            "size": parse_size(result.get("size"))}
+
+
+def probe_size(session, url):
+    """用 HEAD 请求探测文件大小，失败时返回 None。"""
+    try:
+        response = session.head(url, allow_redirects=True, timeout=PROBE_TIMEOUT)
+        response.raise_for_status()
+        return int(response.headers.get("Content-Length") or 0) or None
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+class QualityLadder:
+    """
+    音质阶梯解析器。
+
+    Args:
+        ladder (tuple): 按优先顺序排列的等级。
+        max_bytes (int): 文件大小上限，超过的等级不选；大小未知的等级视为满足。
+        max_kbps (int): 平均码率上限，需要在 resolve() 时给出时长才生效。
+        probe (bool): 接口没有返回大小时，用 HEAD 请求探测。
+    """
+
+    def __init__(self, session=None, api_url=BYFUNS_API_URL, ladder=DEFAULT_LADDER, max_bytes=None,
+                 max_kbps=None, probe=False, workers=MAX_WORKERS):
+        self.session = session or requests.Session()
+        self.api_url = api_url
+        self.ladder = tuple(ladder)
+        self.max_bytes = max_bytes
+        self.max_kbps = max_kbps
+        self.probe = probe
+        self.workers = workers
+
+    def _fits(self, size, duration):
+        if size is None:
+            return True
+        if self.max_bytes and size > self.max_bytes:
+            return False
+        if self.max_kbps and duration and size * 8 / 1000 / duration > self.max_kbps:
+            return False
+        return True
+
+    def _query(self, songid, level):
+        """查询一个等级，返回 (结果, 是否得到明确答复)。"""
+        try:
+            return query_level(self.session, songid, level, self.api_url), True
+        except LevelQueryError:
+            return None, False
+
+    def resolve(self, songid, duration=None):
+        """
+        选出预算内最好的等级。
+
+        Returns:
+            dict or None: {"level", "url", "size", "from_cache"}，没有任何可用等级时返回 None。
+        """
+        cache = search_cache.get_cache()
+        known = cache.get_levels(PROVIDER, songid)
+
+        # 从高到低找到第一个有缓存直链的等级（已知可用，或 levels 表中还没有记录但直链已被
+        # cache_warmer / get_download_link_from_byfuns 缓存过），只查询比它更好的未知等级；
+        # 已知可用但直链过期的等级也在这里停下，连同更好的未知等级一起重新查询
+        to_query = []
+        cached = None
+        for level in self.ladder:
+            info = known.get(level)
+            if info is not None and (not info["available"] or not self._fits(info["size"], duration)):
+                continue
+            url = cache.get_url(PROVIDER, songid, level)
+            if url:
+                cached = {"level": level, "url": url, "size": info["size"] if info else None, "from_cache": True}
+                break
+            to_query.append(level)
+            if info is not None:
+                break
+
+        if not to_query:
+            return cached
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(to_query))) as pool:
+            answers = dict(zip(to_query, pool.map(lambda lvl: self._query(songid, lvl), to_query)))
+            # 网络 / HTTP / JSON 错误不是"该等级不可用"，不写入 levels 表，下次照常查询
+            results = {level: result for level, (result, definitive) in answers.items() if definitive}
+            if self.probe:
+                missing = [r for r in results.values() if r and r["size"] is None]
+                for result, size in zip(missing, pool.map(lambda r: probe_size(self.session, r["url"]), missing)):
+                    result["size"] = size
+
+        for level, result in results.items():
+            # 接口明确答复没有链接，或悄悄降级返回较低的音质，这两种情况按不可用记录
+            available = bool(result) and result["actual_level"] == level
+            cache.put_level(PROVIDER, songid, level, available,
+                            result["actual_level"] if result else None, result["size"] if result else None)
+            if available:
+                cache.put_url(PROVIDER, songid, level, result["url"])
+
+        for level in self.ladder:
+            result = results.get(level)
+            if result and result["actual_level"] == level and self._fits(result["size"], duration):
+                return {"level": level, "url": result["url"], "size": result["size"], "from_cache": False}
+        if cached:
+            return cached
+        # 所有等级都被降级时，退而接受接口给出的最好结果
+        fallback = next((results[level] for level in self.ladder if results.get(level)), None)
+        if fallback and self._fits(fallback["size"], duration):
+            return {"level": fallback["actual_level"], "url": fallback["url"], "size": fallback["size"],
+                    "from_cache": False}
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并发探测 bugpk 各音质等级并在预算内选出最好的一个。")
+    parser.add_argument("songid")
+    parser.add_argument("--ladder", default=",".join(DEFAULT_LADDER), help=f"等级顺序，可选: {','.join(LEVELS)}")
+    parser.add_argument("--max-mb", type=float, help="文件大小上限 (MB)")
+    parser.add_argument("--max-kbps", type=int, help="平均码率上限 (kbps)，需配合 --duration")
+    parser.add_argument("--duration", type=float, help="歌曲时长（秒）")
+    parser.add_argument("--probe", action="store_true", help="接口未返回大小时用 HEAD 探测")
+    args = parser.parse_args(argv)
+
+    ladder = QualityLadder(ladder=[lvl.strip() for lvl in args.ladder.split(",") if lvl.strip() in LEVELS],
+                           max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb else None,
+                           max_kbps=args.max_kbps, probe=args.probe)
+    result = ladder.resolve(args.songid, args.duration)
+    if not result:
+        print("没有满足条件的可用音质。")
+        return 1
+    size = f"{result['size'] / 1024 / 1024:.2f} MB" if result["size"] else "大小未知"
+    print(f"选中音质: {result['level']} ({size}{'，来自缓存' if result['from_cache'] else ''})")
+    print(result["url"])
+    for level, info in search_cache.get_cache().get_levels(PROVIDER, args.songid).items():
+        print(f"  {level:<10} {'可用' if info['available'] else '不可用'} (实际: {info['actual_level']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
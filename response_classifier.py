@@ -0,0 +1,217 @@
+"""
+只看状态码、响应头和正文开头几百字节的响应分类器，以及按主机的熔断器。
+
+原先各处各自判断失败：db_0.4 检查 Content-Type 后打印 500 个字符的正文，歌曲海接口调用 .json() 再捕获
+JSONDecodeError，download_music_file 在开始下载之后才发现内容不是音频。这里统一给出一个标签:
+    ok              正常
+    throttled       被限流（429 / 503 + Retry-After，或正文开头带“请 N 秒后再试”），附带建议等待秒数
+    anti_bot        反爬拦截（重定向到验证码页、期望 JSON / 音频却拿到 HTML 验证页）→ 刷新 Cookie
+    expired_link    直链失效（CDN 返回 403 / 404 / 410，或音频链接返回了 HTML / JSON 错误页）→ 重新解析链接
+    dead_endpoint   接口不可用（其余 4xx / 5xx）→ 计入熔断器
+
+分类不会读取完整正文：流式响应 (stream=True) 只看状态码和响应头；普通响应的正文已经在内存中，
+也只取开头 SNIFF_BYTES 字节做判断。
+
+熔断器 (get_breaker()) 按主机记录分类结果：同一主机连续 BREAKER_THRESHOLD 次 dead_endpoint 后，
+BREAKER_COOLDOWN 秒内的请求直接抛出 CircuitOpenError（属于 requests.RequestException，
+现有的 except 分支无需修改）；throttled 会让该主机暂停到建议的等待时间结束，期间的请求先等待再发出。
+"""
+import email.utils
+import re
+import threading
+import time
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+# --- 配置 ---
+SNIFF_BYTES = 512
+DEFAULT_THROTTLE_WAIT = 5.0
+MAX_THROTTLE_WAIT = 60.0     # 超过这个等待时间不再原地等待，直接按失败处理
+BREAKER_THRESHOLD = 5        # 连续多少次 dead_endpoint 后熔断，0 为关闭熔断
+BREAKER_COOLDOWN = 60.0
+
+OK = "ok"
+THROTTLED = "throttled"
+ANTI_BOT = "anti_bot"
+EXPIRED_LINK = "expired_link"
+DEAD_ENDPOINT = "dead_endpoint"
+
+EXPECT_JSON = "json"
+EXPECT_HTML = "html"
+EXPECT_AUDIO = "audio"
+
+ANTI_BOT_MARKERS = re.compile(r'captcha|verify|challenge|验证码|人机验证|安全验证', re.IGNORECASE)
+WAIT_HINT_PATTERN = re.compile(r'请\s*(\d+)\s*秒后再试')
+AUDIO_TYPES = ("audio/", "octet-stream", "mpeg", "flac", "video/mp4")
+
+
+class Verdict(NamedTuple):
+    label: str
+    wait: float | None = None  # throttled 时的建议等待秒数
+    reason: str = ""
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """目标主机处于熔断状态，请求没有发出。"""
+
+
+def retry_after(value) -> float | None:
+    """解析 Retry-After（秒数或 HTTP 日期），无法解析时返回 None。"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(status, headers, head=b"", expect=EXPECT_JSON, redirects=()) -> Verdict:
+    """
+    给一个响应分类。
+
+    Args:
+        status (int): 状态码。
+        headers: 响应头（大小写不敏感的映射）。
+        head (bytes): 正文开头的若干字节，流式响应传 b""。
+        expect (str): 正常时的内容：EXPECT_JSON / EXPECT_HTML / EXPECT_AUDIO。
+        redirects: 重定向的目标 URL（没有重定向时为空），用于识别验证码重定向。
+    """
+    content_type = (headers.get("Content-Type") or "").lower()
+    text = head[:SNIFF_BYTES].decode("utf-8", "replace")
+    is_html = "html" in content_type or text.lstrip()[:1] == "<"
+
+    for url in redirects:
+        parts = urlsplit(url or "")
+        if ANTI_BOT_MARKERS.search(f"{parts.path}?{parts.query}"):
+            return Verdict(ANTI_BOT, reason=f"重定向到验证页 {url}")
+
+    if status == 429 or (status == 503 and headers.get("Retry-After")):
+        wait = retry_after(headers.get("Retry-After"))
+        return Verdict(THROTTLED, DEFAULT_THROTTLE_WAIT if wait is None else wait, f"HTTP {status}")
+    hint = WAIT_HINT_PATTERN.search(text)
+    if hint:
+        return Verdict(THROTTLED, float(hint.group(1)), hint.group(0))
+
+    if status in (401, 403) and (expect != EXPECT_AUDIO or ANTI_BOT_MARKERS.search(text)):
+        return Verdict(ANTI_BOT, reason=f"HTTP {status}")
+    if status >= 500 and is_html and ANTI_BOT_MARKERS.search(text):
+        return Verdict(ANTI_BOT, reason=f"HTTP {status} 验证页")
+    if expect == EXPECT_AUDIO:
+        if status in (403, 404, 410):
+            return Verdict(EXPIRED_LINK, reason=f"HTTP {status}")
+        if status >= 500:
+            return Verdict(DEAD_ENDPOINT, reason=f"HTTP {status}")
+        if is_html and ANTI_BOT_MARKERS.search(text):
+            return Verdict(ANTI_BOT, reason="音频链接返回了验证页")
+        if content_type and not any(kind in content_type for kind in AUDIO_TYPES):
+            return Verdict(EXPIRED_LINK, reason=f"内容类型不是音频 ({content_type})")
+        return Verdict(OK)
+
+    if status >= 400:
+        return Verdict(DEAD_ENDPOINT, reason=f"HTTP {status}")
+    if expect == EXPECT_JSON and is_html:
+        return Verdict(ANTI_BOT, reason=f"期望 JSON，返回了 HTML ({content_type or '无 Content-Type'})")
+    if expect == EXPECT_HTML and is_html and ANTI_BOT_MARKERS.search(text):
+        return Verdict(ANTI_BOT, reason="页面是验证页")
+    return Verdict(OK)
+
+
+def classify_response(response, expect=EXPECT_JSON, sniff=True) -> Verdict:
+    """
+    给 requests 的响应分类并计数。
+
+    Args:
+        sniff (bool): 是否查看正文开头。流式响应 (stream=True) 必须传 False，否则会把正文读进内存。
+    """
+    head = response.content[:SNIFF_BYTES] if sniff else b""
+    # 只看重定向目标；请求本身的 URL 里可能就带着搜索关键词，不能拿来匹配
+    redirects = [hop.headers.get("Location", "") for hop in response.history]
+    verdict = classify(response.status_code, response.headers, head, expect, redirects)
+    metrics.inc("music_response_total", host=urlsplit(response.url or "").hostname or "", label=verdict.label)
+    return verdict
+
+
+class CircuitBreaker:
+    """按主机的熔断器，可在多线程间共享。"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._paused_until = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url):
+        return urlsplit(url).hostname or url
+
+    def check(self, url):
+        """
+        发请求前调用：主机被限流暂停时先等待，熔断时抛出 CircuitOpenError。
+
+        Raises:
+            CircuitOpenError: 主机处于熔断状态。
+        """
+        host = self._host(url)
+        with self._lock:
+            now = time.monotonic()
+            open_until = self._open_until.get(host, 0)
+            pause = self._paused_until.get(host, 0) - now
+        if open_until > now:
+            raise CircuitOpenError(f"{host} 连续不可用，熔断中（还剩 {open_until - now:.0f} 秒）")
+        if pause > 0:
+            time.sleep(min(pause, MAX_THROTTLE_WAIT))
+
+    def record(self, url, verdict: Verdict):
+        """记录一次分类结果。ok 清零失败计数；dead_endpoint 累计到阈值后熔断；throttled 暂停主机。"""
+        host = self._host(url)
+        with self._lock:
+            now = time.monotonic()
+            if verdict.label == OK:
+                self._failures.pop(host, None)
+            elif verdict.label == DEAD_ENDPOINT:
+                failures = self._failures.get(host, 0) + 1
+                self._failures[host] = failures
+                if self.threshold and failures >= self.threshold:
+                    self._open_until[host] = now + self.cooldown
+                    self._failures[host] = 0
+                    print(f"[熔断] {host} 连续 {failures} 次不可用，{self.cooldown:.0f} 秒内不再请求。")
+            elif verdict.label == THROTTLED and verdict.wait:
+                wait = min(verdict.wait, MAX_THROTTLE_WAIT)
+                self._paused_until[host] = max(self._paused_until.get(host, 0), now + wait)
+
+    def is_open(self, url) -> bool:
+        with self._lock:
+            return self._open_until.get(self._host(url), 0) > time.monotonic()
+
+    def reset(self, url=None):
+        with self._lock:
+            if url is None:
+                self._failures.clear()
+                self._open_until.clear()
+                self._paused_until.clear()
+            else:
+                host = self._host(url)
+                for table in (self._failures, self._open_until, self._paused_until):
+                    table.pop(host, None)
+
+
+_default_breaker = None
+_default_breaker_lock = threading.Lock()
+
+
+def get_breaker() -> CircuitBreaker:
+    """进程内共享的默认熔断器。"""
+    global _default_breaker
+    with _default_breaker_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
@@ -0,0 +1,163 @@
+"""
+搜索结果与下载链接缓存（SQLite）。
+
+    searches: (provider, 规范化关键词) → 搜索结果列表（JSON），附带抓取深度 depth（请求的结果条数）
+    urls:     (provider, songid, level) → 直链
+    levels:   (provider, songid, level) → 该音质是否可用、接口实际给出的音质与文件大小（quality_ladder 使用）
+
+直链通常带签名、会过期，因此两类缓存各有独立的有效期（SEARCH_TTL / URL_TTL）。
+cache_warmer.py 按热门关键词提前填充这两张表，交互式搜索与下载时先查缓存，命中则不发网络请求。
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+# --- 配置 ---
+CACHE_PATH = Path("downloads") / ".meta" / "search_cache.sqlite3"
+SEARCH_TTL = 6 * 3600
+URL_TTL = 20 * 60
+LEVEL_TTL = 30 * 86400  # 某首歌有哪些音质基本不会变化
+
+
+def normalize_keyword(keyword: str) -> str:
+    """关键词规范化：去掉首尾空白、合并连续空白、转小写。"""
+    return re.sub(r'\s+', ' ', (keyword or '').strip()).lower()
+
+
+class SearchCache:
+    """搜索 / 直链缓存，可在多线程间共享。"""
+
+    def __init__(self, db_path=CACHE_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS searches (
+                provider TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                results TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (provider, keyword)
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                provider TEXT NOT NULL,
+                songid TEXT NOT NULL,
+                level TEXT NOT NULL,
+                url TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (provider, songid, level)
+            );
+            CREATE TABLE IF NOT EXISTS levels (
+                provider TEXT NOT NULL,
+                songid TEXT NOT NULL,
+                level TEXT NOT NULL,
+                available INTEGER NOT NULL,
+                actual_level TEXT,
+                size INTEGER,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (provider, songid, level)
+            );
+        """)
+        self._conn.commit()
+
+    def get_search(self, provider, keyword, depth=0, max_age=SEARCH_TTL):
+        """
+        查询缓存的搜索结果。缓存的抓取深度不小于 depth 且未过期时才算命中。
+
+        Returns:
+            list or None: 搜索结果（最多 depth 条，depth 为 0 时返回全部），未命中返回 None。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT depth, results, fetched_at FROM searches WHERE provider = ? AND keyword = ?",
+                (provider, normalize_keyword(keyword))).fetchone()
+        if not row or row[0] < depth or time.time() - row[2] > max_age:
+            metrics.cache_lookup("search", False)
+            return None
+        metrics.cache_lookup("search", True)
+        results = json.loads(row[1])
+        return results[:depth] if depth else results
+
+    def put_search(self, provider, keyword, results, depth):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (provider, keyword, depth, results, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (provider, normalize_keyword(keyword), depth, json.dumps(results, ensure_ascii=False), time.time()))
+            self._conn.commit()
+
+    def get_url(self, provider, songid, level, max_age=URL_TTL):
+        """查询缓存的直链，过期或未缓存时返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, fetched_at FROM urls WHERE provider = ? AND songid = ? AND level = ?",
+                (provider, str(songid), level)).fetchone()
+        if not row or time.time() - row[1] > max_age:
+            metrics.cache_lookup("url", False)
+            return None
+        metrics.cache_lookup("url", True)
+        return row[0]
+
+    def put_url(self, provider, songid, level, url):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (provider, songid, level, url, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (provider, str(songid), level, url, time.time()))
+            self._conn.commit()
+
+    def invalidate_url(self, provider, songid, level):
+        """直链失效（下载失败）时调用，下一次会重新解析。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM urls WHERE provider = ? AND songid = ? AND level = ?",
+                               (provider, str(songid), level))
+            self._conn.commit()
+
+    def get_levels(self, provider, songid, max_age=LEVEL_TTL) -> dict:
+        """
+        查询已记录的音质可用性。
+
+        Returns:
+            dict: {level: {"available": bool, "actual_level": str, "size": int or None}}，只含未过期的记录。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT level, available, actual_level, size FROM levels "
+                "WHERE provider = ? AND songid = ? AND checked_at > ?",
+                (provider, str(songid), time.time() - max_age)).fetchall()
+        return {level: {"available": bool(available), "actual_level": actual, "size": size}
+                for level, available, actual, size in rows}
+
+    def put_level(self, provider, songid, level, available, actual_level=None, size=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO levels (provider, songid, level, available, actual_level, size, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (provider, str(songid), level, int(available), actual_level, size, time.time()))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            searches = self._conn.execute("SELECT COUNT(*) FROM searches WHERE fetched_at > ?",
+                                          (now - SEARCH_TTL,)).fetchone()[0]
+            urls = self._conn.execute("SELECT COUNT(*) FROM urls WHERE fetched_at > ?",
+                                      (now - URL_TTL,)).fetchone()[0]
+        return {"fresh_searches": searches, "fresh_urls": urls}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> SearchCache:
+    """返回进程内共享的默认缓存（downloads/.meta/search_cache.sqlite3）。"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SearchCache()
+        return _default_cache
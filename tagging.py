@@ -0,0 +1,449 @@
+"""
+下载后的标签写入：把搜索接口返回的歌名、歌手、专辑、封面和歌词嵌入音频文件。
+
+    MP3  → ID3v2（TIT2 / TPE1 / TALB / USLT / APIC），沿用文件原有的 v2.3 / v2.4 版本，默认 v2.3
+    FLAC → VORBIS_COMMENT（TITLE / ARTIST / ALBUM / LYRICS）+ PICTURE
+
+写入哪种标签由文件内容的魔数决定（integrity.sniff_audio_format），而不是只看扩展名；
+内容与扩展名不符（例如 FLAC 数据存成了 .mp3）时跳过，不会把 ID3 标签写到 FLAC 数据前面。
+
+原有标签区（ID3 的填充 / FLAC 的 PADDING 块）放得下新标签时直接原地覆盖标签区，不改写音频数据；
+放不下时才整体重写文件，并预留 PADDING_SIZE 字节的填充，之后的修改就可以原地完成。
+文件有多个硬链接（例如与内容仓库 content_store 共享对象）时总是重写为新文件，不会改动共享的内容。
+
+封面经由封面缓存 (cover_cache) 获取，同一专辑在进程内只读取一次（按 歌手 + 专辑 或封面 URL），
+批量写入时各曲目共用同一份字节。
+
+命令行:
+    python tagging.py jsonl <任务.jsonl> [--workers N]   # 每行 {"path", "title", "artist", "album", "cover", "lyrics"}
+    python tagging.py library [downloads] [--workers N]  # 按文件名和歌词缓存为音乐库中的文件补写标签
+"""
+import argparse
+import json
+import os
+import shutil
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cover_cache
+import integrity
+
+# --- 配置 ---
+PADDING_SIZE = 4096
+TAG_WORKERS = 4
+COVER_CACHE_SIZE = 64  # 进程内缓存的封面数量
+TAGGABLE_FORMATS = {".mp3", ".flac"}
+
+# FLAC 元数据块类型
+FLAC_STREAMINFO = 0
+FLAC_PADDING = 1
+FLAC_VORBIS_COMMENT = 4
+FLAC_PICTURE = 6
+FLAC_MAX_BLOCK = (1 << 24) - 1
+
+VORBIS_KEYS = {"title": "TITLE", "artist": "ARTIST", "album": "ALBUM", "lyrics": "LYRICS"}
+ID3_TEXT_FRAMES = {"title": b"TIT2", "artist": b"TPE1", "album": b"TALB"}
+
+
+# --- 封面 ---
+
+def image_info(data: bytes):
+    """
+    识别封面图片的 MIME 类型与尺寸（只解析 PNG / JPEG 头部）。
+
+    Returns:
+        tuple: (mime, width, height, depth)，无法解析尺寸时宽高为 0。
+    """
+    if data.startswith(b'\x89PNG\r\n\x1a\n') and len(data) >= 26:
+        width, height, bit_depth, color_type = struct.unpack('>IIBB', data[16:26])
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color_type, 1)
+        return 'image/png', width, height, bit_depth * channels
+    if data.startswith(b'\xff\xd8'):
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker in (0xC0, 0xC1, 0xC2):
+                precision, height, width, components = struct.unpack('>BHHB', data[i + 4:i + 10])
+                return 'image/jpeg', width, height, precision * components
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+        return 'image/jpeg', 0, 0, 0
+    return 'image/jpeg', 0, 0, 0
+
+
+_covers = OrderedDict()
+_cover_locks = {}
+_covers_lock = threading.Lock()
+
+
+def get_cover(url, album_key=None):
+    """
+    获取封面字节。图片本身由封面缓存 (cover_cache) 按 URL / 内容去重后保存在本地磁盘；
+    这里再按 album_key（或 URL）在进程内保留一份字节，同一专辑的曲目共用，不再逐曲读盘。
+
+    Returns:
+        bytes or None: 封面数据，获取失败返回 None。
+    """
+    if not url:
+        return None
+    key = album_key or url
+    with _covers_lock:
+        if key in _covers:
+            _covers.move_to_end(key)
+            return _covers[key]
+        lock = _cover_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        with _covers_lock:
+            if key in _covers:
+                return _covers[key]
+        data = cover_cache.get_cache().fetch_bytes(url)
+        with _covers_lock:
+            _covers[key] = data
+            while len(_covers) > COVER_CACHE_SIZE:
+                _covers.popitem(last=False)
+            _cover_locks.pop(key, None)
+        return data
+
+
+# --- 写入工具 ---
+
+def _rewrite(path, head: bytes, audio_offset: int):
+    """写出新文件：head + 原文件 audio_offset 之后的数据，再原子替换原文件（同时断开硬链接）。"""
+    tmp = f"{path}.tagging"
+    try:
+        with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+            dst.write(head)
+            src.seek(audio_offset)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copystat(path, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _overwrite_head(path, head: bytes):
+    """原地覆盖文件开头的标签区（长度与原标签区完全相同）。"""
+    with open(path, 'r+b') as f:
+        f.write(head)
+
+
+def _can_modify_in_place(path) -> bool:
+    """只有一个硬链接时才允许原地修改，避免改动内容仓库中共享的对象。"""
+    return os.stat(path).st_nlink == 1
+
+
+# --- ID3v2 ---
+
+def _syncsafe(n: int) -> bytes:
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+
+
+def _unsyncsafe(b: bytes) -> int:
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _read_id3(f):
+    """
+    读取已有的 ID3v2 标签。
+
+    Returns:
+        tuple: (主版本号, 标签体大小, 音频起始偏移, [(帧ID, 帧标志, 帧数据), ...])；
+               没有标签时版本为 None。无法可靠解析的帧（非同步化、扩展头、v2.2）不保留。
+    """
+    header = f.read(10)
+    if len(header) < 10 or not header.startswith(b'ID3'):
+        return None, 0, 0, []
+    major, flags = header[3], header[5]
+    size = _unsyncsafe(header[6:10])
+    audio_offset = 10 + size + (10 if flags & 0x10 else 0)
+    body = f.read(size)
+    if major not in (3, 4) or flags & 0xC0:
+        return major, size, audio_offset, []
+
+    frames = []
+    i = 0
+    while i + 10 <= len(body) and body[i] != 0:
+        frame_id = body[i:i + 4]
+        raw_size = body[i + 4:i + 8]
+        frame_size = _unsyncsafe(raw_size) if major == 4 else struct.unpack('>I', raw_size)[0]
+        frames.append((frame_id, body[i + 8:i + 10], body[i + 10:i + 10 + frame_size]))
+        i += 10 + frame_size
+    return major, size, audio_offset, frames
+
+
+def _id3_text(text: str, major: int):
+    """按版本选择编码：v2.3 用带 BOM 的 UTF-16，v2.4 用 UTF-8。返回 (编码字节, 数据, 终止符)。"""
+    if major == 4:
+        return b'\x03', text.encode('utf-8'), b'\x00'
+    return b'\x01', text.encode('utf-16'), b'\x00\x00'
+
+
+def _id3_frame(frame_id: bytes, data: bytes, major: int, flags=b'\x00\x00') -> bytes:
+    size = _syncsafe(len(data)) if major == 4 else struct.pack('>I', len(data))
+    return frame_id + size + flags + data
+
+
+def tag_mp3(path, tags: dict, cover: bytes = None) -> bool:
+    """
+    写入 ID3v2 标签。
+
+    Returns:
+        bool: True 表示原地完成，False 表示重写了整个文件。
+    """
+    with open(path, 'rb') as f:
+        major, old_size, audio_offset, frames = _read_id3(f)
+    has_footer = major is not None and audio_offset > 10 + old_size
+    major = major if major in (3, 4) else 3
+
+    replaced = {ID3_TEXT_FRAMES[k] for k in ID3_TEXT_FRAMES if tags.get(k)}
+    if tags.get("lyrics"):
+        replaced.add(b'USLT')
+    if cover:
+        replaced.add(b'APIC')
+
+    body = bytearray()
+    for frame_id, flags, data in frames:
+        if frame_id not in replaced:
+            body += _id3_frame(frame_id, data, major, flags)
+    for key, frame_id in ID3_TEXT_FRAMES.items():
+        if tags.get(key):
+            encoding, text, _ = _id3_text(tags[key], major)
+            body += _id3_frame(frame_id, encoding + text, major)
+    if tags.get("lyrics"):
+        encoding, text, terminator = _id3_text(tags["lyrics"], major)
+        body += _id3_frame(b'USLT', encoding + b'XXX' + terminator + text, major)
+    if cover:
+        encoding, _, terminator = _id3_text('', major)
+        mime = image_info(cover)[0].encode('latin-1')
+        body += _id3_frame(b'APIC', encoding + mime + b'\x00' + b'\x03' + terminator + cover, major)
+
+    if old_size and not has_footer and len(body) <= old_size and _can_modify_in_place(path):
+        head = b'ID3' + bytes((major, 0, 0)) + _syncsafe(old_size) + bytes(body) + b'\x00' * (old_size - len(body))
+        _overwrite_head(path, head)
+        return True
+
+    size = len(body) + PADDING_SIZE
+    head = b'ID3' + bytes((major, 0, 0)) + _syncsafe(size) + bytes(body) + b'\x00' * PADDING_SIZE
+    _rewrite(path, head, audio_offset)
+    return False
+
+
+# --- FLAC ---
+
+def _read_flac_blocks(f):
+    """
+    读取 FLAC 元数据块。
+
+    Returns:
+        tuple: ([(块类型, 数据), ...], 音频帧起始偏移)
+    """
+    if f.read(4) != b'fLaC':
+        raise ValueError("不是 FLAC 文件（或 fLaC 前带有 ID3 标签）")
+    blocks = []
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            raise ValueError("FLAC 元数据块不完整")
+        is_last, block_type = header[0] & 0x80, header[0] & 0x7F
+        length = int.from_bytes(header[1:4], 'big')
+        blocks.append((block_type, f.read(length)))
+        if is_last:
+            return blocks, f.tell()
+
+
+def _vorbis_comment(old: bytes, tags: dict) -> bytes:
+    """构造 VORBIS_COMMENT 块：保留原有的 vendor 与未被覆盖的字段。"""
+    vendor = b'music-file'
+    comments = []
+    if old:
+        vendor_len = struct.unpack('<I', old[:4])[0]
+        vendor = old[4:4 + vendor_len]
+        pos = 4 + vendor_len
+        count = struct.unpack('<I', old[pos:pos + 4])[0]
+        pos += 4
+        for _ in range(count):
+            length = struct.unpack('<I', old[pos:pos + 4])[0]
+            comments.append(old[pos + 4:pos + 4 + length])
+            pos += 4 + length
+
+    overridden = {VORBIS_KEYS[k].encode() for k in VORBIS_KEYS if tags.get(k)}
+    comments = [c for c in comments if c.split(b'=', 1)[0].upper() not in overridden]
+    for key, field in VORBIS_KEYS.items():
+        if tags.get(key):
+            comments.append(f"{field}={tags[key]}".encode('utf-8'))
+
+    out = bytearray(struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments)))
+    for comment in comments:
+        out += struct.pack('<I', len(comment)) + comment
+    return bytes(out)
+
+
+def _flac_picture(cover: bytes) -> bytes:
+    mime, width, height, depth = image_info(cover)
+    mime = mime.encode('ascii')
+    return (struct.pack('>II', 3, len(mime)) + mime + struct.pack('>I', 0)
+            + struct.pack('>IIIII', width, height, depth, 0, len(cover)) + cover)
+
+
+def _flac_block(block_type: int, data: bytes, is_last: bool) -> bytes:
+    return bytes((block_type | (0x80 if is_last else 0),)) + len(data).to_bytes(3, 'big') + data
+
+
+def tag_flac(path, tags: dict, cover: bytes = None) -> bool:
+    """
+    写入 VORBIS_COMMENT / PICTURE。
+
+    Returns:
+        bool: True 表示原地完成，False 表示重写了整个文件。
+    """
+    with open(path, 'rb') as f:
+        blocks, audio_offset = _read_flac_blocks(f)
+
+    old_comment = next((data for t, data in blocks if t == FLAC_VORBIS_COMMENT), b'')
+    picture = _flac_picture(cover) if cover else None
+    if picture and len(picture) > FLAC_MAX_BLOCK:
+        picture = None  # 超出单个元数据块的上限，放弃嵌入封面
+
+    kept = [(t, data) for t, data in blocks
+            if t not in (FLAC_PADDING, FLAC_VORBIS_COMMENT) and not (picture and t == FLAC_PICTURE)]
+    kept.append((FLAC_VORBIS_COMMENT, _vorbis_comment(old_comment, tags)))
+    if picture:
+        kept.append((FLAC_PICTURE, picture))
+
+    used = sum(4 + len(data) for _, data in kept)
+    available = audio_offset - 4
+    in_place = _can_modify_in_place(path) and (used == available or used + 4 <= available)
+    if not in_place:
+        kept.append((FLAC_PADDING, b'\x00' * PADDING_SIZE))
+    elif used != available:
+        kept.append((FLAC_PADDING, b'\x00' * (available - used - 4)))
+
+    head = b'fLaC' + b''.join(_flac_block(block_type, data, i == len(kept) - 1)
+                              for i, (block_type, data) in enumerate(kept))
+    if in_place:
+        _overwrite_head(path, head)
+        return True
+    _rewrite(path, head, audio_offset)
+    return False
+
+
+# --- 对外接口 ---
+
+def tag_file(path, tags: dict, cover: bytes = None, audio_format: str = None) -> bool:
+    """
+    为单个文件写入标签。
+
+    Args:
+        tags (dict): 可包含 title / artist / album / lyrics，缺失或为空的字段不写入。
+        cover (bytes): 封面图片数据。
+        audio_format (str): 已知的内容格式（如下载时 StreamVerifier.detected_format），省去再读一次文件头。
+
+    Returns:
+        bool: 成功返回 True；不支持的格式、内容与扩展名不符或写入失败返回 False。
+    """
+    ext = Path(path).suffix.lower()
+    if ext not in TAGGABLE_FORMATS:
+        return False
+    try:
+        if audio_format is None:
+            with open(path, 'rb') as f:
+                audio_format = integrity.sniff_audio_format(f.read(integrity.SNIFF_BYTES))
+        if f".{audio_format}" != ext:
+            print(f"⚠️ 文件内容是 {audio_format or '未知格式'}，与扩展名 {ext} 不符，跳过写入标签 ({path})")
+            return False
+        if ext == ".mp3":
+            tag_mp3(path, tags, cover)
+        else:
+            tag_flac(path, tags, cover)
+        return True
+    except (OSError, ValueError, struct.error) as e:
+        print(f"⚠️ 写入标签失败 ({path}): {e}")
+        return False
+
+
+def tag_track(path, title=None, artist=None, album=None, lyrics=None, cover_url=None, audio_format=None) -> bool:
+    """下载流程中使用的便捷入口：获取（或复用）封面后写入标签。audio_format 见 tag_file()。"""
+    album_key = f"{artist}\x00{album}" if album else None
+    cover = get_cover(cover_url, album_key) if cover_url else None
+    return tag_file(path, {"title": title, "artist": artist, "album": album, "lyrics": lyrics}, cover, audio_format)
+
+
+def tag_batch(jobs, workers=TAG_WORKERS) -> dict:
+    """
+    在线程池中批量写入标签。
+
+    Args:
+        jobs (iterable): 每项为 dict，包含 path 以及 title / artist / album / lyrics / cover（封面 URL）。
+
+    Returns:
+        dict: {"tagged": 成功数, "failed": 失败数}
+    """
+    def run(job):
+        return tag_track(job["path"], job.get("title"), job.get("artist"), job.get("album"),
+                         job.get("lyrics"), job.get("cover"))
+
+    summary = {"tagged": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for ok in executor.map(run, jobs):
+            summary["tagged" if ok else "failed"] += 1
+    return summary
+
+
+def library_jobs(root="downloads"):
+    """
+    为音乐库中的 MP3 / FLAC 生成标签任务：歌名、歌手取自 "歌名 - 歌手[_id]" 形式的文件名，
+    歌词取自歌词缓存。
+    """
+    import library_index
+    import lyrics_cache
+
+    index = library_index.get_index()
+    cache = lyrics_cache.get_cache()
+    index.reconcile(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in TAGGABLE_FORMATS or " - " not in stem:
+                continue
+            path = os.path.join(dirpath, filename)
+            title, artist = stem.split(" - ", 1)
+            source = index.get_source(path)
+            if source and artist.endswith(f"_{source[1]}"):
+                artist = artist[:-len(f"_{source[1]}")]
+            lyrics = (cache.get(*source) if source else None) or \
+                cache.get("file", os.path.abspath(os.path.join(dirpath, stem))) or {}
+            yield {"path": path, "title": title, "artist": artist, "lyrics": lyrics.get("lrc")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="为下载的 MP3 / FLAC 写入歌名、歌手、专辑、封面和歌词。")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_jsonl = sub.add_parser("jsonl", help="按 JSONL 任务文件写入")
+    p_jsonl.add_argument("path")
+    p_jsonl.add_argument("--workers", type=int, default=TAG_WORKERS)
+    p_library = sub.add_parser("library", help="按文件名和歌词缓存为音乐库补写标签")
+    p_library.add_argument("root", nargs="?", default="downloads")
+    p_library.add_argument("--workers", type=int, default=TAG_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.command == "jsonl":
+        with open(args.path, 'r', encoding='utf-8') as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+    else:
+        jobs = list(library_jobs(args.root))
+    print(f"共 {len(jobs)} 个文件待写入标签...")
+    print(tag_batch(jobs, args.workers))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
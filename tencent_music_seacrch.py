@@ -2,13 +2,35 @@ import requests
 import json
 import time
 import os
-from tqdm import tqdm
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 
+import content_store
+import download_scheduler
+import file_sink
+import integrity
+import metrics
+import progress
+import response_classifier
+import lrc_engine
+import lyrics_cache
+import tagging
+
 # --- 配置 ---
 BASE_URL = "https://api.vkeys.cn/v2/music/tencent"
 DOWNLOAD_DIR = "downloads"
+REQUEST_TIMEOUT = 10  # 搜索 / geturl / 歌词接口的超时（秒）
+DOWNLOAD_CONCURRENCY = 3  # 多选下载时同时进行的歌曲数
+# 接口返回译文 (trans) 时，保存为原文 + 译文对齐后的双语 LRC
+MERGE_TRANSLATION = True
+# download_vkeys_song() 的结果状态
+STATUS_OK = "ok"
+STATUS_NO_URL = "no_url"
+STATUS_DOWNLOAD_FAILED = "download_failed"
+# 复用 TCP/TLS 连接（keep-alive）；在常驻进程 (music_daemon.py) 中所有任务共享同一个会话
+session = requests.Session()
 
 
 # --- 辅助函数：目录、搜索、详情、匹配 ---
@@ -23,6 +45,24 @@ def ensure_download_dir():
             print(f"❌ 无法创建下载目录 '{DOWNLOAD_DIR}': {e}")
 
 
+def _api_get(api_url: str) -> Dict[str, Any]:
+    """
+    请求 vkeys 接口并解析 JSON。请求前先经熔断器检查（限流时等待），响应按 response_classifier 分类并记录。
+
+    Raises:
+        requests.RequestException: 网络错误、熔断中 (CircuitOpenError)、响应不是可用的 JSON。
+    """
+    breaker = response_classifier.get_breaker()
+    breaker.check(api_url)
+    response = session.get(api_url, timeout=REQUEST_TIMEOUT)
+    verdict = response_classifier.classify_response(response, response_classifier.EXPECT_JSON)
+    breaker.record(api_url, verdict)
+    if verdict.label != response_classifier.OK:
+        raise requests.HTTPError(f"{verdict.label}: {verdict.reason}", response=response)
+    return response.json()
+
+
+@metrics.timed("search", "vkeys")
 def search_music(query: str) -> List[Dict[str, Any]] | None:
     """调用腾讯音乐搜索 API 获取初步结果列表。"""
     processed_query = query.replace('-', ' ').strip()
@@ -31,9 +71,7 @@ def search_music(query: str) -> List[Dict[str, Any]] | None:
     print(f"正在向 API 搜索 '{processed_query}' 获取初步结果列表 (目标 10 条)...")
 
     try:
-        response = requests.get(search_api)
-        response.raise_for_status()
-        data = response.json()
+        data = _api_get(search_api)
 
         if data.get("code") == 200 and data.get("data"):
             return data["data"][:10]
@@ -46,14 +84,13 @@ def search_music(query: str) -> List[Dict[str, Any]] | None:
         return None
 
 
+@metrics.timed("resolve", "vkeys")
 def get_song_url(song_id: int) -> Dict[str, Any] | None:
     """根据歌曲 ID 获取详细信息和播放链接。"""
     url_api = f"{BASE_URL}/geturl?id={song_id}"
 
     try:
-        response = requests.get(url_api)
-        response.raise_for_status()
-        data = response.json()
+        data = _api_get(url_api)
 
         if data.get("code") == 200 and data.get("data"):
             return data["data"]
@@ -69,9 +106,7 @@ def get_song_lyrics(song_id: int) -> Dict[str, Any] | None:
     lyric_api = f"{BASE_URL}/lyric?id={song_id}"
 
     try:
-        response = requests.get(lyric_api)
-        response.raise_for_status()
-        data = response.json()
+        data = _api_get(lyric_api)
 
         if data.get("code") == 200 and data.get("data"):
             return data["data"]
@@ -103,53 +138,77 @@ def find_best_match(query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]
 
 # --- 核心操作函数：下载与保存 ---
 
+@metrics.timed("download", "vkeys")
 def actual_download(filename: str, url: str, total_size: int):
-    """实现真正的文件下载到 downloads 目录，并显示进度条。"""
+    """
+    实现真正的文件下载到 downloads 目录，并显示进度条。
+
+    写入循环中同时完成完整性校验（SHA-256、与 Content-Length 精确比对、开头 4KB 的音频魔数检查），
+    先写入 .part 文件，校验通过后才改名为正式文件。total_size 只在服务器未给出 Content-Length 时
+    用作进度汇总的估计值。
+
+    Returns:
+        str or False: 成功时返回文件的 SHA-256，失败返回 False。
+    """
     save_path = os.path.join(DOWNLOAD_DIR, filename)
+    part_path = save_path + ".part"
 
     try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-
-        with open(save_path, 'wb') as f:
-            with tqdm(
-                    desc=f"下载 {filename}",
-                    total=total_size,
-                    unit='B',
-                    unit_scale=True,
-                    unit_divisor=1024,
-                    ncols=100
-            ) as bar:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
-                        bar.update(len(chunk))
-
-        downloaded_size = os.path.getsize(save_path)
-        if abs(downloaded_size - total_size) > 1024 * 1024:
-            # 允许少量误差
-            raise Exception(f"文件大小不匹配 (预期: {total_size}B, 实际: {downloaded_size}B)，下载可能中断或链接已失效。")
+        # 传输槽由全局下载调度器分配（全局 / 每主机并发上限，交互式优先于批量）。
+        # 限流等待放在申请传输槽之前，被限流后先归还槽位，等待结束再重新申请
+        breaker = response_classifier.get_breaker()
+        for attempt in range(2):
+            breaker.check(url)  # 主机被限流时先等待，熔断时抛出 CircuitOpenError
+            with download_scheduler.get_scheduler().slot(url) as transfer:
+                # 只凭状态码和响应头判断链接是否可用，失效 / 被拦截时不读取正文
+                response = session.get(url, stream=True, timeout=30)
+                verdict = response_classifier.classify_response(response, response_classifier.EXPECT_AUDIO,
+                                                                sniff=False)
+                breaker.record(url, verdict)
+                if verdict.label == response_classifier.THROTTLED and not attempt and \
+                        verdict.wait <= response_classifier.MAX_THROTTLE_WAIT:
+                    response.close()
+                    continue
+
+                if verdict.label != response_classifier.OK:
+                    response.close()
+                    print(f"\n❌ 下载链接不可用 ({verdict.label}: {verdict.reason})")
+                    return False
+
+                expected_size = integrity.expected_length_from_headers(response.headers)
+                verifier = integrity.StreamVerifier(expected_size)
+
+                # 进度只更新计数器，由 progress 模块统一汇总显示
+                with open(part_path, 'wb') as f, \
+                        progress.get_tracker().start_file(filename, expected_size or total_size) as handle:
+                    file_sink.write_response(response, f, verifier=verifier, transfer=transfer,
+                                             progress=handle.add)
+                    digest = verifier.finish()
+            break
+
+        os.replace(part_path, save_path)
 
         # print(f"✅ 歌曲文件下载成功！")
         # print(f"🎶 文件已保存到: {save_path}")
-        return True
+        return digest
 
     except requests.RequestException as e:
         print(f"\n❌ 下载请求失败: {e}")
-        if os.path.exists(save_path):
-            os.remove(save_path)
-            print(f"已删除不完整歌曲文件: {filename}")
+        return False
+    except integrity.IntegrityError as e:
+        print(f"\n❌ 下载内容校验失败: {e}")
         return False
     except Exception as e:
         print(f"\n❌ 下载或写入歌曲文件时发生错误: {e}")
-        if os.path.exists(save_path):
-            os.remove(save_path)
-            print(f"已删除不完整歌曲文件: {filename}")
         return False
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+            print(f"已删除不完整歌曲文件: {filename}")
 
 
-def save_lyrics(filename_base: str, lyrics_data: Dict[str, Any]):
-    """将 LRC 歌词保存为 .lrc 文件。"""
+def save_lyrics(filename_base: str, lyrics_data: Dict[str, Any], merge_translation: bool = MERGE_TRANSLATION):
+    """将 LRC 歌词保存为 .lrc 文件；merge_translation 为 True 且有译文时保存为双语歌词。"""
 
     lrc_filename = f"{filename_base}.lrc"
     save_path = os.path.join(DOWNLOAD_DIR, lrc_filename)
@@ -157,6 +216,8 @@ def save_lyrics(filename_base: str, lyrics_data: Dict[str, Any]):
     lyrics_content = ""
     if lyrics_data.get('lrc'):
         lyrics_content = lyrics_data['lrc']
+        if merge_translation and lyrics_data.get('trans'):
+            lyrics_content = lrc_engine.merge_texts(lyrics_content, lyrics_data['trans'])
     else:
         # print("❌ 歌词数据中没有找到可保存的LRC内容。")
         return False
@@ -176,48 +237,107 @@ def save_lyrics(filename_base: str, lyrics_data: Dict[str, Any]):
 
 # --- 核心流程：处理单首歌曲下载 ---
 
-def download_single_song(selected_song: Dict[str, Any]):
-    """处理单首歌曲的下载和歌词保存，作为多选调用的子函数。"""
+def finish_vkeys_song(song: Dict[str, Any], file_name_base: str, digest: str | None,
+                      lyrics_data: Dict[str, Any] | None) -> Dict[str, Any]:
+    """
+    新下载歌曲的收尾：写入标签（歌名、歌手、专辑、封面、歌词）→ 收入内容仓库 → 保存 .lrc 歌词。
+    同步下载 (download_vkeys_song) 与异步客户端 (vkeys_async) 共用。
 
-    song_id = selected_song['id']
-    song_name = selected_song['song']
-    song_singer = selected_song['singer']
+    Returns:
+        dict: {"path": 文件路径, "sha256": 内容仓库中的哈希, "lyrics": 是否保存了歌词}
+    """
+    save_path = os.path.join(DOWNLOAD_DIR, f"{file_name_base}.flac")
+    if tagging.tag_track(save_path, song['song'], song['singer'], song.get('album'),
+                         (lyrics_data or {}).get('lrc'), song.get('cover')):
+        digest = None  # 写入标签后内容已变化，由内容仓库重新计算哈希
+    digest = content_store.get_store().ingest(save_path, "vkeys", song['id'], "flac", digest=digest)
+    return {"path": save_path, "sha256": digest,
+            "lyrics": bool(lyrics_data) and save_lyrics(file_name_base, lyrics_data)}
 
-    print(f"\n--- 开始处理: {song_name} - {song_singer} ---")
 
-    # 1. 获取歌曲 URL 详情
+def _lyrics_result(lyrics_future) -> Dict[str, Any] | None:
+    """取回后台歌词任务的结果；歌词缓存或接口出错时按没有歌词处理，不影响已经下载好的歌曲。"""
+    try:
+        return lyrics_future.result()
+    except Exception as e:
+        print(f"⚠️ 获取歌词失败，按无歌词处理: {e}")
+        return None
+
+
+def download_vkeys_song(song: Dict[str, Any], timings: Dict[str, float] | None = None) -> Dict[str, Any]:
+    """
+    处理单首歌曲：查内容仓库 → (geturl ‖ 歌词) → 下载 → 写标签 → 收入仓库 → 保存歌词。
+    不做任何交互，供命令行多选下载和批量模式 (batch_download.py) 共用。
+
+    Args:
+        song (dict): 搜索结果中的一项（id / song / singer，可选 album / cover）。
+        timings (dict): 可选，填入 resolve / download 两个阶段的耗时（秒）。
+
+    Returns:
+        dict: {"status", "path", "sha256", "lyrics", "cached"}，status 为 STATUS_* 之一。
+    """
+    song_id = song['id']
+    file_name_base = f"{song['song']} - {song['singer']}_{song_id}"
+    result = {"status": STATUS_OK, "path": None, "sha256": None, "lyrics": False, "cached": False}
+    timings = {} if timings is None else timings
+
+    # 歌词与音频互不依赖：先在后台提交歌词任务（命中缓存时不发请求），与下面的音频下载并行
+    lyrics_future = lyrics_cache.get_cache().fetch_async("vkeys", song_id, get_song_lyrics)
+
+    # 先查询内容仓库，已下载过的歌曲直接硬链接，连 geturl 也不用请求
+    cached_path = content_store.get_store().materialize("vkeys", song_id, "flac", DOWNLOAD_DIR, file_name_base)
+    if cached_path:
+        lyrics_data = _lyrics_result(lyrics_future)
+        result.update(path=str(cached_path), cached=True,
+                      lyrics=bool(lyrics_data) and save_lyrics(file_name_base, lyrics_data))
+        return result
+
+    t0 = time.perf_counter()
     details = get_song_url(song_id)
+    timings["resolve"] = time.perf_counter() - t0
     if not (details and details.get('url')):
-        print("❌ 歌曲链接获取失败或API未提供有效URL。")
-        return
-
-    # 准备文件信息
-    file_name_base = f"{song_name} - {song_singer}_{song_id}"
-    music_filename = f"{file_name_base}.flac"
-    size_str = details.get('size', '5MB').replace('MB', '')
+        lyrics_future.cancel()
+        result["status"] = STATUS_NO_URL
+        return result
 
     try:
-        size_mb = float(size_str)
-        total_size_bytes = int(size_mb * 1024 * 1024)
+        total_size_bytes = int(float(details.get('size', '5MB').replace('MB', '')) * 1024 * 1024)
     except ValueError:
-        size_mb = 5.0
         total_size_bytes = 5 * 1024 * 1024
 
-        # 2. 真实下载歌曲文件
-    download_success = actual_download(music_filename, details['url'], total_size_bytes)
-
-    # 3. 获取并保存歌词
-    if download_success:
-        lyrics_data = get_song_lyrics(song_id)
-        if lyrics_data:
-            if save_lyrics(file_name_base, lyrics_data):
-                print(f"✅ 歌词文件已保存到: {os.path.join(DOWNLOAD_DIR, file_name_base)}.lrc")
-            else:
-                print("⚠️ 歌词获取成功但保存失败。")
+    t0 = time.perf_counter()
+    digest = actual_download(f"{file_name_base}.flac", details['url'], total_size_bytes)
+    timings["download"] = time.perf_counter() - t0
+    if not digest:
+        lyrics_future.cancel()
+        result["status"] = STATUS_DOWNLOAD_FAILED
+        return result
+
+    result.update(finish_vkeys_song(song, file_name_base, digest, _lyrics_result(lyrics_future)))
+    return result
+
+
+def download_single_song(selected_song: Dict[str, Any]) -> bool:
+    """命令行中处理单首歌曲的下载和歌词保存，作为多选调用的子函数。返回歌曲文件是否已就绪。"""
+
+    song_name = selected_song['song']
+    song_singer = selected_song['singer']
+
+    print(f"\n--- 开始处理: {song_name} - {song_singer} ---")
+    result = download_vkeys_song(selected_song)
+
+    if result["cached"]:
+        print(f"♻️ 内容仓库中已有该歌曲，直接链接: {result['path']}")
+    elif result["status"] == STATUS_NO_URL:
+        print("❌ 歌曲链接获取失败或API未提供有效URL。")
+    if result["status"] == STATUS_OK:
+        if result["lyrics"]:
+            print(f"✅ 歌词文件已保存到: {os.path.splitext(result['path'])[0]}.lrc")
         else:
-            print("⚠️ 未找到歌词信息。")
+            print("⚠️ 未找到歌词信息或歌词保存失败。")
 
     print(f"--- 处理完成: {song_name} - {song_singer} ---\n")
+    return result["status"] == STATUS_OK
 
 
 # --- 解析用户多选输入 ---
@@ -269,6 +389,24 @@ def parse_selection_input(input_str: str, max_index: int) -> List[int] | None:
     return sorted(list(selected_indices))
 
 
+def download_selected(songs: List[Dict[str, Any]], concurrency: int = DOWNLOAD_CONCURRENCY) -> int:
+    """
+    并发下载多首歌曲，返回成功的数量。
+
+    优先使用异步客户端 vkeys_async（按完成顺序逐条报告）；它依赖可选的 aiohttp，
+    未安装时退回到线程池中并发执行 download_single_song。
+    """
+    try:
+        import vkeys_async
+    except ImportError:
+        print("ℹ️ 未安装 aiohttp，改用线程池并发下载。")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return sum(pool.map(download_single_song, songs))
+
+    results = vkeys_async.run_downloads(songs, concurrency)
+    return sum(1 for r in results if r['status'] in (vkeys_async.STATUS_OK, vkeys_async.STATUS_CACHED))
+
+
 # --- 主程序 CLI ---
 
 def main_cli():
@@ -338,12 +476,11 @@ def main_cli():
                     print("⚠️ 未选择任何有效歌曲。")
                     continue
 
-                print(f"\n即将下载 {len(selected_indices)} 首歌曲...")
+                print(f"\n即将下载 {len(selected_indices)} 首歌曲（同时进行 {DOWNLOAD_CONCURRENCY} 首）...")
 
-                # 遍历并下载所有选中的歌曲
-                for index in selected_indices:
-                    song = search_results[index]
-                    download_single_song(song)
+                songs = [search_results[index] for index in selected_indices]
+                succeeded = download_selected(songs)
+                print(f"下载完成: 成功 {succeeded} 首，失败 {len(songs) - succeeded} 首。")
 
                 print("-" * 60)
                 break
@@ -352,6 +489,30 @@ def main_cli():
                 print(f"⚠️ 发生未知错误: {e}")
 
 
+def download_query(query: str) -> int:
+    """
+    非交互模式：搜索后下载精确匹配（没有时取第一条结果）的一首歌，供自动化调用。
+
+    Returns:
+        int: 退出码，歌曲文件已就绪为 0。
+    """
+    ensure_download_dir()
+    search_results = search_music(query)
+    if not search_results:
+        print(f"❌ 未找到与 '{query}' 相关的歌曲。")
+        return 1
+    song = find_best_match(query, search_results) or search_results[0]
+    return 0 if download_single_song(song) else 1
+
+
 # --- 运行主程序 ---
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+        print("用法: python tencent_music_seacrch.py [\"歌名 歌手\"]（不给关键词时进入交互式搜索）")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1].strip():
+        # 给出关键词时不进入交互循环；守护进程在运行时交给它执行，MUSIC_DAEMON=0 时仍在本进程内运行
+        import music_daemon
+        remote_status = music_daemon.try_remote("download", sys.argv[1].strip(), "vkeys")
+        sys.exit(download_query(sys.argv[1].strip()) if remote_status is None else remote_status)
     main_cli()
\ No newline at end of file
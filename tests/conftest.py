@@ -0,0 +1,33 @@
+"""
+测试公共设置：把仓库根目录和 清理数据/（其中的模块按同目录方式互相导入）加入 sys.path，并让每个测试在独立的临时目录中运行，
+各模块默认写到 downloads/.meta/ 下的 SQLite 缓存不会落到仓库里，也不会在测试之间共享。
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.append(str(REPO_ROOT / "清理数据"))
+
+# 进程内单例：切换目录后需要重新创建，才会使用临时目录下的新数据库
+SINGLETONS = {
+    "search_cache": "_default_cache",
+    "lyrics_cache": "_default_cache",
+    "library_index": "_default_index",
+    "content_store": "_default_store",
+    "cookie_store": "_default_store",
+    "response_classifier": "_default_breaker",
+    "cover_cache": "_default_cache",
+}
+
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for module_name, attr in SINGLETONS.items():
+        module = sys.modules.get(module_name)
+        if module is not None and hasattr(module, attr):
+            monkeypatch.setattr(module, attr, None)
+    return tmp_path
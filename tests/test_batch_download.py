@@ -0,0 +1,24 @@
+import batch_download
+import content_store
+import download_music
+
+
+def test_gequhai_store_hit_skips_url_resolution(tmp_path, monkeypatch):
+    song = {"id": "4321", "title": "晴天", "artist": "周杰伦"}
+    source = tmp_path / "source.mp3"
+    source.write_bytes(b"ID3" + b"\x00" * 4096)
+    content_store.get_store().ingest(source, "gequhai", song["id"], "default")
+
+    def get_music_url(track_id):
+        raise AssertionError("已在内容仓库中的曲目不应再请求详情页")
+
+    monkeypatch.setattr(download_music, "search_songs", lambda keyword: [song])
+    monkeypatch.setattr(download_music, "get_music_url", get_music_url)
+    item = batch_download.make_item(0, "晴天-周杰伦")
+    timings = {}
+
+    outcome = batch_download.process_gequhai(item, timings)
+
+    assert outcome["status"] == batch_download.STATUS_OK and outcome["cached"]
+    assert outcome["path"].endswith("晴天 - 周杰伦.mp3")
+    assert "resolve" not in timings
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import body_cache
+
+ITEMS = [
+    {"id": 101, "name": "心跳", "artist": "王力宏"},
+    {"id": 102, "name": "Ｈｅａｒｔ Beat", "artist": "Leehom Wang"},
+    {"id": 103, "name": "心跳", "artist": "王力宏、卢巧音"},
+    {"name": "没有 id", "artist": "王力宏"},
+    "not a dict",
+]
+ENVELOPE = {"status_code": 200, "body": json.dumps(ITEMS, ensure_ascii=False), "headers": {}, "files": []}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(body_cache, "_default_cache", None)
+
+
+def test_body_is_parsed_once_per_content():
+    parsed = body_cache.get_body(ENVELOPE)
+
+    assert body_cache.get_body(dict(ENVELOPE)) is parsed
+    assert body_cache.get_body(ENVELOPE["body"]) is parsed
+    assert parsed.index is parsed.index
+
+
+def test_queries():
+    results = body_cache.run_queries(ENVELOPE, [
+        {"nth": 2}, {"nth": [1, 4, 9]}, {"name": "心跳"}, {"name": "心跳", "artist": "卢巧音"},
+        {"artist": "王力宏"}, {"all": True}, {"nth": 0}, {"unknown": 1},
+    ])
+
+    assert results[:6] == [{"id": 102}, {"ids": [101, None, None]}, {"ids": [101, 103]}, {"ids": [103]},
+                           {"ids": [101, 103]}, {"ids": [101, 102, 103]}]
+    assert "正整数" in results[6]["error"] and "无法识别" in results[7]["error"]
+
+
+@pytest.mark.parametrize("envelope", [
+    {"status_code": 500, "body": "[]"}, {"status_code": 200, "body": ""},
+    {"status_code": 200, "body": "{not json"}, {"status_code": 200, "body": '{"a": 1}'},
+])
+def test_bad_envelopes_raise(envelope):
+    with pytest.raises(body_cache.EnvelopeError):
+        body_cache.get_body(envelope)
+
+
+def test_lru_evicts_oldest_body():
+    cache = body_cache.BodyCache(max_entries=2)
+    first = cache.get("[1]")
+    cache.get("[2]")
+    cache.get("[3]")
+    assert cache.get("[1]") is not first
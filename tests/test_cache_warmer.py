@@ -0,0 +1,36 @@
+import types
+from unittest import mock
+
+import pytest
+
+import cache_warmer
+import quality_ladder
+import search_cache
+
+
+def test_cold_keyword_search_fits_the_default_burst():
+    searched = []
+
+    def search_music_raw(keyword, target_count):
+        searched.append((keyword, target_count))
+        return [{"songid": "7", "title": keyword, "author": "歌手"}]
+
+    session = mock.Mock()
+    session.get.return_value.json.return_value = {"status": 404}
+    scraper = types.SimpleNamespace(session=session, byfuns_api_url=quality_ladder.BYFUNS_API_URL,
+                                    search_music_raw=search_music_raw)
+    module = types.SimpleNamespace(find_strict_match=lambda title, artist, results: results[0])
+    # 默认突发容量、较快的补充速度：原先一次申请 SEARCH_DEPTH // 10 个令牌会永远等待
+    bucket = cache_warmer.TokenBucket(rate=1000, capacity=cache_warmer.RATE_BURST)
+
+    with mock.patch.object(cache_warmer, "fetch_hot_keywords", return_value=["晴天"]):
+        stats = cache_warmer.warm_once(scraper, module, bucket)
+
+    assert searched == [("晴天", cache_warmer.SEARCH_DEPTH)]
+    assert stats["searched"] == 1 and stats["keywords"] == 1
+    assert search_cache.get_cache().get_levels(quality_ladder.PROVIDER, "7")
+
+
+def test_oversized_acquire_fails_instead_of_hanging():
+    with pytest.raises(ValueError):
+        cache_warmer.TokenBucket(rate=50, capacity=5).acquire(10)
@@ -0,0 +1,95 @@
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import cookie_store
+import response_classifier
+
+URL = "https://www.gequhai.com/api/music"
+
+
+def fake_response(status=200, content_type="application/json", body=b'{"code": 200}', cookies=None):
+    return types.SimpleNamespace(status_code=status, headers={"Content-Type": content_type}, content=body,
+                                 history=[], url=URL, cookies=cookies or {})
+
+
+def test_seed_only_fills_empty_hosts_and_updates_persist():
+    store = cookie_store.get_store()
+    store.seed(URL, "PHPSESSID=old; a=1")
+    store.seed("www.gequhai.com", {"PHPSESSID": "ignored"})
+    store.update(URL, {"PHPSESSID": "new"})
+
+    assert store.get("www.gequhai.com") == {"PHPSESSID": "new", "a": "1"}
+    assert cookie_store.CookieStore().get(URL) == {"PHPSESSID": "new", "a": "1"}  # 重新打开后仍在
+
+
+def test_anti_bot_response_refreshes_once_and_resends():
+    store = cookie_store.get_store()
+    store.seed(URL, {"PHPSESSID": "stale"})
+    sent = []
+    pages = iter([fake_response(content_type="text/html", body=b"<html>verify</html>"),
+                  fake_response(cookies={"server_name_session": "s"})])
+
+    def send(cookies):
+        sent.append(cookies)
+        return next(pages)
+
+    def warm_up():
+        return fake_response(content_type="text/html", cookies={"PHPSESSID": "fresh"})
+
+    response, verdict = cookie_store.request_with_refresh(URL, send, warm_up)
+
+    assert verdict.label == response_classifier.OK
+    assert sent == [{"PHPSESSID": "stale"}, {"PHPSESSID": "fresh"}]
+    assert store.get(URL) == {"PHPSESSID": "fresh", "server_name_session": "s"}
+
+    # 刷新间隔内再次被拦截时不再访问首页
+    blocked = fake_response(content_type="text/html", body=b"<html>verify</html>")
+    response, verdict = cookie_store.request_with_refresh(URL, lambda cookies: blocked, warm_up)
+    assert verdict.label == response_classifier.ANTI_BOT and len(sent) == 2
+
+
+class _GequhaiHandler(BaseHTTPRequestHandler):
+    warm_up_agents = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "PHPSESSID=fresh" in (self.headers.get("Cookie") or ""):
+            self._send(b'{"code": 200}', "application/json")
+        else:
+            self._send(b"<html>verify</html>", "text/html")
+
+    def do_GET(self):
+        type(self).warm_up_agents.append(self.headers.get("User-Agent"))
+        self._send(b"<html>home</html>", "text/html", "PHPSESSID=fresh; path=/")
+
+    def _send(self, body, content_type, cookie=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_gequhai_request_seeds_and_warms_up_with_the_script_headers():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GequhaiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/api/music"
+    try:
+        response, verdict = cookie_store.gequhai_request(
+            requests.Session(), "POST", api_url, {"PHPSESSID": "stale"}, {"User-Agent": "script-agent"},
+            expect=response_classifier.EXPECT_JSON, data={"id": "1"}, timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert verdict.label == response_classifier.OK and response.json() == {"code": 200}
+    assert _GequhaiHandler.warm_up_agents == ["script-agent"]
+    assert cookie_store.get_store().get(api_url) == {"PHPSESSID": "fresh"}
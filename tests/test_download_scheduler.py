@@ -0,0 +1,68 @@
+import download_scheduler
+from download_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+
+def enqueue(scheduler, url, priority=PRIORITY_BATCH, job=None):
+    """不阻塞地排队一个请求（acquire() 会等到获准为止），返回 Transfer。"""
+    with scheduler._lock:
+        transfer = download_scheduler.Transfer(url, job, priority, next(scheduler._seq))
+        scheduler._waiting.append(transfer)
+        scheduler._dispatch()
+    return transfer
+
+
+def granted(*transfers):
+    return [t._granted.is_set() for t in transfers]
+
+
+def test_batch_jobs_leave_the_interactive_reserve_free():
+    scheduler = download_scheduler.DownloadScheduler(global_limit=3, per_host_limit=9, interactive_reserve=1)
+    batch = [enqueue(scheduler, f"http://h{i}/a", job="batch") for i in range(3)]
+    assert granted(*batch) == [True, True, False]
+
+    interactive = enqueue(scheduler, "http://h9/a", PRIORITY_INTERACTIVE)
+    assert granted(interactive) == [True]
+    # 全局上限已满，归还一个批量槽位后才轮到排队的批量请求
+    scheduler.release(batch[0])
+    assert granted(batch[2]) == [False]
+    scheduler.release(interactive)
+    assert granted(batch[2]) == [True]
+
+
+def test_per_host_limit():
+    scheduler = download_scheduler.DownloadScheduler(global_limit=4, per_host_limit=1, interactive_reserve=0,
+                                                     host_limits={"wide": 2})
+    first, second = enqueue(scheduler, "http://cdn/a"), enqueue(scheduler, "http://cdn/b")
+    other = enqueue(scheduler, "http://other/a")
+    wide = [enqueue(scheduler, "http://wide/a"), enqueue(scheduler, "http://wide/b")]
+    assert granted(first, second, other, *wide) == [True, False, True, True, True]
+
+    scheduler.release(first)
+    assert granted(second) == [True]
+
+
+def test_interactive_requests_jump_the_batch_queue():
+    scheduler = download_scheduler.DownloadScheduler(global_limit=2, per_host_limit=9, interactive_reserve=0)
+    running = [enqueue(scheduler, f"http://h/{i}", job="batch") for i in range(2)]
+    queued_batch = enqueue(scheduler, "http://h/2", job="batch")
+    queued_interactive = enqueue(scheduler, "http://h/3", PRIORITY_INTERACTIVE)
+
+    scheduler.release(running[0])
+    assert granted(queued_batch, queued_interactive) == [False, True]
+
+
+def test_batch_jobs_share_slots_fairly():
+    scheduler = download_scheduler.DownloadScheduler(global_limit=2, per_host_limit=9, interactive_reserve=0)
+    job_a = [enqueue(scheduler, f"http://h/a{i}", job="a") for i in range(4)]
+    job_b = [enqueue(scheduler, f"http://h/b{i}", job="b") for i in range(2)]
+    assert granted(*job_a, *job_b) == [True, True, False, False, False, False]
+
+    # a 已有一个活动传输，b 一个都没有：空出的槽位给 b，而不是更早排队的 a2
+    scheduler.release(job_a[0])
+    assert granted(job_a[2], job_b[0]) == [False, True]
+    # 双方各有一个活动传输时，最久没被服务的 a 优先
+    scheduler.release(job_a[1])
+    assert granted(job_a[2], job_b[1]) == [True, False]
+
+    stats = scheduler.stats()
+    assert stats["active"] == 2 and stats["queued"] == {"interactive": 0, "batch": 2}
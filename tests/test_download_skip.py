@@ -0,0 +1,42 @@
+import requests
+
+import download_music
+import library_index
+
+URL = "https://cdn.example/song.mp3"
+
+
+def fail_request(*args, **kwargs):
+    raise requests.exceptions.ConnectionError("network disabled in tests")
+
+
+def test_index_row_for_deleted_file_does_not_skip(monkeypatch):
+    path = download_music.DOWNLOAD_DIR / "晴天 - 周杰伦.mp3"
+    path.parent.mkdir()
+    path.write_bytes(b"ID3")
+    index = library_index.get_index()
+    index.record_file(path)
+    path.unlink()
+
+    attempts = []
+
+    def record_attempt(url, **kwargs):
+        attempts.append(url)
+        fail_request()
+
+    monkeypatch.setattr(download_music.session, "get", record_attempt)
+    assert download_music.download_music_file(URL, "晴天", "周杰伦") is False
+    assert attempts == [URL]  # 没有因为过期的索引记录而跳过下载
+    assert index.find_by_stem(download_music.DOWNLOAD_DIR, "晴天 - 周杰伦") is None
+    assert index.stats() == {}  # 过期记录已从索引中删除
+
+
+def test_existing_file_unknown_to_index_is_skipped(monkeypatch):
+    path = download_music.DOWNLOAD_DIR / "晴天 - 周杰伦.mp3"
+    path.parent.mkdir()
+    path.write_bytes(b"ID3")
+
+    monkeypatch.setattr(download_music.session, "get", fail_request)
+    assert download_music.download_music_file(URL, "晴天", "周杰伦") == path
+    # 兜底发现的文件补登记到索引，下次直接命中
+    assert library_index.get_index().find_by_stem(download_music.DOWNLOAD_DIR, "晴天 - 周杰伦") == path.resolve()
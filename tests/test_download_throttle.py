@@ -0,0 +1,102 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cache_warmer
+import download_music
+import download_scheduler
+import response_classifier
+import tencent_music_seacrch as tencent
+
+
+class _ThrottleOnceHandler(BaseHTTPRequestHandler):
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        if type(self).requests_seen == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"ID3" + b"\x00" * 5000
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_throttle_wait_does_not_hold_a_transfer_slot(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottleOnceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/song.mp3"
+
+    monkeypatch.setattr(download_scheduler, "_default_scheduler", None)
+    scheduler = download_scheduler.get_scheduler()
+    breaker = response_classifier.get_breaker()
+    active_during_check = []
+    original_check = breaker.check
+
+    def check(check_url):
+        active_during_check.append(scheduler.stats()["active"])
+        original_check(check_url)
+
+    monkeypatch.setattr(breaker, "check", check)
+    try:
+        path = download_music.download_music_file(url, "晴天", "周杰伦")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert path and path.read_bytes().startswith(b"ID3")
+    assert _ThrottleOnceHandler.requests_seen == 2
+    assert active_during_check == [0, 0]  # 限流后的等待发生在归还传输槽之后
+
+
+class _ExpiredLinkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"<html>link expired</html>"
+        self.send_response(403)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/song.mp3"
+
+
+def test_vkeys_download_retries_after_throttle(monkeypatch):
+    monkeypatch.setattr(_ThrottleOnceHandler, "requests_seen", 0)
+    server, url = _serve(_ThrottleOnceHandler)
+    tencent.ensure_download_dir()
+    try:
+        digest = tencent.actual_download("晴天.mp3", url, 5000)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert digest and _ThrottleOnceHandler.requests_seen == 2
+
+
+def test_myfreemp3_expired_link_is_classified_not_saved(tmp_path):
+    server, url = _serve(_ExpiredLinkHandler)
+    scraper = cache_warmer.load_scraper_module().MyFreeMp3Scraper()
+    try:
+        path = scraper.download_music(url, "晴天.mp3", save_dir=str(tmp_path))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert path is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,57 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_replay
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Set-Cookie", "a=1; Path=/")
+        self.send_header("Set-Cookie", "b=2; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api?id=1"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, stream=False):
+    session = requests.Session()
+    response = session.get(url, stream=stream, timeout=5)
+    body = response.raw.read() if stream else response.content
+    return response.cookies.get_dict(), session.cookies.get_dict(), body
+
+
+def test_cookies_survive_record_and_replay(server_url, tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    live = fetch(server_url)
+    assert live[0] == live[1] == {"a": "1", "b": "2"}
+
+    with http_replay.recording(capture):
+        assert fetch(server_url) == live
+    with http_replay.replaying(capture):
+        assert fetch(server_url) == live
+        # 流式读取 raw 时同样得到完整的响应体
+        assert fetch(server_url, stream=True) == live
+
+
+def test_record_mode_keeps_raw_stream_readable(server_url, tmp_path):
+    with http_replay.recording(tmp_path / "capture.jsonl"):
+        assert fetch(server_url, stream=True) == fetch(server_url)
@@ -0,0 +1,65 @@
+import hashlib
+
+import pytest
+
+import integrity
+
+AUDIO = b"fLaC" + bytes(range(256)) * 40
+
+
+def feed(verifier, data, chunk_size=1000):
+    for start in range(0, len(data), chunk_size):
+        verifier.update(data[start:start + chunk_size])
+    return verifier.finish()
+
+
+@pytest.mark.parametrize("head, fmt", [
+    (b"ID3\x04", "mp3"), (b"\xff\xfb\x90", "mp3"), (b"fLaC", "flac"), (b"OggS", "ogg"),
+    (b"RIFF\x00\x00\x00\x00WAVE", "wav"), (b"\x00\x00\x00\x20ftypM4A ", "m4a"), (b"\xff\xf1\x50", "aac"),
+    (b"<!DOCTYPE html>", None), (b"", None),
+])
+def test_sniff_audio_format(head, fmt):
+    assert integrity.sniff_audio_format(head) == fmt
+
+
+def test_verifier_hashes_chunked_stream():
+    verifier = integrity.StreamVerifier(len(AUDIO))
+
+    assert feed(verifier, AUDIO) == hashlib.sha256(AUDIO).hexdigest()
+    assert verifier.detected_format == "flac"
+    assert verifier.bytes_seen == len(AUDIO)
+
+
+def test_short_download_fails_length_check():
+    with pytest.raises(integrity.IntegrityError, match="文件大小不匹配"):
+        feed(integrity.StreamVerifier(len(AUDIO) + 1), AUDIO)
+
+
+def test_oversized_download_fails_while_streaming():
+    verifier = integrity.StreamVerifier(len(AUDIO) - 1)
+    with pytest.raises(integrity.IntegrityError, match="超过 Content-Length"):
+        verifier.update(AUDIO)
+
+
+def test_error_page_is_rejected_before_the_whole_body_arrives():
+    verifier = integrity.StreamVerifier()
+    with pytest.raises(integrity.IntegrityError, match="不是可识别的音频格式"):
+        verifier.update(b"<html>" + b" " * integrity.SNIFF_BYTES)
+
+
+def test_short_file_is_sniffed_on_finish():
+    with pytest.raises(integrity.IntegrityError):
+        integrity.StreamVerifier().finish()
+    assert integrity.StreamVerifier(require_audio=False).finish() == hashlib.sha256(b"").hexdigest()
+
+    verifier = integrity.StreamVerifier()
+    verifier.update(b"ID3" + b"\x00" * 10)
+    verifier.finish()
+    assert verifier.detected_format == "mp3"
+
+
+def test_expected_length_ignores_compressed_bodies():
+    assert integrity.expected_length_from_headers({"Content-Length": "10"}) == 10
+    assert integrity.expected_length_from_headers({"Content-Length": "10", "Content-Encoding": "gzip"}) is None
+    assert integrity.expected_length_from_headers({"Content-Length": "abc"}) is None
+    assert integrity.expected_length_from_headers({}) is None
@@ -0,0 +1,27 @@
+import keyword_index
+
+ITEMS = [
+    {"id": 101, "name": "心跳", "artist": "王力宏"},
+    {"id": 102, "name": "Ｈｅａｒｔ Beat", "artist": "Leehom Wang"},
+    {"id": 103, "name": "心跳", "artist": "王力宏、卢巧音"},
+    {"name": "没有 id", "artist": "王力宏"},
+    "not a dict",
+]
+
+
+def test_keyword_search_is_normalized_and_ordered():
+    index = keyword_index.KeywordIndex(ITEMS)
+
+    assert [ordinal for ordinal, _ in index.search("力宏")] == [1, 3, 4]
+    assert [ordinal for ordinal, _ in index.search("heart")] == [2]  # 全角字母与大小写统一
+    assert [ordinal for ordinal, _ in index.search("心")] == [1, 3]
+    assert index.search("  ") == [] and index.search("跳王") == []  # 不跨字段匹配
+    assert index.search("力宏") is not index.search("力宏")  # 返回副本，调用方修改不影响缓存
+
+
+def test_keyword_query_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(keyword_index, "QUERY_CACHE_SIZE", 2)
+    index = keyword_index.KeywordIndex(ITEMS)
+    for query in ("心跳", "王力宏", "beat"):
+        index.search(query)
+    assert list(index._results) == ["王力宏", "beat"]
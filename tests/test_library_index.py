@@ -0,0 +1,14 @@
+import library_index
+
+
+def test_aac_with_converted_sibling_is_not_pending(tmp_path):
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    (downloads / "晴天 - 周杰伦.aac").write_bytes(b"\xff\xf1aac")
+    (downloads / "晴天 - 周杰伦.mp3").write_bytes(b"ID3")
+    (downloads / "稻香 - 周杰伦.aac").write_bytes(b"\xff\xf1aac")
+    index = library_index.get_index()
+
+    index.reconcile(downloads)
+
+    assert index.pending_conversions("aac", downloads) == [downloads / "稻香 - 周杰伦.aac"]
@@ -0,0 +1,59 @@
+import lrc_engine
+
+ORIGINAL = """[ti:晴天]
+[00:01.50][00:30.00]故事的小黄花
+[00:05.2]从出生那年就飘着
+[00:10.123]童年的荡秋千
+"""
+TRANSLATION = """[00:01.60]The little yellow flower of the story
+[00:05.20]//
+[00:12.00]Swing of childhood
+"""
+
+
+def test_parse_lrc_sorts_repeated_tags_and_scales_fractions():
+    lyric = lrc_engine.parse_lrc(ORIGINAL)
+
+    assert list(lyric) == [(1500, "故事的小黄花"), (5200, "从出生那年就飘着"),
+                           (10123, "童年的荡秋千"), (30000, "故事的小黄花")]
+    assert lyric.tags == {"ti": "晴天"}
+    assert lyric.line_at(0) == -1
+    assert lyric.line(lyric.line_at(6000)) == "从出生那年就飘着"
+
+
+def test_offset_tag_shifts_lines_earlier():
+    lyric = lrc_engine.parse_lrc("[offset:500]\n[00:01.00]a\n[00:00.20]b\n")
+
+    assert list(lyric) == [(0, "b"), (500, "a")]
+    assert "offset" not in lyric.tags
+
+
+def test_merge_aligns_within_tolerance_and_skips_empty_translations():
+    merged = lrc_engine.parse_lrc(ORIGINAL).merge(lrc_engine.parse_lrc(TRANSLATION))
+
+    assert list(merged) == [(1500, "故事的小黄花"), (1500, "The little yellow flower of the story"),
+                            (5200, "从出生那年就飘着"),
+                            # 译文与原文相差 1.877 秒，超出 MERGE_TOLERANCE_MS，不视为同一句
+                            (10123, "童年的荡秋千"),
+                            (30000, "故事的小黄花")]
+
+    inline = lrc_engine.parse_lrc(ORIGINAL).merge(lrc_engine.parse_lrc(TRANSLATION), separator=" / ")
+    assert inline.line(0) == "故事的小黄花 / The little yellow flower of the story"
+    assert len(inline) == 4
+
+
+def test_shift_never_goes_below_zero_and_keeps_original():
+    lyric = lrc_engine.parse_lrc(ORIGINAL)
+    shifted = lyric.shift(-2000)
+
+    assert list(shifted.times) == [0, 3200, 8123, 28000]
+    assert list(lyric.times) == [1500, 5200, 10123, 30000]
+    assert lrc_engine.merge_texts(ORIGINAL, "", offset_ms=1000).splitlines()[1] == "[00:02.50]故事的小黄花"
+
+
+def test_parse_yrc_keeps_word_timings():
+    lyric = lrc_engine.parse_yrc("[2000,800](2000,300,0)晴(2300,500,0)天\n[1000,900](1000,900,0)前奏\n")
+
+    assert list(lyric) == [(1000, "前奏"), (2000, "晴天")]
+    assert lyric.end_time(1) == 2800
+    assert lyric.to_lrc(enhanced=True).splitlines()[1] == "[00:02.00]<00:02.00>晴<00:02.30>天"
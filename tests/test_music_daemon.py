@@ -0,0 +1,51 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import music_cli
+import music_daemon
+import progress
+import tencent_music_seacrch as tencent
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_vkeys_query_is_handed_to_a_running_daemon(monkeypatch):
+    monkeypatch.setattr(progress, "_default_tracker", None)
+    port = _free_port()
+    monkeypatch.setenv(music_daemon.URL_ENV, f"http://127.0.0.1:{port}")
+    song = {"id": 97773, "song": "晴天", "singer": "周杰伦"}
+    downloaded = []
+
+    def download_vkeys_song(selected, timings=None):
+        downloaded.append(selected["id"])
+        return {"status": tencent.STATUS_OK, "path": "晴天 - 周杰伦_97773.flac", "sha256": None,
+                "lyrics": False, "cached": False}
+
+    monkeypatch.setattr(tencent, "search_music", lambda query: [song])
+    monkeypatch.setattr(tencent, "download_vkeys_song", download_vkeys_song)
+    thread = threading.Thread(target=music_daemon.serve, kwargs={"port": port, "workers": 1}, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not music_daemon.is_running() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    try:
+        assert music_cli.run_command("vkeys", ["晴天-周杰伦"]) == 0
+    finally:
+        music_daemon._request("/shutdown", {})
+        thread.join(5)
+
+    assert downloaded == [97773]
+
+
+def test_opt_out_skips_the_daemon_probe(monkeypatch):
+    monkeypatch.setenv(music_daemon.OPT_OUT_ENV, "0")
+    monkeypatch.setattr(music_daemon, "is_running", lambda url=None: pytest.fail("MUSIC_DAEMON=0 时不应探测守护进程"))
+
+    assert music_daemon.try_remote("download", "晴天-周杰伦", "vkeys") is None
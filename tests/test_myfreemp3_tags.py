@@ -0,0 +1,60 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cache_warmer
+from test_tagging import FLAC_DATA
+
+COVER = b"\xff\xd8\xff\xe0" + b"\x00" * 200
+LYRICS = "[00:01.00]故事的小黄花"
+
+
+class _MyFreeMp3Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        # 与 myfreemp3 搜索接口返回的条目字段一致
+        item = {"songid": "186016", "title": "晴天", "author": "周杰伦", "al_name": "叶惠美",
+                "pic": f"{base}/cover.jpg", "lrc": LYRICS,
+                "url_128": f"{base}/song.flac", "url_320": f"{base}/song.flac"}
+        self._send(json.dumps({"code": 200, "data": {"list": [item]}}).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if self.path == "/cover.jpg":
+            self._send(COVER, "image/jpeg")
+        else:
+            self._send(FLAC_DATA, "audio/flac")
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_search_item_fields_reach_the_file_tags(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MyFreeMp3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    module = cache_warmer.load_scraper_module()
+    scraper = module.MyFreeMp3Scraper()
+    scraper.base_url = f"{base}/"
+    try:
+        item = scraper.search_music_raw("晴天", target_count=1)[0]
+        path = scraper.download_music(f"{base}/song.flac", "晴天 - 周杰伦_186016.mp3", save_dir=str(tmp_path),
+                                      tags=module.download_tags(item))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert item["album"] == "叶惠美" and item["lyrics"] == LYRICS
+    assert path.endswith(".flac")
+    data = open(path, "rb").read()
+    assert "ALBUM=叶惠美".encode("utf-8") in data
+    assert f"LYRICS={LYRICS}".encode("utf-8") in data
+    assert COVER in data
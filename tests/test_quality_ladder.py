@@ -0,0 +1,116 @@
+import types
+from unittest import mock
+
+import requests
+
+import quality_ladder
+import search_cache
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def json(self):
+        if isinstance(self._payload, Exception):
+            raise self._payload
+        return self._payload
+
+
+class FakeSession:
+    """按等级返回预设结果的会话；结果是异常时抛出。记录每个等级被请求的次数。"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        level = params["level"]
+        self.calls.append(level)
+        answer = self.answers[level]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def ok(level, actual=None):
+    return FakeResponse({"status": 200, "level": actual or level, "url": f"https://cdn/{level}.flac", "size": 1000})
+
+
+def test_transient_errors_are_not_cached_as_unavailable():
+    session = FakeSession({
+        "hires": requests.exceptions.ConnectTimeout("timeout"),
+        "lossless": FakeResponse({}, status_code=502),
+        "exhigh": FakeResponse(ValueError("not json")),
+        "standard": FakeResponse({"status": 404, "msg": "no url"}),
+    })
+    ladder = quality_ladder.QualityLadder(session=session)
+
+    assert ladder.resolve("1") is None
+    levels = search_cache.get_cache().get_levels(quality_ladder.PROVIDER, "1")
+    # 只有接口明确答复"没有链接"的等级被记为不可用
+    assert levels == {"standard": {"available": False, "actual_level": None, "size": None}}
+
+    # 下一次照常查询出错过的等级，而不是因为全部被拉黑而直接返回 None
+    session.answers.update({"hires": ok("hires"), "lossless": ok("lossless"), "exhigh": ok("exhigh")})
+    session.calls.clear()
+    result = ladder.resolve("1")
+    assert result["level"] == "hires" and not result["from_cache"]
+    assert sorted(session.calls) == ["exhigh", "hires", "lossless"]
+
+
+def test_silent_downgrade_is_recorded_as_unavailable():
+    session = FakeSession({"hires": ok("hires", actual="lossless"), "lossless": ok("lossless"),
+                           "exhigh": ok("exhigh"), "standard": ok("standard")})
+    result = quality_ladder.QualityLadder(session=session).resolve("2")
+
+    assert result["level"] == "lossless"
+    levels = search_cache.get_cache().get_levels(quality_ladder.PROVIDER, "2")
+    assert levels["hires"]["available"] is False
+    assert levels["hires"]["actual_level"] == "lossless"
+    assert levels["lossless"]["available"] is True
+
+
+def test_known_level_with_cached_url_sends_no_request():
+    session = FakeSession({level: ok(level) for level in quality_ladder.DEFAULT_LADDER})
+    ladder = quality_ladder.QualityLadder(session=session)
+    ladder.resolve("3")
+    session.calls.clear()
+
+    result = ladder.resolve("3")
+    assert result == {"level": "hires", "url": "https://cdn/hires.flac", "size": 1000, "from_cache": True}
+    assert session.calls == []
+
+
+def test_url_cached_without_level_row_is_reused():
+    # get_download_link_from_byfuns 只写直链缓存，不写 levels 表
+    search_cache.get_cache().put_url(quality_ladder.PROVIDER, "4", "lossless", "https://cdn/warm.flac")
+    session = FakeSession({"hires": FakeResponse({"status": 404})})
+
+    result = quality_ladder.QualityLadder(session=session).resolve("4")
+    assert result == {"level": "lossless", "url": "https://cdn/warm.flac", "size": None, "from_cache": True}
+    # 只查询比缓存等级更好的未知等级
+    assert session.calls == ["hires"]
+
+
+def test_cache_warmer_records_levels_for_interactive_downloads():
+    import cache_warmer
+
+    session = FakeSession({level: ok(level) for level in quality_ladder.DEFAULT_LADDER})
+    scraper = types.SimpleNamespace(session=session, byfuns_api_url=quality_ladder.BYFUNS_API_URL,
+                                    search_music_raw=lambda keyword, target_count: [{"songid": "5"}])
+    module = types.SimpleNamespace(find_strict_match=lambda title, artist, results: results[0])
+    bucket = cache_warmer.TokenBucket(rate=1000, capacity=1000)
+    with mock.patch.object(cache_warmer, "fetch_hot_keywords", return_value=["晴天"]):
+        stats = cache_warmer.warm_once(scraper, module, bucket)
+    assert stats["resolved"] == 1
+
+    session.calls.clear()
+    result = quality_ladder.QualityLadder(session=session).resolve("5")
+    assert result["level"] == "hires" and result["from_cache"]
+    assert session.calls == []
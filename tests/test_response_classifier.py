@@ -0,0 +1,69 @@
+import pytest
+
+import response_classifier as rc
+
+HTML = {"Content-Type": "text/html; charset=utf-8"}
+JSON = {"Content-Type": "application/json"}
+AUDIO = {"Content-Type": "audio/flac"}
+
+
+@pytest.mark.parametrize("status, headers, head, expect, redirects, label", [
+    (200, JSON, b'{"code": 200}', rc.EXPECT_JSON, (), rc.OK),
+    (200, HTML, b"<html>search results</html>", rc.EXPECT_HTML, (), rc.OK),
+    (200, AUDIO, b"", rc.EXPECT_AUDIO, (), rc.OK),
+    (429, JSON, b"", rc.EXPECT_JSON, (), rc.THROTTLED),
+    (200, JSON, '{"msg": "请 3 秒后再试。"}'.encode(), rc.EXPECT_JSON, (), rc.THROTTLED),
+    (200, HTML, b"<html>login</html>", rc.EXPECT_JSON, (), rc.ANTI_BOT),
+    (200, HTML, "<html>请完成人机验证</html>".encode(), rc.EXPECT_HTML, (), rc.ANTI_BOT),
+    (200, HTML, b"<html></html>", rc.EXPECT_HTML, ("https://site/verify?from=/s/x",), rc.ANTI_BOT),
+    (403, JSON, b"", rc.EXPECT_JSON, (), rc.ANTI_BOT),
+    (403, AUDIO, b"", rc.EXPECT_AUDIO, (), rc.EXPIRED_LINK),
+    (200, HTML, b"", rc.EXPECT_AUDIO, (), rc.EXPIRED_LINK),
+    (503, HTML, b"<html>captcha</html>", rc.EXPECT_JSON, (), rc.ANTI_BOT),
+    (502, JSON, b"", rc.EXPECT_JSON, (), rc.DEAD_ENDPOINT),
+    (500, AUDIO, b"", rc.EXPECT_AUDIO, (), rc.DEAD_ENDPOINT),
+])
+def test_classify(status, headers, head, expect, redirects, label):
+    assert rc.classify(status, headers, head, expect, redirects).label == label
+
+
+def test_throttle_wait_comes_from_retry_after_or_body_hint():
+    assert rc.classify(429, {"Retry-After": "7"}).wait == 7.0
+    assert rc.classify(503, {"Retry-After": "2"}).label == rc.THROTTLED
+    assert rc.classify(429, {}).wait == rc.DEFAULT_THROTTLE_WAIT
+    assert rc.classify(200, JSON, "请 12 秒后再试".encode()).wait == 12.0
+    assert rc.retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert rc.retry_after("soon") is None
+
+
+def test_search_keyword_in_request_url_is_not_an_anti_bot_redirect():
+    # 只看重定向目标，不看请求本身；没有重定向时 redirects 为空
+    assert rc.classify(200, HTML, b"<html></html>", rc.EXPECT_HTML, ()).label == rc.OK
+
+
+def test_breaker_opens_after_threshold_and_resets_on_success():
+    breaker = rc.CircuitBreaker(threshold=2, cooldown=60)
+    dead = rc.Verdict(rc.DEAD_ENDPOINT)
+    url = "https://api.example/x"
+
+    breaker.record(url, dead)
+    breaker.record(url, rc.Verdict(rc.OK))
+    breaker.record(url, dead)
+    assert not breaker.is_open(url)
+    breaker.record(url, dead)
+    assert breaker.is_open(url) and not breaker.is_open("https://other.example/")
+    with pytest.raises(rc.CircuitOpenError):
+        breaker.check(url)
+
+    breaker.reset(url)
+    breaker.check(url)
+
+
+def test_breaker_pause_is_capped(monkeypatch):
+    breaker = rc.CircuitBreaker()
+    sleeps = []
+    monkeypatch.setattr(rc.time, "sleep", sleeps.append)
+
+    breaker.record("https://api.example/", rc.Verdict(rc.THROTTLED, 10 ** 6))
+    breaker.check("https://api.example/")
+    assert len(sleeps) == 1 and 0 < sleeps[0] <= rc.MAX_THROTTLE_WAIT
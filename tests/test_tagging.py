@@ -0,0 +1,31 @@
+import tagging
+
+# 最小的 FLAC：fLaC + 最后一个元数据块 STREAMINFO（34 字节）+ 音频帧数据
+FLAC_DATA = b"fLaC" + bytes([0x80, 0, 0, 34]) + b"\x00" * 34 + b"\xff\xf8audio-frames" * 100
+TAGS = {"title": "晴天", "artist": "周杰伦"}
+
+
+def test_flac_content_named_mp3_is_left_untouched(tmp_path):
+    path = tmp_path / "晴天.mp3"
+    path.write_bytes(FLAC_DATA)
+
+    assert tagging.tag_file(path, TAGS) is False
+    assert path.read_bytes() == FLAC_DATA
+
+
+def test_writer_follows_content_format(tmp_path):
+    path = tmp_path / "晴天.flac"
+    path.write_bytes(FLAC_DATA)
+
+    assert tagging.tag_file(path, TAGS) is True
+    data = path.read_bytes()
+    assert data.startswith(b"fLaC") and "TITLE=晴天".encode("utf-8") in data
+    assert data.endswith(FLAC_DATA[8 + 34:])
+
+
+def test_known_format_skips_sniffing(tmp_path):
+    path = tmp_path / "晴天.flac"
+    path.write_bytes(FLAC_DATA)
+
+    assert tagging.tag_file(path, TAGS, audio_format="mp3") is False
+    assert path.read_bytes() == FLAC_DATA
@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lyrics_cache
+import tencent_music_seacrch as tencent
+from test_tagging import FLAC_DATA
+
+
+def test_multi_select_falls_back_to_threads_without_aiohttp(monkeypatch):
+    # sys.modules 中的 None 让 import vkeys_async 抛出 ImportError，与未安装 aiohttp 时相同
+    monkeypatch.setitem(sys.modules, "vkeys_async", None)
+    downloaded = []
+
+    def fake_download(song):
+        downloaded.append(song["id"])
+        return song["id"] != 2
+
+    monkeypatch.setattr(tencent, "download_single_song", fake_download)
+    songs = [{"id": 1}, {"id": 2}, {"id": 3}]
+
+    assert tencent.download_selected(songs, concurrency=2) == 2
+    assert sorted(downloaded) == [1, 2, 3]
+
+
+class _VkeysHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append(self.path.split("?")[0])
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        if self.path.startswith("/geturl"):
+            self._send(json.dumps({"code": 200, "data": {"url": f"{base}/song.flac", "size": "1MB"}}).encode())
+        elif self.path.startswith("/lyric"):
+            self._send(json.dumps({"code": 200, "data": {"lrc": "[00:01.00]故事的小黄花"}}).encode())
+        else:
+            self._send(FLAC_DATA)
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_download_vkeys_song_then_reuse_from_store(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _VkeysHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tencent, "BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    tencent.ensure_download_dir()
+    song = {"id": 97773, "song": "晴天", "singer": "周杰伦", "album": "叶惠美"}
+    timings = {}
+    try:
+        first = tencent.download_vkeys_song(song, timings)
+        os.remove(first["path"])
+        second = tencent.download_vkeys_song(song)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert first["status"] == tencent.STATUS_OK and not first["cached"] and first["lyrics"]
+    assert "ALBUM=叶惠美".encode("utf-8") in open(second["path"], "rb").read()
+    assert second["cached"] and second["status"] == tencent.STATUS_OK
+    assert set(timings) == {"resolve", "download"}
+    assert _VkeysHandler.requests_seen.count("/geturl") == 1  # 第二次直接从内容仓库链接
+
+
+def test_lyrics_cache_error_does_not_fail_the_download(monkeypatch):
+    def broken(self, provider, songid, fetcher):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(lyrics_cache.LyricsCache, "get_or_fetch", broken)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _VkeysHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tencent, "BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    tencent.ensure_download_dir()
+    try:
+        result = tencent.download_vkeys_song({"id": 1, "song": "晴天", "singer": "周杰伦"})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result["status"] == tencent.STATUS_OK and not result["lyrics"]
+    assert os.path.exists(result["path"])
@@ -0,0 +1,267 @@
+"""
+vkeys 腾讯音乐接口 (api.vkeys.cn/v2/music/tencent) 的 asyncio 客户端。
+
+所有请求共用一个 aiohttp 会话（连接池 + DNS 缓存），每类请求都有明确的超时：
+    接口请求 (搜索 / geturl / 歌词)  总计 15 秒，连接 5 秒
+    文件下载                         连接 10 秒，两次读取之间最长 30 秒（不限总时长）
+
+download_many() 在信号量限制下并发处理多首歌曲；每首歌的 geturl 与歌词请求同时发出，
+结果按完成顺序逐条回调，供 tencent_music_seacrch.py 的多选下载使用。
+文件下载、内容仓库、歌词缓存和标签写入的行为与同步版本 download_vkeys_song 保持一致：
+接口地址、下载目录和下载后的收尾（写标签、收入仓库、保存歌词）直接复用 tencent_music_seacrch 中的定义，
+写文件与校验使用 file_sink.ChunkWriter 和 integrity.StreamVerifier，在每次下载专用的写线程中执行。
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+import content_store
+import download_scheduler
+import file_sink
+import integrity
+import lyrics_cache
+import progress
+import tencent_music_seacrch as tencent
+
+# --- 配置 ---
+API_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=30)
+CONNECTION_LIMIT = 20
+CONNECTION_LIMIT_PER_HOST = 8
+DEFAULT_CONCURRENCY = 3
+
+# 结果状态
+STATUS_OK = "ok"
+STATUS_CACHED = "cached"
+STATUS_NO_URL = "no_url"
+STATUS_DOWNLOAD_FAILED = "download_failed"
+STATUS_ERROR = "error"
+
+
+class VkeysClient:
+    """
+    共享连接的异步客户端，需在 async with 中使用:
+
+        async with VkeysClient() as client:
+            songs = await client.search("晴天 周杰伦")
+    """
+
+    def __init__(self, limit=CONNECTION_LIMIT, limit_per_host=CONNECTION_LIMIT_PER_HOST):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self._limit, limit_per_host=self._limit_per_host, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _get_data(self, path, params):
+        """请求接口并取出 data 字段；网络错误、超时或接口报错时返回 None。"""
+        try:
+            async with self._session.get(f"{tencent.BASE_URL}{path}", params=params, timeout=API_TIMEOUT) as response:
+                response.raise_for_status()
+                result = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+        if result.get("code") == 200 and result.get("data"):
+            return result["data"]
+        return None
+
+    async def search(self, query):
+        """搜索歌曲，返回前 10 条结果。"""
+        data = await self._get_data("", {"word": query.replace('-', ' ').strip()})
+        return data[:10] if data else None
+
+    async def get_song_url(self, song_id):
+        """获取歌曲详情与播放链接。"""
+        return await self._get_data("/geturl", {"id": song_id})
+
+    async def get_song_lyrics(self, song_id):
+        """获取歌词（lrc / trans / yrc）。"""
+        return await self._get_data("/lyric", {"id": song_id})
+
+    async def download(self, url, save_path):
+        """
+        流式下载到 save_path，边写边校验，校验通过后才从 .part 改名。
+
+        Returns:
+            str: 文件的 SHA-256。
+
+        Raises:
+            aiohttp.ClientError / asyncio.TimeoutError / integrity.IntegrityError
+        """
+        part_path = f"{save_path}.part"
+        # 与同步下载器共用全局下载调度器的传输槽；申请会阻塞，放到线程中等待
+        scheduler = download_scheduler.get_scheduler()
+        acquiring = asyncio.ensure_future(asyncio.to_thread(scheduler.acquire, url))
+        try:
+            transfer = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # 等待期间被取消：线程里的申请仍会完成，拿到后立即归还，避免传输槽泄漏
+            acquiring.add_done_callback(lambda f: f.cancelled() or f.exception() or scheduler.release(f.result()))
+            raise
+        # 打开、预分配、写入（含哈希）、截断和关闭都交给一个专用的写线程按顺序执行，不阻塞事件循环；
+        # 只有一个线程，被取消时尚未完成的写入也一定排在截断和关闭之前
+        loop = asyncio.get_running_loop()
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vkeys-writer")
+
+        def in_writer(func, *args, **kwargs):
+            return loop.run_in_executor(writer, functools.partial(func, *args, **kwargs))
+
+        try:
+            async with self._session.get(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                verifier = integrity.StreamVerifier(integrity.expected_length_from_headers(response.headers))
+                tracked = progress.get_tracker().start_file(os.path.basename(save_path), verifier.expected_length)
+                with tracked as handle:
+                    f = await in_writer(open, part_path, 'wb')
+                    try:
+                        sink = await in_writer(file_sink.ChunkWriter, f, verifier=verifier, transfer=transfer,
+                                               progress=handle.add)
+                        try:
+                            # iter_any() 的块通常很小，攒到 sink.chunk_size 再整块交给写线程
+                            buffer = bytearray()
+                            async for chunk in response.content.iter_any():
+                                buffer += chunk
+                                if len(buffer) >= sink.chunk_size:
+                                    await in_writer(sink.write, buffer)
+                                    buffer = bytearray()
+                            if buffer:
+                                await in_writer(sink.write, buffer)
+                        finally:
+                            await in_writer(sink.close)
+                        sink.finish(download_scheduler.host_of(url))
+                        digest = await in_writer(verifier.finish)
+                    finally:
+                        await in_writer(f.close)
+            os.replace(part_path, save_path)
+            return digest
+        finally:
+            writer.shutdown(wait=False)
+            scheduler.release(transfer)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+
+async def fetch_lyrics(client, song_id):
+    """
+    先查歌词缓存，未命中再请求接口并写回缓存。
+
+    歌词只是附带的：歌词缓存出错（例如 SQLite 被锁）时按没有歌词处理，不影响已经下载好的歌曲。
+    """
+    cache = lyrics_cache.get_cache()
+    try:
+        cached = await asyncio.to_thread(cache.get, "vkeys", song_id)
+        if cached is not None:
+            return cached
+        data = await client.get_song_lyrics(song_id)
+        if data:
+            await asyncio.to_thread(cache.put, "vkeys", song_id, data)
+        return data
+    except Exception as e:
+        print(f"⚠️ 获取歌词失败 (ID: {song_id})，按无歌词处理: {e}")
+        return None
+
+
+async def download_song(client, song):
+    """
+    处理单首歌曲：查内容仓库 → (geturl ‖ 歌词) → 下载 → 写标签 → 收入仓库 → 保存歌词。
+
+    Returns:
+        dict: {"song", "singer", "id", "status", "path", "lyrics", "elapsed", "error"}
+    """
+    started = time.perf_counter()
+    song_id = song['id']
+    file_name_base = f"{song['song']} - {song['singer']}_{song_id}"
+    save_path = os.path.join(tencent.DOWNLOAD_DIR, f"{file_name_base}.flac")
+    result = {"song": song['song'], "singer": song['singer'], "id": song_id, "status": STATUS_OK,
+              "path": None, "lyrics": False, "error": None}
+
+    lyrics_task = asyncio.create_task(fetch_lyrics(client, song_id))
+    store = content_store.get_store()
+    cached_path = await asyncio.to_thread(store.materialize, "vkeys", song_id, "flac",
+                                          tencent.DOWNLOAD_DIR, file_name_base)
+
+    if cached_path:
+        lyrics_data = await lyrics_task
+        result.update(status=STATUS_CACHED, path=str(cached_path))
+        if lyrics_data:
+            result["lyrics"] = await asyncio.to_thread(tencent.save_lyrics, file_name_base, lyrics_data)
+        result["elapsed"] = time.perf_counter() - started
+        return result
+
+    details = await client.get_song_url(song_id)
+    if not (details and details.get('url')):
+        lyrics_task.cancel()
+        result.update(status=STATUS_NO_URL, elapsed=time.perf_counter() - started)
+        return result
+    try:
+        digest = await client.download(details['url'], save_path)
+    except (aiohttp.ClientError, asyncio.TimeoutError, integrity.IntegrityError, OSError) as e:
+        lyrics_task.cancel()
+        result.update(status=STATUS_DOWNLOAD_FAILED, error=str(e) or type(e).__name__,
+                      elapsed=time.perf_counter() - started)
+        return result
+
+    # 写标签 → 收入仓库 → 保存歌词，与同步版本共用 tencent.finish_vkeys_song
+    lyrics_data = await lyrics_task
+    finished = await asyncio.to_thread(tencent.finish_vkeys_song, song, file_name_base, digest, lyrics_data)
+    result.update(path=finished["path"], lyrics=finished["lyrics"], elapsed=time.perf_counter() - started)
+    return result
+
+
+async def download_many(songs, limit=DEFAULT_CONCURRENCY, on_result=None):
+    """
+    并发下载多首歌曲，同时进行的数量不超过 limit。
+
+    Args:
+        on_result (callable): 每首歌完成时调用 on_result(result, 已完成数, 总数)，按完成顺序。
+
+    Returns:
+        list: 按完成顺序排列的结果。
+    """
+    os.makedirs(tencent.DOWNLOAD_DIR, exist_ok=True)
+    semaphore = asyncio.Semaphore(limit)
+    results = []
+
+    async with VkeysClient() as client:
+        async def run(song):
+            async with semaphore:
+                try:
+                    return await download_song(client, song)
+                except Exception as e:
+                    return {"song": song.get('song'), "singer": song.get('singer'), "id": song.get('id'),
+                            "status": STATUS_ERROR, "path": None, "lyrics": False, "error": str(e), "elapsed": 0.0}
+
+        tasks = [asyncio.create_task(run(song)) for song in songs]
+        for future in asyncio.as_completed(tasks):
+            result = await future
+            results.append(result)
+            if on_result:
+                on_result(result, len(results), len(tasks))
+    return results
+
+
+def print_result(result, done, total):
+    """默认的进度回调：每完成一首打印一行。"""
+    icons = {STATUS_OK: "✅", STATUS_CACHED: "♻️"}
+    icon = icons.get(result["status"], "❌")
+    line = f"[{done}/{total}] {icon} {result['song']} - {result['singer']} ({result.get('elapsed', 0):.1f}s)"
+    if result["status"] in (STATUS_OK, STATUS_CACHED):
+        line += f" → {result['path']}" + ("" if result["lyrics"] else "（无歌词）")
+    else:
+        line += f" {result['status']}" + (f": {result['error']}" if result.get("error") else "")
+    print(line)
+
+
+def run_downloads(songs, limit=DEFAULT_CONCURRENCY, on_result=print_result):
+    """同步入口：并发下载并返回结果列表。"""
+    return asyncio.run(download_many(songs, limit, on_result))
@@ -0,0 +1,247 @@
+"""
+上游接口信封的解析与 id 提取。
+
+工作流传给各清洗脚本的都是同一种信封:
+    {"status_code": 200, "body": "<JSON 数组字符串>", "headers": {...}, "files": []}
+原先每次查询都要对 body 重新 json.loads 一遍。这里把 body 只解析一次，
+按 body 的 SHA-256 缓存解析结果（进程内 LRU），之后的按序号 / 按歌名歌手 / 全部 id 查询都直接读缓存。
+
+body 用 orjson 解析（未安装时退回标准库 json）：一次扫描直接从字符串构造对象，不经过中间副本。
+body 也可以已经是列表（上游已解析过的情况），此时不做解析。
+
+用法:
+    from body_cache import get_body
+    parsed = get_body(envelope)
+    parsed.nth_id(2)
+    parsed.ids_by(name="心跳", artist="王力宏")
+    parsed.search("力宏")
+    run_queries(envelope, [{"nth": 1}, {"nth": 3}, {"name": "心跳"}, {"all": True}])
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from keyword_index import KeywordIndex
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+# --- 配置 ---
+MAX_CACHED_BODIES = 64
+ARTIST_SEPARATORS = (",", "，", "/", "&", "、")
+
+
+class EnvelopeError(ValueError):
+    """信封或 body 的结构不符合预期。"""
+
+
+def _normalize(text) -> str:
+    return str(text or "").strip().lower()
+
+
+def _split_artists(artist) -> set:
+    text = _normalize(artist)
+    for sep in ARTIST_SEPARATORS:
+        text = text.replace(sep, ",")
+    return {part.strip() for part in text.split(",") if part.strip()}
+
+
+def parse_body_text(body):
+    """把 body 字符串 / 字节解析为列表；已经是列表时原样返回。"""
+    if isinstance(body, list):
+        return body
+    if not body:
+        raise EnvelopeError("数据中缺少 'body' 字段或其值为空。")
+    try:
+        items = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as e:  # orjson.JSONDecodeError / json.JSONDecodeError 都是 ValueError 的子类
+        raise EnvelopeError(f"解析body字符串失败，它不是一个有效的JSON格式。详细信息: {e}") from e
+    if not isinstance(items, list):
+        raise EnvelopeError("'body'字段解析后不是一个列表。")
+    return items
+
+
+class ParsedBody:
+    """解析后的 body 以及在其上的查询。items 保持原始顺序，序号从 1 开始。"""
+
+    def __init__(self, items):
+        self.items = items
+        self._by_name = None
+        self._index = None
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def index(self) -> KeywordIndex:
+        """歌名 / 歌手的子串索引，第一次使用时构建，随 ParsedBody 一起缓存。"""
+        if self._index is None:
+            self._index = KeywordIndex(self.items)
+        return self._index
+
+    def search(self, keyword):
+        """歌名或歌手中包含 keyword 的元素，返回 [(原始序号, 元素), ...]。"""
+        return self.index.search(keyword)
+
+    def nth_id(self, n):
+        """
+        获取第 n 个元素的 'id'。
+
+        Args:
+            n (int): 元素序号（从1开始计数）。
+        Raises:
+            EnvelopeError: 序号无效、越界，或该元素没有 'id'。
+        """
+        if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+            raise EnvelopeError("序号必须是一个正整数（从1开始）。")
+        if n > len(self.items):
+            raise EnvelopeError(f"body数组中只有 {len(self.items)} 个元素，无法获取第 {n} 个元素。")
+        item = self.items[n - 1]
+        item_id = item.get("id") if isinstance(item, dict) else None
+        if item_id is None:
+            raise EnvelopeError(f"body数组中的第 {n} 个元素没有找到 'id' 键。")
+        return item_id
+
+    def nth_ids(self, ns):
+        """批量按序号取 id；单个序号出错时该位置为 None。"""
+        ids = []
+        for n in ns:
+            try:
+                ids.append(self.nth_id(n))
+            except EnvelopeError:
+                ids.append(None)
+        return ids
+
+    def all_ids(self):
+        return [item.get("id") for item in self.items if isinstance(item, dict) and item.get("id") is not None]
+
+    def ids_by(self, name=None, artist=None):
+        """
+        按歌名（忽略大小写的完全匹配）和 / 或歌手（多歌手字段中任一匹配）查找 id，按原始顺序返回。
+        """
+        if self._by_name is None:
+            by_name = {}
+            for ordinal, item in enumerate(self.items, 1):
+                if isinstance(item, dict):
+                    by_name.setdefault(_normalize(item.get("name")), []).append(ordinal)
+            self._by_name = by_name
+
+        if name is not None:
+            ordinals = self._by_name.get(_normalize(name), [])
+        else:
+            ordinals = range(1, len(self.items) + 1)
+        wanted_artist = _normalize(artist) if artist is not None else None
+
+        ids = []
+        for ordinal in ordinals:
+            item = self.items[ordinal - 1]
+            if not isinstance(item, dict) or item.get("id") is None:
+                continue
+            if wanted_artist is not None and wanted_artist not in _split_artists(item.get("artist")) \
+                    and wanted_artist != _normalize(item.get("artist")):
+                continue
+            ids.append(item["id"])
+        return ids
+
+
+class BodyCache:
+    """按 body 内容哈希缓存 ParsedBody 的 LRU。"""
+
+    def __init__(self, max_entries=MAX_CACHED_BODIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(body) -> str:
+        data = body.encode("utf-8") if isinstance(body, str) else bytes(body)
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, body) -> ParsedBody:
+        """返回 body（字符串 / 字节 / 列表）对应的 ParsedBody；同一内容只解析一次。"""
+        if isinstance(body, list):
+            return ParsedBody(body)
+        if not body:
+            raise EnvelopeError("数据中缺少 'body' 字段或其值为空。")
+        key = self._key(body)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                return parsed
+        parsed = ParsedBody(parse_body_text(body))
+        with self._lock:
+            self._entries[key] = parsed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> BodyCache:
+    """返回进程内共享的默认缓存。"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = BodyCache()
+        return _default_cache
+
+
+def get_body(envelope) -> ParsedBody:
+    """
+    从信封中取出并解析 body（带缓存）。
+
+    Args:
+        envelope: 完整信封 dict，或直接是 body 字符串 / 已解析的列表。
+    """
+    if isinstance(envelope, dict):
+        status = envelope.get("status_code")
+        if isinstance(status, int) and not 200 <= status < 300:
+            raise EnvelopeError(f"上游返回了错误状态码: {status}")
+        body = envelope.get("body")
+    else:
+        body = envelope
+    return get_cache().get(body)
+
+
+def run_queries(envelope, queries):
+    """
+    在同一个 body 上执行一批查询。
+
+    Args:
+        queries (list): 每项为以下之一:
+            {"nth": 3}                               第 3 个元素的 id
+            {"nth": [1, 2, 5]}                       多个序号
+            {"name": "心跳", "artist": "王力宏"}      按歌名 / 歌手查找（两者可只给一个）
+            {"all": true}                            全部 id
+    Returns:
+        list: 与 queries 一一对应的结果，{"id": ...} / {"ids": [...]} / {"error": "..."}。
+    """
+    parsed = get_body(envelope)
+    results = []
+    for query in queries:
+        try:
+            if not isinstance(query, dict):
+                raise EnvelopeError("查询必须是 JSON 对象。")
+            if "nth" in query:
+                nth = query["nth"]
+                results.append({"ids": parsed.nth_ids(nth)} if isinstance(nth, list) else {"id": parsed.nth_id(nth)})
+            elif query.get("all"):
+                results.append({"ids": parsed.all_ids()})
+            elif "name" in query or "artist" in query:
+                results.append({"ids": parsed.ids_by(query.get("name"), query.get("artist"))})
+            else:
+                raise EnvelopeError(f"无法识别的查询: {query}")
+        except EnvelopeError as e:
+            results.append({"error": str(e)})
+    return results
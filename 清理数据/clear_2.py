@@ -1,4 +1,4 @@
-import json
+from body_cache import EnvelopeError, get_body
 
 # 原始数据
 data = {
@@ -21,20 +21,12 @@ data = {
 
 def parse_body_content(data_dict):
     """
-    解析数据字典中的 'body' 字符串为 Python 列表。
+    解析数据字典中的 'body' 字符串为 Python 列表（通过 body_cache，同一 body 只解析一次）。
     """
-    body_string = data_dict.get('body')
-    if not body_string:
-        print("错误：数据中缺少 'body' 字段或其值为空。")
-        return None
     try:
-        body_list = json.loads(body_string)
-        if not isinstance(body_list, list):
-            print("错误：'body'字段解析后不是一个列表。")
-            return None
-        return body_list
-    except json.JSONDecodeError as e:
-        print(f"错误：解析body字符串失败，它不是一个有效的JSON格式。详细信息: {e}")
+        return get_body(data_dict).items
+    except EnvelopeError as e:
+        print(f"错误：{e}")
         return None
 
 
@@ -99,15 +91,9 @@ while True:
             print("搜索关键词不能为空。")
             continue
 
-        matching_results = []
-        lower_search_term = search_term.lower()
-
-        for i, item in enumerate(body_elements):
-            name = item.get('name', '').lower()
-            artist = item.get('artist', '').lower()
-
-            if lower_search_term in name or lower_search_term in artist:
-                matching_results.append({'original_index': i + 1, 'item': item})  # 存储原始序号和元素
+        # 索引随解析结果一起缓存，重复搜索不再逐项转小写、全量扫描
+        matching_results = [{'original_index': ordinal, 'item': item}  # 存储原始序号和元素
+                            for ordinal, item in get_body(data).search(search_term)]
 
         if not matching_results:
             print(f"未找到与 '{search_term}' 匹配的元素。")
@@ -116,7 +102,8 @@ while True:
             for idx, result_entry in enumerate(matching_results):
                 item = result_entry['item']
                 print(
-                    f"[{idx + 1}] 名称: {item.get('name', 'N/A')} | 艺术家: {item.get('artist', 'N/A')} | 专辑: {item.get('album', 'N/A')}")
+                    f"[{idx + 1}] 名称: {item.get('name', 'N/A')} | 艺术家: {item.get('artist', 'N/A')} | 专辑: {item.get('album', 'N/A')}"
+                    f" | 原序号: {result_entry['original_index']}")
             print("--------------------\n")
 
             while True:
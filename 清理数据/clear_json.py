@@ -1,4 +1,4 @@
-import json
+from body_cache import get_body
 
 data = {
     "status_code": 200,
@@ -17,15 +17,7 @@ data = {
     "files": []
 }
 
-# 访问 "body" 字段的值，它是一个 JSON 格式的字符串
-body_str = data["body"]
-#print(f"原始body字符串的前50个字符: {body_str[:50]}...")
-# 将 "body" 字符串解析成 Python 列表
-body_list = json.loads(body_str)
-#print(f"解析后的body类型: {type(body_list)}")
-#print(f"解析后的body第一个元素: {body_list[0]}")
-# 从列表中获取第一个字典，并访问其 "id" 键的值
-first_id = body_list[0]["id"]
-#print(f"\n清洗结果：获取到的第一个id是: {first_id}")
+# 解析 "body" 字段（JSON 格式的字符串）并取第一个元素的 id；解析结果按 body 内容缓存
+first_id = get_body(data).nth_id(1)
 # 打印结果
-print(first_id)
\ No newline at end of file
+print(first_id)
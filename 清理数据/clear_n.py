@@ -1,4 +1,4 @@
-import json
+from body_cache import EnvelopeError, get_body
 
 # 原始数据
 data = {
@@ -23,6 +23,8 @@ def get_nth_body_id(data_dict, n_th_item):
     """
     从给定的数据字典中解析body字段，并获取其中第n个元素的'id'。
 
+    body 只在第一次调用时解析，之后按内容哈希从 body_cache 中取已解析的结果。
+
     Args:
         data_dict (dict): 包含'body'字段的原始数据字典。
         n_th_item (int): 需要获取的元素序号（从1开始计数，例如1代表第一个，2代表第二个）。
@@ -30,48 +32,19 @@ def get_nth_body_id(data_dict, n_th_item):
     Returns:
         int or None: 如果成功获取到ID，则返回ID值；否则返回None，并打印错误信息。
     """
-    if not isinstance(n_th_item, int) or n_th_item < 1:
-        print("错误：'n_th_item' 必须是一个正整数（例如，1表示第一个，2表示第二个）。")
-        return None
-
-    # 将用户提供的从1开始的索引转换为Python的0开始的索引
-    target_index = n_th_item - 1
-
-    body_string = data_dict.get('body')
-
-    if not body_string:
-        print("错误：数据中缺少 'body' 字段或其值为空。")
-        return None
-
-    try:
-        body_list = json.loads(body_string)
-    except json.JSONDecodeError as e:
-        print(f"错误：解析body字符串失败，它不是一个有效的JSON格式。详细信息: {e}")
-        return None
-
-    if not isinstance(body_list, list):
-        print("错误：'body'字段解析后不是一个列表。")
-        return None
-
-    if target_index >= len(body_list):
-        print(f"错误：body数组中只有 {len(body_list)} 个元素，无法获取第 {n_th_item} 个元素。")
-        return None
-
     try:
-        item = body_list[target_index]
-        item_id = item.get('id')  # 使用.get()方法，防止KeyError如果'id'可能不存在
-        if item_id is None:
-            print(f"错误：body数组中的第 {n_th_item} 个元素没有找到 'id' 键。")
-            return None
-        return item_id
-    except (TypeError, KeyError):  # 处理item不是字典或者id键不存在的情况
-        print(f"错误：获取第 {n_th_item} 个元素时发生未知错误，可能数据结构不正确。")
+        return get_body(data_dict).nth_id(n_th_item)
+    except EnvelopeError as e:
+        print(f"错误：{e}")
         return None
 
 
 # --- 自定义用户输入示例 ---
 print("欢迎使用数据清洗工具，用于获取body数组中指定元素的ID。")
-print("当前body数组共有 4 个元素。")
+try:
+    print(f"当前body数组共有 {len(get_body(data))} 个元素。")
+except EnvelopeError as e:
+    print(f"错误：{e}")
 
 while True:
     user_input_str = input("请输入您想获取的第几个元素的ID (例如：1表示第一个，2表示第二个；输入 'q' 退出): ")
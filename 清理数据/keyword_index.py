@@ -0,0 +1,87 @@
+"""
+body 元素（歌名 / 歌手）的关键词子串索引。
+
+clear_2.py 原先每次搜索都要把每个元素的 name / artist 转小写再逐个做子串判断，
+对上万个元素的 body 每次查询都是一遍全量扫描。这里每个 body 只建一次索引:
+    规范化键   NFKC + casefold（全角字母数字、大小写都统一），每个元素的歌名 / 歌手各存一份；
+    n-gram 倒排  每个单字和相邻两字 → 含有它的元素序号集合。
+查询时取关键词各个二元组的倒排集合求交集，再用规范化键确认子串确实连续出现。
+结果按原始序号（从 1 开始）升序返回；最近 QUERY_CACHE_SIZE 个查询的结果直接复用。
+
+索引挂在 body_cache.ParsedBody 上，随解析结果一起按 body 哈希缓存，同一 body 的重复搜索不会重建。
+"""
+import unicodedata
+from collections import OrderedDict
+
+# --- 配置 ---
+FIELDS = ("name", "artist")
+FIELD_SEPARATOR = "\x00"  # 拼接各字段的规范化键；关键词经规范化后不会含有它，子串不会跨字段匹配
+QUERY_CACHE_SIZE = 128
+
+
+def normalize_key(text) -> str:
+    """搜索用的规范化键：NFKC 统一全角 / 半角，casefold 统一大小写，去掉首尾空白。"""
+    return unicodedata.normalize("NFKC", str(text or "")).casefold().strip()
+
+
+class KeywordIndex:
+    """在一组元素的 name / artist 上做子串搜索的索引。"""
+
+    def __init__(self, items):
+        self.items = items
+        self.keys = []       # 序号 - 1 → 规范化歌名 + FIELD_SEPARATOR + 规范化歌手
+        self.postings = {}   # 单字 / 二元组 → 序号集合
+        self._results = OrderedDict()
+        for ordinal, item in enumerate(items, 1):
+            if isinstance(item, dict):
+                fields = tuple(normalize_key(item.get(field)) for field in FIELDS)
+            else:
+                fields = ("",) * len(FIELDS)
+            self.keys.append(FIELD_SEPARATOR.join(fields))
+            grams = set()
+            for text in fields:
+                grams.update(text)
+                grams.update(text[i:i + 2] for i in range(len(text) - 1))
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(ordinal)
+
+    def _candidates(self, query):
+        if len(query) == 1:
+            return self.postings.get(query, ())
+        sets = []
+        for gram in {query[i:i + 2] for i in range(len(query) - 1)}:
+            posting = self.postings.get(gram)
+            if not posting:
+                return ()
+            sets.append(posting)
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def search(self, keyword):
+        """
+        查找歌名或歌手中包含 keyword 的元素。
+
+        Returns:
+            list: [(原始序号, 元素), ...]，按原始序号升序。
+        """
+        query = normalize_key(keyword).replace(FIELD_SEPARATOR, "")
+        if not query:
+            return []
+        results = self._results.get(query)
+        if results is not None:
+            self._results.move_to_end(query)
+            return list(results)
+
+        keys, items = self.keys, self.items
+        candidates = self._candidates(query)
+        if len(query) <= 2:
+            # 单字 / 二元组的倒排集合本身就是精确结果，无需再确认
+            ordinals = sorted(candidates)
+        else:
+            ordinals = sorted([ordinal for ordinal in candidates if query in keys[ordinal - 1]])
+        results = [(ordinal, items[ordinal - 1]) for ordinal in ordinals]
+
+        self._results[query] = results
+        if len(self._results) > QUERY_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return list(results)
@@ -1,8 +1,14 @@
-import json
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Iterator
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+# --- 配置 ---
+# 每个 Dify 文档最多包含的歌曲数，超过后拆分为多个文档（可用环境变量覆盖）
+DOCUMENT_SIZE = int(os.environ.get("DIFY_DOCUMENT_SIZE", "5000"))
+DOCUMENT_NAME = "formatted_music_list"
 
 app = FastAPI(
     title="JSON转文本API",
@@ -10,46 +16,107 @@ app = FastAPI(
 )
 
 
-def format_json_to_text(data: List[Dict[str, Any]]) -> str:
-    """
-    将 JSON 格式的歌曲列表数据转换为格式化的文本字符串。
+def iter_song_chunks(data: List[Dict[str, Any]], start: int = 1) -> Iterator[str]:
     """
-    text_output = "歌曲列表\n\n"
-    text_output += "---\n\n"
-
-    for i, song in enumerate(data, 1):
-        text_output += f"**歌曲{i}**\n"
-        text_output += f"* **ID:** {song.get('id', 'N/A')}\n"
-        text_output += f"* **歌曲名:** {song.get('name', 'N/A')}\n"
-        text_output += f"* **歌手:** {song.get('artist', 'N/A')}\n"
-        text_output += f"* **专辑:** {song.get('album', 'N/A')}\n"
-        text_output += f"* **时长:** {song.get('duration_ms', 'N/A')} 毫秒\n\n"
-        text_output += "---\n\n"
+    逐首生成格式化后的文本片段，每首歌一个片段（一次 f-string 拼好六行）。
 
-    return text_output.strip()
+    Args:
+        data (list): 歌曲字典列表。
+        start (int): 第一首歌的序号（拆分文档时延续全局序号）。
+    """
+    yield "歌曲列表\n\n---\n\n"
+    for i, song in enumerate(data, start):
+        get = song.get
+        yield (f"**歌曲{i}**\n"
+               f"* **ID:** {get('id', 'N/A')}\n"
+               f"* **歌曲名:** {get('name', 'N/A')}\n"
+               f"* **歌手:** {get('artist', 'N/A')}\n"
+               f"* **专辑:** {get('album', 'N/A')}\n"
+               f"* **时长:** {get('duration_ms', 'N/A')} 毫秒\n\n"
+               "---\n\n")
 
 
-@app.post("/convert_to_dify_json", response_class=JSONResponse)
-async def convert_json_to_dify_format(data: List[Dict[str, Any]]):
+def format_json_to_text(data: List[Dict[str, Any]], start: int = 1) -> str:
     """
-    接收一个 JSON 格式的歌曲列表，并返回一个符合 Dify API 期望的 JSON 对象。
+    将 JSON 格式的歌曲列表数据转换为格式化的文本字符串。
+
+    片段由 iter_song_chunks 生成，最后一次性 join，耗时与歌曲数成线性关系。
     """
-    formatted_text = format_json_to_text(data)
+    return "".join(iter_song_chunks(data, start)).strip()
+
 
-    # 构造符合 Dify 要求的 JSON 对象
-    dify_payload = {
-        "name": "formatted_music_list",  # 你可以给文件起个有意义的名字
-        "text": formatted_text,
+def build_dify_payload(text: str, name: str = DOCUMENT_NAME) -> Dict[str, Any]:
+    """构造符合 Dify 要求的 JSON 对象。"""
+    return {
+        "name": name,
+        "text": text,
         "indexing_technique": "high_quality",
         "process_rule": {
             "mode": "automatic"
         }
     }
 
-    return dify_payload
+
+def iter_dify_documents(data: List[Dict[str, Any]], document_size: int = DOCUMENT_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    把歌曲列表按 document_size 首一份拆分为多个 Dify 文档。
+
+    只有一份时文档名保持 DOCUMENT_NAME；多份时依次命名为 DOCUMENT_NAME_part1、_part2 ...，
+    歌曲序号在各文档间连续。
+    """
+    document_size = max(1, document_size)
+    parts = max(1, -(-len(data) // document_size))
+    for part in range(parts):
+        offset = part * document_size
+        name = DOCUMENT_NAME if parts == 1 else f"{DOCUMENT_NAME}_part{part + 1}"
+        yield build_dify_payload(format_json_to_text(data[offset:offset + document_size], offset + 1), name)
+
+
+def orjson_response(content: Any, status_code: int = 200) -> Response:
+    """用 orjson 序列化响应（比标准库 json 快数倍，且直接输出 UTF-8 字节）。"""
+    return Response(orjson.dumps(content), status_code=status_code, media_type="application/json")
+
+
+async def _read_songs(request: Request) -> List[Dict[str, Any]]:
+    """直接用 orjson 解析请求体，跳过逐项的模型校验（大列表时这一步比格式化本身还慢）。"""
+    data = orjson.loads(await request.body())
+    if not isinstance(data, list):
+        raise ValueError("请求体必须是歌曲对象的 JSON 数组")
+    return [song for song in data if isinstance(song, dict)]
+
+
+@app.post("/convert_to_dify_json")
+async def convert_json_to_dify_format(request: Request):
+    """
+    接收一个 JSON 格式的歌曲列表，并返回一个符合 Dify API 期望的 JSON 对象。
+    """
+    try:
+        data = await _read_songs(request)
+    except ValueError as e:
+        return orjson_response({"error": str(e)}, status_code=422)
+    return orjson_response(build_dify_payload(format_json_to_text(data)))
+
+
+@app.post("/convert_to_dify_documents")
+async def convert_json_to_dify_documents(request: Request, document_size: int = DOCUMENT_SIZE):
+    """
+    接收一个（可能很大的）歌曲列表，按 document_size 首一份拆分，返回多个 Dify 文档。
+
+    Returns:
+        {"count": 文档数, "documents": [Dify 文档, ...]}
+    """
+    try:
+        data = await _read_songs(request)
+    except ValueError as e:
+        return orjson_response({"error": str(e)}, status_code=422)
+    documents = list(iter_dify_documents(data, document_size))
+    return orjson_response({"count": len(documents), "documents": documents})
 
 
 if __name__ == "__main__":
-    import uvicorn
+    # 统一由 serve.py 启动（多进程、响应缓存、延迟指标），这里只服务本应用
+    import sys
+
+    import serve
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    sys.exit(serve.main(["convert"] + sys.argv[1:]))
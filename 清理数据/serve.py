@@ -0,0 +1,203 @@
+"""
+清理数据下 FastAPI 服务的统一生产入口。
+
+两个应用:
+    convert   main.py     /convert_to_dify_json、/convert_to_dify_documents
+    ids       获取id.py    /process-data、/extract-ids
+    all       两者合并到同一个进程（默认）
+
+与直接 uvicorn.run(app) 相比:
+    - --workers 指定工作进程数（默认等于 CPU 核数），由 uvicorn 负责多进程与监听套接字共享；
+    - 每个进程内有一个 LRU 响应缓存，按 (路径, 查询串, 请求体 SHA-256) 命中，
+      Dify 重试时发来的相同请求体直接返回上次的响应（响应头带 x-cache: hit / miss）；
+    - 请求延迟与计数记录到仓库根目录的 metrics 模块，GET /metrics 以 Prometheus 文本格式导出。
+      多进程时每个进程各自计数，/metrics 返回的是处理该请求的那个进程的数据（响应头 x-worker-pid）。
+
+用法（在 清理数据 目录下）:
+    python serve.py                          # all，0.0.0.0:8000，CPU 核数个进程
+    python serve.py convert --port 8001 --workers 4 --cache-size 512
+    python serve.py ids --workers 1 --cache-size 0   # 关闭响应缓存
+"""
+import argparse
+import hashlib
+import importlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO_ROOT = HERE.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import metrics  # noqa: E402  仓库根目录的指标模块
+
+# --- 配置 ---
+APPS = {"convert": ("main",), "ids": ("获取id",), "all": ("main", "获取id")}
+DEFAULT_APP = "all"
+DEFAULT_PORT = 8000
+CACHE_SIZE = 256
+MAX_CACHED_RESPONSE_BYTES = 8 * 1024 * 1024
+# 工作进程由 uvicorn 以“导入字符串”方式启动，配置通过环境变量传给它们
+APP_ENV = "CLEAN_SERVE_APP"
+CACHE_SIZE_ENV = "CLEAN_SERVE_CACHE_SIZE"
+
+
+class ResponseCacheMiddleware:
+    """
+    POST 响应的进程内 LRU 缓存（ASGI 中间件）。
+
+    先读完整个请求体计算哈希；命中时直接回放缓存的状态码、响应头和响应体，未命中时把请求体原样交给应用，
+    并在响应为 200 且不超过 MAX_CACHED_RESPONSE_BYTES 时存入缓存。
+    """
+
+    def __init__(self, app, max_entries=CACHE_SIZE, max_bytes=MAX_CACHED_RESPONSE_BYTES):
+        self.app = app
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or self.max_entries <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        key = (scope["path"], scope.get("query_string", b""), hashlib.sha256(body).hexdigest())
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        metrics.cache_lookup("clean_response", cached is not None)
+        if cached is not None:
+            status, headers, payload = cached
+            await send({"type": "http.response.start", "status": status,
+                        "headers": headers + [(b"x-cache", b"hit")]})
+            await send({"type": "http.response.body", "body": payload})
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start = {}
+        parts = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                start.update(message)
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-cache", b"miss")])
+            elif message["type"] == "http.response.body" and size <= self.max_bytes:
+                parts.append(message.get("body", b""))
+                size += len(parts[-1])
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+
+        if start.get("status") == 200 and size <= self.max_bytes:
+            with self._lock:
+                self._entries[key] = (200, list(start.get("headers", [])), b"".join(parts))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+
+class LatencyMiddleware:
+    """记录每个请求的耗时（包括缓存命中）与状态码；未知路径归入 "other"，避免标签无限增长。"""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = scope["path"] if scope["path"] in self.routes else "other"
+        status = 500
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            metrics.observe("music_http_request_seconds", time.perf_counter() - started, route=route)
+            metrics.inc("music_http_requests_total", route=route, method=scope["method"], status=str(status))
+
+
+def create_app(app_name=None, cache_size=None):
+    """
+    构建要服务的应用（也是 uvicorn 工作进程的工厂函数）。
+
+    Args:
+        app_name (str): convert / ids / all，默认读环境变量 CLEAN_SERVE_APP。
+        cache_size (int): 响应缓存条目数，0 为关闭，默认读环境变量 CLEAN_SERVE_CACHE_SIZE。
+    """
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    app_name = app_name or os.environ.get(APP_ENV, DEFAULT_APP)
+    if cache_size is None:
+        cache_size = int(os.environ.get(CACHE_SIZE_ENV, CACHE_SIZE))
+    sys.path.insert(0, str(HERE))
+    modules = [importlib.import_module(name) for name in APPS[app_name]]
+
+    app = FastAPI(title="清理数据服务", description=f"合并的应用: {app_name}")
+    for module in modules:
+        app.include_router(module.app.router)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render_prometheus(), headers={"x-worker-pid": str(os.getpid())})
+
+    metrics.enable()
+    routes = ["/metrics"] + [route.path for module in modules for route in module.app.routes
+                             if hasattr(route, "path")]
+    return LatencyMiddleware(ResponseCacheMiddleware(app, cache_size), routes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以多进程方式运行清理数据的 FastAPI 服务。")
+    parser.add_argument("app", nargs="?", choices=tuple(APPS), default=DEFAULT_APP, help="要服务的应用")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="每个进程的响应缓存条目数，0 为关闭")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    os.environ[APP_ENV] = args.app
+    os.environ[CACHE_SIZE_ENV] = str(args.cache_size)
+    print(f"启动 {args.app} 服务: http://{args.host}:{args.port}，{args.workers} 个工作进程，"
+          f"响应缓存 {args.cache_size} 条/进程")
+    uvicorn.run("serve:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                app_dir=str(HERE))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-import json
+from body_cache import EnvelopeError, get_body
 
 data = {
     "status_code": 200,
@@ -17,38 +17,16 @@ data = {
     "files": []
 }
 
-# 1. 获取body字符串
-#body_str = data["body"]
-#print(f"原始body字符串的前50个字符: {body_str[:50]}...")
-
-# 2. 将body字符串解析为Python对象（列表）
-# 注意：body字符串实际上是一个JSON数组的字符串表示
-
-
-
-
-
-
-
+# 解析body字符串（JSON 数组的字符串表示）并获取第一个元素的id；同一 body 只解析一次
 try:
-    body_list = json.loads(body_str)
-    print(f"解析后的body类型: {type(body_list)}")
-    print(f"解析后的body第一个元素: {body_list[0]}")
-
-    # 3. 获取列表中的第一个元素（字典）
-    first_item = body_list[0]
+    body = get_body(data)
+    print(f"解析后的body元素数: {len(body)}")
+    print(f"解析后的body第一个元素: {body.items[0] if len(body) else None}")
 
-    # 4. 从第一个元素中获取id
-    first_id = first_item["id"]
+    first_id = body.nth_id(1)
 
     print(f"\n清洗结果：获取到的第一个id是: {first_id}")
 
-except json.JSONDecodeError:
-    print("错误：body字符串不是有效的JSON格式。")
-    first_id = None
-except IndexError:
-    print("错误：body列表为空，无法获取第一个元素。")
-    first_id = None
-except KeyError:
-    print("错误：第一个字典中没有'id'键。")
+except EnvelopeError as e:
+    print(f"错误：{e}")
     first_id = None
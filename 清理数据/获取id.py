@@ -1,29 +1,68 @@
-from fastapi import FastAPI
-from typing import List, Dict, Any
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from typing import Any
+
+import orjson
+
+from body_cache import EnvelopeError, get_body, run_queries
 
 app = FastAPI()
 
+
+def orjson_response(content: Any, status_code: int = 200) -> Response:
+    return Response(orjson.dumps(content), status_code=status_code, media_type="application/json")
+
+
 @app.post("/process-data")
-async def process_data(data: List[Dict[str, Any]]):
+async def process_data(request: Request):
     """
-    接收一个 JSON 列表，并返回第一个元素的 'id'。
+    接收一个 JSON 列表，或上游的完整信封（status_code / body(JSON 字符串) / headers），并返回第一个元素的 'id'。
     """
     try:
+        data = orjson.loads(await request.body())
+
         # 检查列表是否为空
         if not data:
-            return "Data body is empty."
-
-        # 获取第一个元素的 'id'
-        first_item = data[0]
-        first_id = first_item.get("id")
+            return orjson_response("Data body is empty.")
 
-        # 检查 'id' 字段是否存在
-        if first_id is None:
-            return "ID not found in the first element."
+        first_id = get_body(data).nth_id(1)
 
         # 返回数值
-        return first_id
+        return orjson_response(first_id)
 
+    except EnvelopeError as e:
+        # 列表输入保持原来的提示；信封输入返回具体原因（状态码错误、body 无法解析等）
+        return orjson_response("ID not found in the first element." if isinstance(data, list) else str(e))
     except Exception as e:
         # 捕获其他可能的错误
-        return f"An unexpected error occurred: {str(e)}"
\ No newline at end of file
+        return orjson_response(f"An unexpected error occurred: {str(e)}")
+
+
+@app.post("/extract-ids")
+async def extract_ids(request: Request):
+    """
+    在一个信封上批量查询 id，body 只解析一次并按内容哈希缓存。
+
+    请求体: {"envelope": {...}, "queries": [{"nth": 1}, {"nth": [2, 3]}, {"name": "心跳", "artist": "王力宏"}, {"all": true}]}
+    也可以直接在信封上附带 "queries" 字段。
+    返回: {"count": body 元素数, "results": [{"id": ...} | {"ids": [...]} | {"error": "..."}, ...]}
+    """
+    try:
+        data = orjson.loads(await request.body())
+        if not isinstance(data, dict):
+            raise EnvelopeError("请求体必须是 JSON 对象。")
+        envelope = data.get("envelope", data)
+        queries = data.get("queries") or [{"nth": 1}]
+        results = run_queries(envelope, queries)
+        return orjson_response({"count": len(get_body(envelope)), "results": results})
+    except ValueError as e:
+        return orjson_response({"error": str(e)}, status_code=422)
+
+
+if __name__ == "__main__":
+    # 统一由 serve.py 启动（多进程、响应缓存、延迟指标），这里只服务本应用
+    import sys
+
+    import serve
+
+    sys.exit(serve.main(["ids"] + sys.argv[1:]))